@@ -0,0 +1,144 @@
+"""
+netkeibaのページを模した、ベンチマーク用のhtmlを生成する。
+表の構造・列名・リンクの形式は実際のページに合わせ、値は乱数で作る。
+"""
+import os
+import random
+
+HEAD = '<html><head><meta http-equiv="Content-Type" content="text/html; charset=EUC-JP"><title>t</title></head><body>\n'
+TAIL = '</body></html>\n'
+NAMES = ['アーモンドアイ', 'クロノジェネシス', 'フィエールマン', 'ワールドプレミア', 'ラッキーライラック', 'サートゥルナーリア',
+         'カレンブーケドール', 'キセキ', 'ブラストワンピース', 'ペルシアンナイト', 'ユーキャンスマイル', 'バビット']
+PLACES = ['中山', '東京', '阪神', '京都', '小倉', '新潟', '札幌', '大井', 'ロンシャ']
+
+
+def race_page(rng, race_id, n):
+    """
+    raceページ（レース結果・払い戻し表）。nは出走頭数。
+    """
+    grade = rng.choice(['', '(G1)', '(G2)', '(G3)', ''])
+    rt = rng.choice(['芝右', 'ダ左', '障芝', '芝右 外', 'ダ右'])
+    intro = ('<div class="data_intro"><dl class="racedata fc"><dt>11 R</dt><dd><h1>テスト記念%s</h1>'
+             '<p><diary_snap_cut><span>%s%dm&nbsp;/&nbsp;天候 : %s&nbsp;/&nbsp;芝 : %s&nbsp;/&nbsp;発走 : 15:25</span></diary_snap_cut></p></dd></dl>'
+             '<p class="smalltxt">2020年%d月%d日 5回中山8日目 %s  (国際)(指)(定量)</p></div>\n') % (
+        grade, rt, rng.choice([1200, 1600, 2000, 2500, 3000]), rng.choice(['晴', '曇', '小雨']),
+        rng.choice(['良', '稍重', '重', '不良']), rng.randint(1, 12), rng.randint(1, 28),
+        rng.choice(['3歳未勝利', '3歳以上1勝クラス', '2歳新馬', '3歳以上オープン', '4歳以上1000万下']))
+    cols = ['着順', '枠番', '馬番', '馬名', '性齢', '斤量', '騎手', 'タイム', '着差', 'ﾀｲﾑ 指数', '通過', '上り', '単勝', '人気',
+            '馬体重', '調教 ﾀｲﾑ', '厩舎 ｺﾒﾝﾄ', '備考', '調教師', '馬主', '賞金 (万円)']
+    rows = ['<tr class="txt_c">' + ''.join('<th>%s</th>' % c for c in cols) + '</tr>']
+    for i in range(n):
+        rank = str(i + 1) if not (i == n - 1 and rng.random() < 0.3) else rng.choice(['中止', '除外'])
+        hid = '20%02d1%05d' % (rng.randint(14, 18), rng.randint(0, 99999))
+        jid = rng.choice(['05339', '01126', 'a04b5', '00666'])
+        tid = rng.choice(['01061', '01126', '00356'])
+        oid = rng.choice(['226800', '003805', 'x0a1b2'])
+        weight = rng.choice(['%d(%+d)' % (rng.randint(420, 520), rng.randint(-10, 10)), '計不', '%d(0)' % rng.randint(420, 520)])
+        prize = '' if i > 4 else '{:,.1f}'.format(rng.uniform(100, 30000))
+        tm = '%d:%02d.%d' % (rng.randint(1, 3), rng.randint(0, 59), rng.randint(0, 9))
+        cells = [rank, str(rng.randint(1, 8)), str(i + 1),
+                 '<a href="/horse/%s/" title="x">%s</a>' % (hid, rng.choice(NAMES)),
+                 rng.choice(['牡', '牝', 'セ']) + str(rng.randint(2, 8)), '%.1f' % rng.choice([54, 55, 56, 57.5]),
+                 '<a href="/jockey/result/recent/%s/" title="j">騎手%d</a>' % (jid, i),
+                 tm, '' if i == 0 else rng.choice(['クビ', '1/2', '1.1/4', '3', '大']), '**',
+                 '%d-%d-%d-%d' % tuple(rng.randint(1, n) for _ in range(4)), '%.1f' % rng.uniform(33, 40),
+                 '%.1f' % rng.uniform(1.1, 300), str(rng.randint(1, n)), weight, '', '', '',
+                 '[東] <a href="/trainer/result/recent/%s/" title="t">調教師</a>' % tid,
+                 '<a href="/owner/result/recent/%s/" title="o">馬主</a>' % oid, prize]
+        rows.append('<tr>' + ''.join('<td nowrap="nowrap">%s</td>' % c for c in cells) + '</tr>')
+    results = '<table class="race_table_01 nk_tb_common" summary="レース結果" cellspacing="1">\n' + '\n'.join(rows) + '\n</table>\n'
+
+    def h():
+        return rng.randint(1, n)
+    pay1 = ('<table class="pay_table_01" summary="払い戻し">'
+            '<tr><th class="tan">単勝</th><td>%d</td><td class="txt_r">%s</td><td class="txt_r">1</td></tr>'
+            '<tr><th class="fuku">複勝</th><td>%d<br />%d<br />%d</td><td class="txt_r">140<br />1,230<br />200</td><td>1<br />3<br />2</td></tr>'
+            '<tr><th class="waku">枠連</th><td>3 - 7</td><td class="txt_r">1,010</td><td>4</td></tr>'
+            '<tr><th class="uren">馬連</th><td>%d - %d</td><td class="txt_r">%s</td><td>5</td></tr></table>\n') % (
+        h(), rng.choice(['250', '1,350']), h(), h(), h(), h(), h(), rng.choice(['880', '12,340']))
+    pay2 = ('<table class="pay_table_01" summary="払い戻し">'
+            '<tr><th class="wide">ワイド</th><td>%d - %d<br />%d - %d<br />%d - %d</td><td class="txt_r">380<br />1,290<br />450</td><td>4<br />15<br />5</td></tr>'
+            '<tr><th class="utan">馬単</th><td>%d → %d</td><td class="txt_r">2,910</td><td>9</td></tr>'
+            '<tr><th class="sanfuku">三連複</th><td>%d - %d - %d</td><td class="txt_r">9,240</td><td>25</td></tr>'
+            '<tr><th class="santan">三連単</th><td>%d → %d → %d</td><td class="txt_r">123,450</td><td>100</td></tr></table>\n') % tuple(h() for _ in range(14))
+    corner = '<table class="result_table_02" summary="コーナー通過順位"><tr><th>1コーナー</th><td>1,2,3</td></tr></table>\n'
+    return (HEAD + intro + results + pay1 + pay2 + corner + TAIL).encode('euc_jp', errors='replace')
+
+
+def horse_page(rng, horse_id):
+    """
+    horseページ（プロフィール・受賞歴・過去成績）。過去成績の無い馬も作る。
+    """
+    parts = [HEAD, '<table class="db_photo"><tr><td>photo</td></tr></table>\n']
+    trainer = '<a href="/trainer/01061/">斉藤崇</a>' if rng.random() < 0.9 else '-'
+    owner = '<a href="/owner/226800/">サンデーR</a>' if rng.random() < 0.9 else '-'
+    breeder = '<a href="/breeder/373126/">ノーザンF</a>' if rng.random() < 0.9 else '-'
+    prof = [('生年月日', '2016年%d月%d日' % (rng.randint(1, 5), rng.randint(1, 28))), ('調教師', trainer + ' (栗東)'),
+            ('馬主', owner), ('生産者', breeder), ('産地', '安平町'), ('セリ取引価格', '-'),
+            ('獲得賞金', '1億 2,345万円 (中央)'), ('通算成績', '15戦8勝 [8-3-3-1]'), ('主な勝鞍', '20\'有馬記念(G1)'),
+            ('近親馬', 'ノームコア')]
+    if rng.random() < 0.3:
+        prof.insert(5, ('募集情報', '1口:12万円/400口'))
+    parts.append('<table class="db_prof_table" summary="のプロフィール">' +
+                 ''.join('<tr><th>%s</th><td>%s</td></tr>' % r for r in prof) + '</table>\n')
+    parts.append('<table class="blood_table"><tr><td>父</td><td>母</td></tr></table>\n')
+    if rng.random() < 0.2:
+        parts.append('<table class="tb01"><tr><th>受賞歴</th></tr><tr><td>2020年 JRA賞</td></tr></table>\n')
+    if rng.random() < 0.1:
+        parts.append(TAIL)
+        return ''.join(parts).encode('euc_jp')
+    cols = ['日付', '開催', '天気', 'R', 'レース名', '映像', '頭数', '枠番', '馬番', 'オッズ', '人気', '着順', '騎手', '斤量', '距離', '馬場',
+            '馬場 指数', 'タイム', '着差', 'ﾀｲﾑ 指数', '通過', 'ペース', '上り', '馬体重', '厩舎 ｺﾒﾝﾄ', '備考', '勝ち馬 (2着馬)', '賞金']
+    rows = ['<thead><tr>' + ''.join('<th>%s</th>' % c for c in cols) + '</tr></thead><tbody>']
+    for j in range(rng.randint(1, 12)):
+        rank = str(rng.randint(1, 16)) if rng.random() > 0.05 else '中'
+        cells = ['<a href="/race/list/20201227/">2020/%02d/%02d</a>' % (rng.randint(1, 12), rng.randint(1, 28)),
+                 '<a href="/race/sum/06/20201227/">%d%s%d</a>' % (rng.randint(1, 5), rng.choice(PLACES), rng.randint(1, 9)),
+                 rng.choice(['晴', '曇']), str(rng.randint(1, 12)), '<a href="/race/202006050811/">有馬記念(G1)</a>', '',
+                 str(rng.randint(8, 18)), str(rng.randint(1, 8)), str(rng.randint(1, 18)), '%.1f' % rng.uniform(1, 100),
+                 str(rng.randint(1, 16)), rank, '<a href="/jockey/05339/">ルメール</a>', '55',
+                 rng.choice(['芝2500', 'ダ1200', '障3000', '芝1600']), rng.choice(['良', '重']), '**',
+                 rng.choice(['2:35.0', '1:12.3', '1.34.5', '2:01:3', '', '1:59.9']),
+                 rng.choice(['0.3', '-0.2', '1.1', '0.0']), '**',
+                 rng.choice(['9-9-8-1', '3-3', '12', '', '1-1-1-1']), '36.1-35.0', '35.2',
+                 rng.choice(['480(+2)', '計不']), '', '', '<a href="/horse/2015105185/">サラキア</a>',
+                 rng.choice(['30,000.0', '', '1,200.0'])]
+        rows.append('<tr>' + ''.join('<td>%s</td>' % c for c in cells) + '</tr>')
+    parts.append('<table class="db_h_race_results nk_tb_common">' + ''.join(rows) + '</tbody></table>\n')
+    parts.append(TAIL)
+    return ''.join(parts).encode('euc_jp')
+
+
+def ped_page(rng, horse_id):
+    """
+    pedページ（5代血統表）
+    """
+    rows = []
+    for k in range(62):
+        aid = ''.join(rng.choice('0123456789abcdef') for _ in range(10))
+        rows.append('<td><a href="/horse/%s/">馬%d</a><a href="/horse/sire/%s/">産駒</a></td>' % (aid, k, aid))
+    table = '<table class="blood_table detail" summary="5代血統表"><tr>' + ''.join(rows) + '</tr></table>'
+    return (HEAD + table + TAIL).encode('euc_jp')
+
+
+def build(root: str, n_race: int = 60, n_horse: int = 60, seed: int = 0) -> dict:
+    """
+    root以下のrace, horse, pedディレクトリにhtmlを書き出し、{ページの種類: ファイルパスのリスト}を返す。
+    """
+    rng = random.Random(seed)
+    out = {}
+    for kind, fn, ids in [
+        ('race', race_page, ['2020%02d%02d%02d%02d' % (rng.randint(1, 10), rng.randint(1, 5), rng.randint(1, 8), r) for r in range(n_race)]),
+        ('horse', horse_page, ['2016%06d' % i for i in range(n_horse)]),
+        ('ped', ped_page, ['2016%06d' % i for i in range(n_horse)]),
+    ]:
+        d = os.path.join(root, kind)
+        os.makedirs(d, exist_ok=True)
+        paths = []
+        for i in ids:
+            p = os.path.join(d, i + '.bin')
+            with open(p, 'wb') as f:
+                f.write(fn(rng, i, rng.randint(8, 16)) if kind == 'race' else fn(rng, i))
+            paths.append(p)
+        out[kind] = paths
+    return out
@@ -0,0 +1,157 @@
+"""
+HorseResultsProcessorの、通過順・開催・距離・タイム・着差の列の変換の、変更前の実装（1行ずつのmap、
+pd.to_datetimeの3回の試行）と、ユニークな値だけを正規表現でパースする実装の、出力の一致の確認と速度の比較。
+馬の過去成績を模した列を、表記ゆれや不正な値を混ぜてn_rows行生成する。
+
+実行: python -m benchmarks.bench_horse_results_parsing [--n-rows 1000000]
+"""
+import argparse
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from modules.constants import Master
+from modules.preprocessing._horse_results_processor import _parse_corner, \
+    _parse_race_type_course_len, _parse_time_seconds
+from modules.preprocessing._parse_utils import map_unique
+
+
+def _make_columns(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    通過順・開催・距離・タイム・着差の列。実際の表記に、表記ゆれや不正な値を混ぜる。
+    """
+    rng = np.random.default_rng(seed)
+    # 通過順：'3', '3-2', '3-2-1'など。変更前の実装は数字を含まない文字列でエラーになるので含めない
+    corner_numbers = rng.integers(1, 19, (n_rows, 4)).astype(str)
+    n_corners = rng.integers(1, 5, n_rows)
+    corner = corner_numbers[:, 0].astype(object)
+    for i in range(1, 4):
+        has_corner = n_corners > i
+        corner[has_corner] = corner[has_corner] + '-' + corner_numbers[has_corner, i]
+    corner[rng.random(n_rows) < 0.03] = np.nan
+    _set_edge_cases(rng, corner, ['12', '1-10', '(3)-4', ' 5 ', 5, 7.0])
+    # 開催：'1中山2'など
+    places = np.array(list(Master.PLACE_DICT) + ['不明'], dtype=object)
+    place = (
+        rng.integers(1, 6, n_rows).astype(str).astype(object)
+        + places[rng.integers(0, len(places), n_rows)]
+        + rng.integers(1, 13, n_rows).astype(str)
+        )
+    # 距離：'芝2500'など
+    course = rng.choice(['芝', 'ダ', '障', '芝右'], n_rows).astype(object) \
+        + (rng.integers(10, 40, n_rows) * 100).astype(str)
+    _set_edge_cases(rng, course, ['', '1200', '芝', '芝外1800', '1200芝', np.nan])
+    # タイム：'2:01.3'のほか、'2.01.3', '2:01:3'の表記と、変換できない値
+    time_ = rng.integers(0, 4, n_rows).astype(str).astype(object) + ':' \
+        + np.char.zfill(rng.integers(0, 60, n_rows).astype(str), 2) + '.' \
+        + rng.integers(0, 10, n_rows).astype(str)
+    _set_edge_cases(rng, time_, [
+        '2:01:3', '1.34.5', '1.34:5', '60:00.0', '1:60.0', '1:5.1234567', '01:05.1', '1:5.1',
+        '', ' 1:05.1', '1:05', '７:05.1', 12.5,
+        ])
+    time_[rng.random(n_rows) < 0.02] = np.nan
+    return pd.DataFrame({
+        '通過': corner,
+        '開催': place,
+        '距離': course,
+        'タイム': time_,
+        '着差': np.round(rng.normal(1, 1, n_rows), 1),
+        })
+
+
+def _set_edge_cases(rng, values: np.ndarray, edge_cases: list):
+    """
+    valuesのランダムな位置に、edge_casesの値を順番に入れる
+    """
+    positions = rng.choice(len(values), min(len(values), 100 * len(edge_cases)), replace=False)
+    for i, position in enumerate(positions):
+        values[position] = edge_cases[i % len(edge_cases)]
+
+
+def _old_corners(sr: pd.Series) -> tuple:
+    def corner(x, n):
+        if type(x) != str:
+            return x
+        elif n == 4:
+            return int(re.findall(r'\d+', x)[-1])
+        elif n == 1:
+            return int(re.findall(r'\d+', x)[0])
+
+    return sr.map(lambda x: corner(x, 1)), sr.map(lambda x: corner(x, 4))
+
+
+def _old_place(sr: pd.Series) -> pd.Series:
+    return sr.str.extract(r'(\D+)')[0].map(Master.PLACE_DICT).fillna('99')
+
+
+def _old_race_type_course_len(sr: pd.Series) -> tuple:
+    race_type = sr.str.extract(r'(\D+)')[0].map(Master.RACE_TYPE_DICT)
+    course_len = sr.str.extract(r'(\d+)').astype(float) // 100
+    return race_type, course_len[0]
+
+
+def _old_time_seconds(sr: pd.Series) -> pd.Series:
+    baseformat = '%M:%S.%f'
+    basetime = pd.to_datetime("00:00.0", format=baseformat)
+    to_datetime = lambda x: pd.to_datetime(sr, format=x, errors='coerce')
+    datetime_s = to_datetime(baseformat)
+    for format_ in ['%M.%S.%f', '%M:%S:%f']:
+        datetime_s = datetime_s.fillna(to_datetime(format_))
+    return (datetime_s - basetime).dt.total_seconds()
+
+
+def _old_rank_diff(sr: pd.Series) -> pd.Series:
+    return sr.map(lambda x: 0 if x < 0 else x)
+
+
+def _new_place(sr: pd.Series) -> pd.Series:
+    return map_unique(
+        sr, lambda x: x.str.extract(r'(\D+)')[0].map(Master.PLACE_DICT)
+        ).fillna('99')
+
+
+def _new_rank_diff(sr: pd.Series) -> pd.Series:
+    return sr.clip(lower=0)
+
+
+def _as_tuple(result) -> tuple:
+    return result if isinstance(result, tuple) else (result,)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--n-rows', type=int, default=1000000)
+    args = arg_parser.parse_args()
+
+    df = _make_columns(args.n_rows)
+    benchmarks = [
+        ('corner', '通過', _old_corners, _parse_corner),
+        ('place', '開催', _old_place, _new_place),
+        ('race_type/course_len', '距離', _old_race_type_course_len, _parse_race_type_course_len),
+        ('time_seconds', 'タイム', _old_time_seconds, _parse_time_seconds),
+        ('rank_diff', '着差', _old_rank_diff, _new_rank_diff),
+        ]
+    total = {'old': 0., 'new': 0.}
+    for name, col, old, new in benchmarks:
+        elapsed = {}
+        results = {}
+        for label, func in [('old', old), ('new', new)]:
+            start = time.perf_counter()
+            results[label] = _as_tuple(func(df[col]))
+            elapsed[label] = time.perf_counter() - start
+            total[label] += elapsed[label]
+        # 出力（値・dtype）が完全に一致することを確認する
+        for expected, actual in zip(results['old'], results['new']):
+            pd.testing.assert_series_equal(actual, expected, check_exact=True, check_names=False)
+        print('{:<22} old {:.2f}s  new {:.2f}s  x{:.1f}'.format(
+            name, elapsed['old'], elapsed['new'], elapsed['old'] / elapsed['new']
+            ))
+    print('{:<22} old {:.2f}s  new {:.2f}s  x{:.1f}  ({} rows, outputs identical)'.format(
+        'total', total['old'], total['new'], total['old'] / total['new'], args.n_rows
+        ))
+
+
+if __name__ == '__main__':
+    main()
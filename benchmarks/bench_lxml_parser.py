@@ -0,0 +1,92 @@
+"""
+get_rawdata_*のparser='bs4'とparser='lxml'の、出力の一致の確認と速度の比較。
+生成したhtml（_html_fixtures）を両方のparserでパースし、DataFrameが完全に一致することを確認してから、
+同じファイルをrepeat回並べたリストで時間を測る。
+
+実行: python -m benchmarks.bench_lxml_parser [--n-races 60] [--n-horses 60] [--repeat 5]
+"""
+import argparse
+import contextlib
+import io
+import tempfile
+import time
+
+import pandas as pd
+
+from modules import preparing
+from ._html_fixtures import build
+
+PARSERS = ['bs4', 'lxml']
+
+
+def _quiet(func, *args, **kwargs):
+    """
+    進捗表示を出さずに実行する
+    """
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def _outputs(paths: dict, parser: str) -> dict:
+    """
+    各関数の出力。{名前: DataFrame}
+    """
+    race_results, race_info, race_return = _quiet(
+        preparing.parse_race_pages, paths['race'], parser=parser
+        )
+    return {
+        'parse_race_pages/results': race_results,
+        'parse_race_pages/race_info': race_info,
+        'parse_race_pages/return': race_return,
+        'get_rawdata_results': _quiet(preparing.get_rawdata_results, paths['race'], parser=parser),
+        'get_rawdata_info': _quiet(preparing.get_rawdata_info, paths['race'], parser=parser),
+        'get_rawdata_return': _quiet(preparing.get_rawdata_return, paths['race'], parser=parser),
+        'get_rawdata_horse_results': _quiet(
+            preparing.get_rawdata_horse_results, paths['horse'], parser=parser
+            ),
+        'get_rawdata_horse_info': _quiet(
+            preparing.get_rawdata_horse_info, paths['horse'], parser=parser
+            ),
+        'get_rawdata_peds': _quiet(preparing.get_rawdata_peds, paths['ped'], parser=parser),
+        }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--n-races', type=int, default=60)
+    arg_parser.add_argument('--n-horses', type=int, default=60)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = build(root, n_race=args.n_races, n_horse=args.n_horses)
+
+        # 出力の一致
+        outputs = {parser: _outputs(paths, parser) for parser in PARSERS}
+        for name, expected in outputs['bs4'].items():
+            pd.testing.assert_frame_equal(outputs['lxml'][name], expected, check_exact=True)
+            print('identical: {} {}'.format(name, expected.shape))
+
+        # 速度
+        benchmarks = [
+            ('parse_race_pages', preparing.parse_race_pages, 'race'),
+            ('get_rawdata_results', preparing.get_rawdata_results, 'race'),
+            ('get_rawdata_horse_results', preparing.get_rawdata_horse_results, 'horse'),
+            ('get_rawdata_horse_info', preparing.get_rawdata_horse_info, 'horse'),
+            ('get_rawdata_peds', preparing.get_rawdata_peds, 'ped'),
+            ]
+        for name, func, kind in benchmarks:
+            path_list = paths[kind] * args.repeat
+            elapsed = {}
+            for parser in PARSERS:
+                start = time.perf_counter()
+                _quiet(func, path_list, parser=parser)
+                elapsed[parser] = time.perf_counter() - start
+            print('{:<26} {} files  bs4 {:.2f}s  lxml {:.2f}s  x{:.1f}'.format(
+                name, len(path_list), elapsed['bs4'], elapsed['lxml'],
+                elapsed['bs4'] / elapsed['lxml']
+                ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+ScorePolicyのレース内のスケーリングの、変更前の実装（レースごとにgroupby.applyでPythonの関数を呼び出す）と、
+groupby.transformで計算する実装の、出力の一致の確認と速度の比較。
+出走頭数が5〜18頭のレースをn_races個生成し、予測確率は乱数で固定したモデルの出力とする。
+
+実行: python -m benchmarks.bench_score_policy [--n-races 30000]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from modules.constants import ResultsCols
+from modules.policies import MinMaxScorePolicy, RelativeProbaScorePolicy, StdScorePolicy
+
+
+class _FixedProbaModel:
+    """
+    predict_probaで、あらかじめ決めた確率を返すモデル
+    """
+    def __init__(self, proba: np.ndarray):
+        self.__proba = proba
+
+    def predict_proba(self, X: pd.DataFrame) -> np.ndarray:
+        return np.column_stack([1 - self.__proba, self.__proba])
+
+
+def _make_data(n_races: int, seed: int = 0) -> tuple:
+    """
+    レースidをインデックスとし、馬番の列を持つ説明変数のテーブルと、予測確率
+    """
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(5, 19, n_races)
+    race_ids = np.repeat(
+        np.array(['{:012d}'.format(201000000000 + i) for i in range(n_races)]), sizes
+        )
+    X = pd.DataFrame(
+        {ResultsCols.UMABAN: np.concatenate([np.arange(1, size + 1) for size in sizes])},
+        index=race_ids
+        )
+    return X, rng.random(len(X))
+
+
+# 変更前の実装
+def _old_apply_scaler(score: pd.Series, scaler) -> pd.Series:
+    return score.groupby(level=0, group_keys=False).apply(scaler)
+
+
+_old_scaler_standard = lambda x: (x - x.mean()) / x.std(ddof=0)
+_old_scaler_relative_proba = lambda x: x / x.sum()
+
+
+def _old_score_table(model, X: pd.DataFrame, score_func) -> pd.DataFrame:
+    score_table = X[ResultsCols.UMABAN].to_frame().copy()
+    score_table['score'] = score_func(pd.Series(model.predict_proba(X)[:, 1], index=X.index))
+    return score_table
+
+
+def _old_std(score: pd.Series) -> pd.Series:
+    return _old_apply_scaler(score, _old_scaler_standard)
+
+
+def _old_min_max(score: pd.Series) -> pd.Series:
+    score = _old_apply_scaler(score, _old_scaler_standard)
+    min_ = score.min()
+    return (score - min_) / (score.max() - min_)
+
+
+def _old_relative_proba(score: pd.Series) -> pd.Series:
+    return _old_apply_scaler(score, _old_scaler_relative_proba)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--n-races', type=int, default=30000)
+    args = arg_parser.parse_args()
+
+    X, proba = _make_data(args.n_races)
+    model = _FixedProbaModel(proba)
+    print('{} races, {} horses'.format(args.n_races, len(X)))
+    benchmarks = [
+        ('StdScorePolicy', _old_std, StdScorePolicy),
+        ('RelativeProbaScorePolicy', _old_relative_proba, RelativeProbaScorePolicy),
+        ('MinMaxScorePolicy', _old_min_max, MinMaxScorePolicy),
+        ]
+    for name, old, policy in benchmarks:
+        start = time.perf_counter()
+        expected = _old_score_table(model, X, old)
+        old_elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        actual = policy.calc(model, X)
+        new_elapsed = time.perf_counter() - start
+        # 行・馬番・欠損値は完全に一致し、スコアは浮動小数点の誤差の範囲で一致する
+        pd.testing.assert_frame_equal(actual, expected, check_exact=False, rtol=0, atol=1e-12)
+        max_diff = np.nanmax(np.abs(actual['score'].values - expected['score'].values))
+        print('{:<26} before {:.2f}s  after {:.2f}s  x{:.0f}  max abs diff {:.1e}'.format(
+            name, old_elapsed, new_elapsed, old_elapsed / new_elapsed, max_diff
+            ))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,5 +2,6 @@ from ._horse_results_cols import HorseResultsCols
 from ._horse_info_cols import HorseInfoCols
 from ._results_cols import ResultsCols
 from ._master import Master
+from ._dtypes import Dtypes
 from ._local_paths import LocalPaths
 from ._url_paths import UrlPaths
\ No newline at end of file
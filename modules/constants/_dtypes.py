@@ -0,0 +1,92 @@
+import dataclasses
+from types import MappingProxyType
+
+from pandas import CategoricalDtype
+
+from ._horse_results_cols import HorseResultsCols
+from ._master import Master
+from ._results_cols import ResultsCols
+
+# 値の種類がMasterで決まっている列は、カテゴリの順番も固定する
+_SEX = CategoricalDtype(Master.SEX_LIST)
+_WEATHER = CategoricalDtype(Master.WEATHER_LIST)
+_RACE_TYPE = CategoricalDtype(list(Master.RACE_TYPE_DICT.values()))
+_GROUND_STATE = CategoricalDtype(Master.GROUND_STATE_LIST)
+_AROUND = CategoricalDtype(Master.AROUND_LIST)
+_RACE_CLASS = CategoricalDtype(Master.RACE_CLASS_LIST)
+
+_RACE_INFO = {
+    'course_len': 'float32',
+    'weather': _WEATHER,
+    'race_type': _RACE_TYPE,
+    'ground_state': _GROUND_STATE,
+    'around': _AROUND,
+    'race_class': _RACE_CLASS,
+    HorseResultsCols.PLACE: 'category',
+    }
+
+_RESULTS = {
+    ResultsCols.WAKUBAN: 'int8',
+    ResultsCols.UMABAN: 'int8',
+    ResultsCols.KINRYO: 'float32',
+    ResultsCols.TANSHO_ODDS: 'float32',
+    'horse_id': 'category',
+    'jockey_id': 'category',
+    'trainer_id': 'category',
+    'owner_id': 'category',
+    '性': _SEX,
+    '年齢': 'int8',
+    '体重': 'float32',
+    '体重変化': 'float32',
+    'n_horses': 'int8',
+    'rank': 'int8',
+    }
+
+
+@dataclasses.dataclass(frozen=True)
+class Dtypes:
+    """
+    前処理後のテーブルの列の型。各Processorが前処理の最後に適用する。
+    整数型の列に欠損値がある場合はfloat32にする。
+    IDや値の種類が少ない文字列の列はカテゴリ型にする（値の種類が決まっていない列は'category'）。
+    """
+    RESULTS: dict = MappingProxyType(_RESULTS)
+
+    SHUTUBA_TABLE: dict = MappingProxyType({**_RESULTS, **_RACE_INFO})
+
+    RACE_INFO: dict = MappingProxyType(_RACE_INFO)
+
+    HORSE_RESULTS: dict = MappingProxyType({
+        HorseResultsCols.PLACE: 'category',
+        HorseResultsCols.WEATHER: 'category',
+        HorseResultsCols.R: 'int8',
+        HorseResultsCols.RACE_NAME: 'category',
+        HorseResultsCols.N_HORSES: 'int8',
+        HorseResultsCols.WAKUBAN: 'int8',
+        HorseResultsCols.UMABAN: 'int8',
+        HorseResultsCols.TANSHO_ODDS: 'float32',
+        HorseResultsCols.POPULARITY: 'int8',
+        HorseResultsCols.RANK: 'int8',
+        HorseResultsCols.JOCKEY: 'category',
+        HorseResultsCols.KINRYO: 'float32',
+        HorseResultsCols.GROUND_STATE: 'category',
+        HorseResultsCols.RANK_DIFF: 'float32',
+        HorseResultsCols.CORNER: 'category',
+        HorseResultsCols.PACE: 'category',
+        HorseResultsCols.NOBORI: 'float32',
+        HorseResultsCols.WEIGHT_AND_DIFF: 'category',
+        HorseResultsCols.PRIZE: 'float32',
+        'first_corner': 'float32',
+        'final_corner': 'float32',
+        'final_to_rank': 'float32',
+        'first_to_rank': 'float32',
+        'first_to_final': 'float32',
+        'race_type': _RACE_TYPE,
+        'course_len': 'float32',
+        'time_seconds': 'float32',
+        })
+
+    HORSE_INFO: dict = MappingProxyType({
+        'owner_id': 'category',
+        'breeder_id': 'category',
+        })
@@ -22,7 +22,25 @@ class LocalPaths:
     RAW_HORSE_RESULTS_PATH: str = os.path.join(RAW_DIR, 'horse_results.pickle')
     RAW_HORSE_INFO_PATH: str = os.path.join(RAW_DIR, 'horse_info.pickle')
     RAW_PEDS_PATH: str = os.path.join(RAW_DIR, 'peds.pickle')
+    ### rawテーブルを年ごとに分割保存する場合（RawStore）のディレクトリ
+    RAW_RESULTS_DIR: str = os.path.join(RAW_DIR, 'results')
+    RAW_RACE_INFO_DIR: str = os.path.join(RAW_DIR, 'race_info')
+    RAW_RETURN_TABLES_DIR: str = os.path.join(RAW_DIR, 'return_tables')
+    RAW_HORSE_RESULTS_DIR: str = os.path.join(RAW_DIR, 'horse_results')
+    RAW_HORSE_INFO_DIR: str = os.path.join(RAW_DIR, 'horse_info')
+    RAW_PEDS_DIR: str = os.path.join(RAW_DIR, 'peds')
     
     ### masterディレクトリのパス
     MASTER_DIR: str = os.path.join(DATA_DIR, 'master')
-    MASTER_RAW_HORSE_RESULTS_PATH: str = os.path.join(MASTER_DIR, 'horse_results_updated_at.csv')
\ No newline at end of file
+    MASTER_RAW_HORSE_RESULTS_PATH: str = os.path.join(MASTER_DIR, 'horse_results_updated_at.csv')
+    
+    ### featuresディレクトリのパス
+    FEATURES_DIR: str = os.path.join(DATA_DIR, 'features')
+    HORSE_RESULTS_FEATURES_PATH: str = os.path.join(FEATURES_DIR, 'horse_results_features.pickle')
+    HORSE_SNAPSHOT_PATH: str = os.path.join(FEATURES_DIR, 'horse_snapshot.pickle')
+    
+    ### cacheディレクトリのパス
+    CACHE_DIR: str = os.path.join(DATA_DIR, 'cache')
+    PARSE_CACHE_DIR: str = os.path.join(CACHE_DIR, 'parse')
+    PREPROCESSED_CACHE_DIR: str = os.path.join(CACHE_DIR, 'preprocessed')
+    PIPELINE_CACHE_DIR: str = os.path.join(CACHE_DIR, 'pipeline')
\ No newline at end of file
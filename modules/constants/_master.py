@@ -78,3 +78,26 @@ class Master:
     AROUND_LIST: tuple = ('右', '左', '直線', '障害')
 
     RACE_CLASS_LIST: tuple = ('新馬', '未勝利', '1勝クラス', '2勝クラス', '3勝クラス', 'オープン', 'G3', 'G2', 'G1', '障害')
+
+    # 払い戻しテーブルの券種名と、プログラム内で使う券種名
+    TICKET_TYPE_DICT: dict = MappingProxyType({
+        '単勝': 'tansho',
+        '複勝': 'fukusho',
+        '馬連': 'umaren',
+        '馬単': 'umatan',
+        'ワイド': 'wide',
+        '三連複': 'sanrenpuku',
+        '三連単': 'sanrentan',
+        })
+
+    # 券種ごとの、(1つの組み合わせに含まれる馬の数, 1レースあたりの払い戻しの組み合わせの数)。
+    # 馬の数はBOXで賭けるのに必要な馬の数、組み合わせの数は払い戻しテーブルの何番目の組み合わせまで使うか
+    TICKET_COMBINATION_DICT: dict = MappingProxyType({
+        'tansho': (1, 1),
+        'fukusho': (1, 3),
+        'umaren': (2, 1),
+        'umatan': (2, 1),
+        'wide': (2, 3),
+        'sanrenpuku': (3, 1),
+        'sanrentan': (3, 1),
+        })
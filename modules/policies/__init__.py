@@ -1,2 +1,3 @@
+from ._bet_actions import BetActions
 from ._bet_policy import *
 from ._score_policy import *
\ No newline at end of file
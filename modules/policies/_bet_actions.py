@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+from modules.constants import Master, ResultsCols
+
+
+class BetActions:
+    """
+    1つの馬券の種類で賭ける馬を、レースごとに並べた配列で表すクラス（CSR形式の疎行列と同じ形）。
+    i番目のレースrace_ids[i]では、umaban[offsets[i]:offsets[i + 1]]の馬に賭ける。
+    {race_id: {馬券の種類: 馬番のリスト}}のdictと違い、レースごとのPythonのオブジェクトを作らない。
+    """
+    def __init__(self, ticket_type: str, race_ids: np.ndarray, offsets: np.ndarray,
+                 umaban: np.ndarray):
+        if len(offsets) != len(race_ids) + 1 or offsets[-1] != len(umaban):
+            raise ValueError('offsets must have len(race_ids) + 1 elements ending with len(umaban)')
+        self.__ticket_type = ticket_type
+        self.__race_ids = np.asarray(race_ids)
+        self.__offsets = np.asarray(offsets, dtype=np.int64)
+        self.__umaban = np.asarray(umaban)
+
+    @classmethod
+    def from_score_table(cls, score_table: pd.DataFrame, threshold: float, ticket_type: str,
+                         min_horses: int = None) -> 'BetActions':
+        """
+        scoreがthreshold以上の馬に賭ける。賭ける馬がmin_horses頭未満のレースには賭けない。
+        min_horsesがNoneの場合は、ticket_typeの1つの組み合わせに含まれる馬の数（BOXで賭けるのに必要な数）。
+        レースはrace_idの順、レース内の馬はscore_tableの行の順に並べる。
+        """
+        if min_horses is None:
+            min_horses = Master.TICKET_COMBINATION_DICT[ticket_type][0]
+        filtered_table = score_table[score_table['score'] >= threshold]
+        race_codes, race_ids = pd.factorize(filtered_table.index, sort=True)
+        counts = np.bincount(race_codes, minlength=len(race_ids))
+        is_bet = counts >= min_horses
+        order = np.argsort(race_codes, kind='mergesort')
+        order = order[is_bet[race_codes[order]]]
+        counts = counts[is_bet]
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(
+            ticket_type, np.asarray(race_ids)[is_bet], offsets,
+            filtered_table[ResultsCols.UMABAN].values[order]
+            )
+
+    @property
+    def ticket_type(self) -> str:
+        return self.__ticket_type
+
+    @property
+    def race_ids(self) -> np.ndarray:
+        return self.__race_ids
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self.__offsets
+
+    @property
+    def umaban(self) -> np.ndarray:
+        return self.__umaban
+
+    def __len__(self) -> int:
+        """
+        賭けるレースの数
+        """
+        return len(self.__race_ids)
+
+    def to_dict(self) -> dict:
+        """
+        {race_id: {馬券の種類: 馬番のリスト}}のdictにする
+        """
+        umaban = self.__umaban.tolist()
+        offsets = self.__offsets.tolist()
+        return {
+            race_id: {self.__ticket_type: umaban[start:end]}
+            for race_id, start, end in zip(self.__race_ids.tolist(), offsets[:-1], offsets[1:])
+            }
+
+    def to_bet_table(self) -> pd.DataFrame:
+        """
+        Simulator.to_bet_tableと同じ形式の賭けのテーブルにする。
+        combinationは、レースごとに賭ける馬番のビットを立てた整数。
+        """
+        bits = np.left_shift(1, self.__umaban.astype(np.int64))
+        combinations = np.zeros(len(self.__race_ids), dtype=np.int64)
+        has_horses = np.diff(self.__offsets) > 0
+        if has_horses.any():
+            combinations[has_horses] = np.bitwise_or.reduceat(
+                bits, self.__offsets[:-1][has_horses]
+                )
+        return pd.DataFrame({
+            'race_id': pd.Series(self.__race_ids, dtype=object),
+            'ticket_type': self.__ticket_type,
+            'combination': combinations,
+            })
@@ -2,6 +2,7 @@ from abc import ABCMeta, abstractstaticmethod
 import pandas as pd
 
 from modules.constants import ResultsCols
+from ._bet_actions import BetActions
 
 class AbstractBetPolicy(metaclass=ABCMeta):
     """
@@ -21,16 +22,24 @@ class AbstractBetPolicy(metaclass=ABCMeta):
         """
         pass
 
+    @abstractstaticmethod
+    def judge_actions(score_table, **params) -> BetActions:
+        """
+        judgeと同じ馬券を、BetActions（レースごとの馬番の配列）で返す。
+        """
+        pass
+
 class BetPolicyTansho:
     """
     thresholdを超えた馬に単勝で賭ける戦略。
     """
     @staticmethod
     def judge(score_table: pd.DataFrame, threshold: float) -> dict:
-        filtered_table = score_table[score_table['score'] >= threshold]
-        bet_df = filtered_table.groupby(level=0)[ResultsCols.UMABAN].apply(list).to_frame()
-        bet_dict = bet_df.rename(columns={ResultsCols.UMABAN: 'tansho'}).T.to_dict()
-        return bet_dict
+        return BetPolicyTansho.judge_actions(score_table, threshold).to_dict()
+
+    @staticmethod
+    def judge_actions(score_table: pd.DataFrame, threshold: float) -> BetActions:
+        return BetActions.from_score_table(score_table, threshold, 'tansho')
 
 class BetPolicyFukusho:
     """
@@ -38,65 +47,71 @@ class BetPolicyFukusho:
     """
     @staticmethod
     def judge(score_table: pd.DataFrame, threshold: float) -> dict:
-        filtered_table = score_table[score_table['score'] >= threshold]
-        bet_df = filtered_table.groupby(level=0)[ResultsCols.UMABAN].apply(list).to_frame()
-        bet_dict = bet_df.rename(columns={ResultsCols.UMABAN: 'fukusho'}).T.to_dict()
-        return bet_dict
+        return BetPolicyFukusho.judge_actions(score_table, threshold).to_dict()
+
+    @staticmethod
+    def judge_actions(score_table: pd.DataFrame, threshold: float) -> BetActions:
+        return BetActions.from_score_table(score_table, threshold, 'fukusho')
 
 class BetPolicyUmarenBox:
     """
     thresholdを超えた馬に馬連BOXで賭ける戦略。
     """
+    @staticmethod
     def judge(score_table: pd.DataFrame, threshold: float) -> dict:
-        filtered_table = score_table[score_table['score'] >= threshold]
-        bet_df = filtered_table.groupby(level=0)[ResultsCols.UMABAN].apply(list).to_frame()
-        bet_df = bet_df[bet_df[ResultsCols.UMABAN].apply(len) >= 2]
-        bet_dict = bet_df.rename(columns={ResultsCols.UMABAN: 'umaren'}).T.to_dict()
-        return bet_dict
+        return BetPolicyUmarenBox.judge_actions(score_table, threshold).to_dict()
+
+    @staticmethod
+    def judge_actions(score_table: pd.DataFrame, threshold: float) -> BetActions:
+        return BetActions.from_score_table(score_table, threshold, 'umaren')
 
 class BetPolicyUmatanBox:
     """
     thresholdを超えた馬に馬単BOXで賭ける戦略。
     """
+    @staticmethod
     def judge(score_table: pd.DataFrame, threshold: float) -> dict:
-        filtered_table = score_table[score_table['score'] >= threshold]
-        bet_df = filtered_table.groupby(level=0)[ResultsCols.UMABAN].apply(list).to_frame()
-        bet_df = bet_df[bet_df[ResultsCols.UMABAN].apply(len) >= 2]
-        bet_dict = bet_df.rename(columns={ResultsCols.UMABAN: 'umatan'}).T.to_dict()
-        return bet_dict
+        return BetPolicyUmatanBox.judge_actions(score_table, threshold).to_dict()
+
+    @staticmethod
+    def judge_actions(score_table: pd.DataFrame, threshold: float) -> BetActions:
+        return BetActions.from_score_table(score_table, threshold, 'umatan')
 
 class BetPolicyWideBox:
     """
     thresholdを超えた馬にワイドBOXで賭ける戦略。
     """
+    @staticmethod
     def judge(score_table: pd.DataFrame, threshold: float) -> dict:
-        filtered_table = score_table[score_table['score'] >= threshold]
-        bet_df = filtered_table.groupby(level=0)[ResultsCols.UMABAN].apply(list).to_frame()
-        bet_df = bet_df[bet_df[ResultsCols.UMABAN].apply(len) >= 2]
-        bet_dict = bet_df.rename(columns={ResultsCols.UMABAN: 'wide'}).T.to_dict()
-        return bet_dict
+        return BetPolicyWideBox.judge_actions(score_table, threshold).to_dict()
+
+    @staticmethod
+    def judge_actions(score_table: pd.DataFrame, threshold: float) -> BetActions:
+        return BetActions.from_score_table(score_table, threshold, 'wide')
 
 class BetPolicySanrenpukuBox:
     """
     thresholdを超えた馬に三連複BOXで賭ける戦略。
     """
+    @staticmethod
     def judge(score_table: pd.DataFrame, threshold: float) -> dict:
-        filtered_table = score_table[score_table['score'] >= threshold]
-        bet_df = filtered_table.groupby(level=0)[ResultsCols.UMABAN].apply(list).to_frame()
-        bet_df = bet_df[bet_df[ResultsCols.UMABAN].apply(len) >= 3]
-        bet_dict = bet_df.rename(columns={ResultsCols.UMABAN: 'sanrenpuku'}).T.to_dict()
-        return bet_dict
+        return BetPolicySanrenpukuBox.judge_actions(score_table, threshold).to_dict()
+
+    @staticmethod
+    def judge_actions(score_table: pd.DataFrame, threshold: float) -> BetActions:
+        return BetActions.from_score_table(score_table, threshold, 'sanrenpuku')
 
 class BetPolicySanrentanBox:
     """
     thresholdを超えた馬に三連単BOXで賭ける戦略。
     """
+    @staticmethod
     def judge(score_table: pd.DataFrame, threshold: float) -> dict:
-        filtered_table = score_table[score_table['score'] >= threshold]
-        bet_df = filtered_table.groupby(level=0)[ResultsCols.UMABAN].apply(list).to_frame()
-        bet_df = bet_df[bet_df[ResultsCols.UMABAN].apply(len) >= 3]
-        bet_dict = bet_df.rename(columns={ResultsCols.UMABAN: 'sanrentan'}).T.to_dict()
-        return bet_dict
+        return BetPolicySanrentanBox.judge_actions(score_table, threshold).to_dict()
+
+    @staticmethod
+    def judge_actions(score_table: pd.DataFrame, threshold: float) -> BetActions:
+        return BetActions.from_score_table(score_table, threshold, 'sanrentan')
 
 class BetPolicyUmatanNagashi:
     """
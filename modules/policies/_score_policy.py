@@ -17,13 +17,17 @@ def _calc(model, X: pd.DataFrame) -> pd.DataFrame:
     score_table[_SCORE] = score
     return score_table
 
-def _apply_scaler(score: pd.Series, scaler: Callable[[pd.Series], pd.Series]) -> pd.Series:
-    return score.groupby(level=0, group_keys=False).apply(scaler)
+def _apply_scaler(score: pd.Series, scaler: Callable[[pd.Series, Callable], pd.Series]) -> pd.Series:
+    """
+    レースごとにscalerを適用する。scalerには、レースごとの集計値を元の行に揃えて返す関数
+    （groupby.transform）を渡すので、レースごとにPythonの関数を呼び出さない。
+    """
+    return scaler(score, score.groupby(level=0).transform)
 
 
 # scalers
-_scaler_standard = lambda x: (x - x.mean()) / x.std(ddof=0)
-_scaler_relative_proba = lambda x: x / x.sum()
+_scaler_standard = lambda x, transform: (x - transform('mean')) / transform('std', ddof=0)
+_scaler_relative_proba = lambda x, transform: x / transform('sum')
 
 
 # policies
@@ -1,8 +1,9 @@
 from ._scrape_race_id_list import scrape_kaisai_date, scrape_race_id_list
 from ._create_active_race_id_list import scrape_race_id_race_time_list, create_active_race_id_list
+from ._fetch_html import fetch_html
 from ._scrape_html import scrape_html_horse, scrape_html_ped, scrape_html_race,\
     scrape_html_horse_with_master
 from ._get_rawdata import get_rawdata_horse_results, get_rawdata_horse_info, get_rawdata_info, get_rawdata_peds,\
-    get_rawdata_results, get_rawdata_return, update_rawdata
+    get_rawdata_results, get_rawdata_return, parse_race_pages, update_rawdata
 from ._scrape_shutuba_table import scrape_shutuba_table, scrape_horse_id_list
 from ._prepare_chrome_driver import prepare_chrome_driver
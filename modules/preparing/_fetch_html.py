@@ -0,0 +1,130 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+from tqdm.auto import tqdm
+
+# リトライ対象とするHTTPステータスコード
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+class _TokenBucket:
+    """
+    トークンバケット方式のレートリミッタ。
+    全スレッド合計のリクエスト数が、1秒あたりrate回を超えないように待機させる。
+    """
+    def __init__(self, rate: float, burst: int = 1):
+        self.__rate = rate
+        self.__capacity = burst
+        self.__tokens = burst
+        self.__updated_at = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def acquire(self):
+        """
+        トークンを1つ取得する。トークンが無い場合は補充されるまで待機する。
+        """
+        while True:
+            with self.__lock:
+                now = time.monotonic()
+                self.__tokens = min(
+                    self.__capacity, self.__tokens + (now - self.__updated_at) * self.__rate
+                    )
+                self.__updated_at = now
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return
+                wait = (1 - self.__tokens) / self.__rate
+            time.sleep(wait)
+
+
+class _SessionPool:
+    """
+    スレッドごとにrequests.Sessionを持たせ、同じホストへのコネクションを再利用する。
+    """
+    def __init__(self, max_workers: int):
+        self.__max_workers = max_workers
+        self.__local = threading.local()
+
+    def get(self) -> requests.Session:
+        session = getattr(self.__local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.__max_workers)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self.__local.session = session
+        return session
+
+
+def _fetch_one(url: str, filepath: str, sessions: _SessionPool, bucket: _TokenBucket,
+               max_retries: int, backoff: float, timeout: float):
+    """
+    1ページ分を取得して保存する。通信エラーやリトライ対象のステータスの場合は、
+    backoff * 2**(試行回数)秒待ってから再取得する。
+    """
+    for attempt in range(max_retries + 1):
+        # 相手サーバーに負担をかけないよう、リクエスト前に必ずトークンを取得する
+        bucket.acquire()
+        try:
+            response = sessions.get().get(url, timeout=timeout)
+            if response.status_code in _RETRY_STATUS and attempt < max_retries:
+                raise requests.HTTPError('status {}'.format(response.status_code), response=response)
+            response.raise_for_status()
+            break
+        except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+            status = getattr(e.response, 'status_code', None)
+            retryable = status is None or status in _RETRY_STATUS
+            if not retryable or attempt == max_retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+    # 保存するファイルパスを指定
+    with open(filepath, 'wb') as f:
+        # 保存
+        f.write(response.content)
+    return len(response.content)
+
+
+def fetch_html(url_list: list, filepath_list: list, rate: float = 1.0, max_workers: int = 4,
+               max_retries: int = 3, backoff: float = 1.0, timeout: float = 30.0) -> list:
+    """
+    url_listのhtmlを並列にスクレイピングして、filepath_listの対応するパスに保存する関数。
+    rateは全スレッド合計での1秒あたりの最大リクエスト数で、デフォルトの1.0は
+    従来の「1アクセスごとにtime.sleep(1)」と同じ負荷になる。
+    待機中に他のリクエストの通信を進められるので、同じrateでも逐次実行より速く終わる。
+    返り値：保存に成功したファイルパス（url_listの順）
+    """
+    bucket = _TokenBucket(rate)
+    sessions = _SessionPool(max_workers)
+    saved = [False] * len(url_list)
+    n_bytes = 0
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                _fetch_one, url, filepath, sessions, bucket, max_retries, backoff, timeout
+                ): i
+            for i, (url, filepath) in enumerate(zip(url_list, filepath_list))
+            }
+        with tqdm(total=len(futures)) as pbar:
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    n_bytes += future.result()
+                    saved[i] = True
+                except Exception as e:
+                    print('error at {}'.format(url_list[i]))
+                    print(e)
+                pbar.update(1)
+                pbar.set_postfix(pages_per_sec='{:.2f}'.format(
+                    pbar.n / max(time.monotonic() - start, 1e-9)
+                    ))
+    # スループットを出力
+    elapsed = time.monotonic() - start
+    n_saved = sum(saved)
+    print('fetched {} pages ({:.1f} MB) in {:.1f}s: {:.2f} pages/s, {} failed'.format(
+        n_saved, n_bytes / 1e6, elapsed, n_saved / max(elapsed, 1e-9), len(url_list) - n_saved
+        ))
+    return [filepath for filepath, ok in zip(filepath_list, saved) if ok]
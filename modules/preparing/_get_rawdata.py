@@ -1,347 +1,566 @@
 import os
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from lxml import etree
 from numpy import NaN
 from tqdm.auto import tqdm
 from bs4 import BeautifulSoup
 import re
-from modules.constants import Master
+from modules.constants import Master, LocalPaths
+from modules.storage import RawStore, is_store_path
+from ._parse_cache import parse_with_cache
+from ._read_html_lxml import build_doc, read_table, read_tables, set_br_text
+
+# プロセスプールの1タスクあたりのファイル数
+_CHUNKSIZE = 64
+
+# 指定できるパーサー。'bs4'はpd.read_html + BeautifulSoup、
+# 'lxml'は1つのlxmlツリーからテーブルとIDをまとめて取り出す高速版（結果は同じ）
+_PARSERS = ('bs4', 'lxml')
+
+# lxml版で使うXPath
+_XPATH_RESULT_TABLE = etree.XPath('//table[@summary="レース結果"]')
+_XPATH_DATA_INTRO = etree.XPath(
+    '//div[contains(concat(" ", normalize-space(@class), " "), " data_intro ")]'
+    )
+_XPATH_PAY_TABLES = etree.XPath(
+    '//table[contains(concat(" ", normalize-space(@class), " "), " pay_table_01 ")]'
+    )
+_XPATH_PROFILE_TABLE = etree.XPath('//table[@summary="のプロフィール"]')
+_XPATH_PEDS_TABLE = etree.XPath('//table[@summary="5代血統表"]')
+_XPATH_P = etree.XPath('.//p')
+_XPATH_H1 = etree.XPath('.//h1')
+_XPATH_HREF = etree.XPath('.//a/@href')
+
+def _set_race_results_ids(df: pd.DataFrame, hrefs: list, race_id: str) -> pd.DataFrame:
+    """
+    レース結果テーブルに、テーブル内のaタグのhref（文書順）から取り出したIDを追加する。
+    """
+    # 馬IDをスクレイピング
+    df["horse_id"] = [
+        re.findall(r"\d+", href)[0] for href in hrefs if href.startswith("/horse")
+        ]
+    # 騎手IDをスクレイピング
+    #'jockey/result/recent/'より後ろの英数字(及びアンダーバー)を抽出
+    df["jockey_id"] = [
+        re.findall(r"jockey/result/recent/(\w*)", href)[0]
+        for href in hrefs if href.startswith("/jockey")
+        ]
+    # 調教師IDをスクレイピング
+    #'trainer/result/recent/'より後ろの英数字(及びアンダーバー)を抽出
+    df["trainer_id"] = [
+        re.findall(r"trainer/result/recent/(\w*)", href)[0]
+        for href in hrefs if href.startswith("/trainer")
+        ]
+    # 馬主IDをスクレイピング
+    #'owner/result/recent/'より後ろの英数字(及びアンダーバー)を抽出
+    df["owner_id"] = [
+        re.findall(r"owner/result/recent/(\w*)", href)[0]
+        for href in hrefs if href.startswith("/owner")
+        ]
+
+    # インデックスをrace_idにする
+    df.index = [race_id] * len(df)
+    return df
+
+def _race_results(soup, race_id: str) -> pd.DataFrame:
+    """
+    raceページのsoupオブジェクトから、1レース分のレース結果テーブルを作成する。
+    """
+    result_table = soup.find("table", attrs={"summary": "レース結果"})
+    # メインとなるレース結果テーブルデータを取得
+    df = pd.read_html(str(result_table))[0]
+    hrefs = [a["href"] for a in result_table.find_all("a", attrs={"href": True})]
+    return _set_race_results_ids(df, hrefs, race_id)
 
-def get_rawdata_results(html_path_list: list):
+def _race_results_lxml(doc, race_id: str) -> pd.DataFrame:
     """
-    raceページのhtmlを受け取って、レース結果テーブルに変換する関数。
+    _race_resultsのlxml版。
     """
-    print('preparing raw results table')
-    race_results = {}
-    for html_path in tqdm(html_path_list):
-        with open(html_path, 'rb') as f:
-            try:
-                # 保存してあるbinファイルを読み込む
-                html = f.read()
-                # メインとなるレース結果テーブルデータを取得
-                df = pd.read_html(html)[0]
-                # htmlをsoupオブジェクトに変換
-                soup = BeautifulSoup(html, "lxml")
-
-                # 馬IDをスクレイピング
-                horse_id_list = []
-                horse_a_list = soup.find("table", attrs={"summary": "レース結果"}).find_all(
-                    "a", attrs={"href": re.compile("^/horse")}
-                )
-                for a in horse_a_list:
-                    horse_id = re.findall(r"\d+", a["href"])
-                    horse_id_list.append(horse_id[0])
-                df["horse_id"] = horse_id_list
-
-                # 騎手IDをスクレイピング
-                jockey_id_list = []
-                jockey_a_list = soup.find("table", attrs={"summary": "レース結果"}).find_all(
-                    "a", attrs={"href": re.compile("^/jockey")}
-                )
-                for a in jockey_a_list:
-                    #'jockey/result/recent/'より後ろの英数字(及びアンダーバー)を抽出
-                    jockey_id = re.findall(r"jockey/result/recent/(\w*)", a["href"])
-                    jockey_id_list.append(jockey_id[0])
-                df["jockey_id"] = jockey_id_list
-
-                # 調教師IDをスクレイピング
-                trainer_id_list = []
-                trainer_a_list = soup.find("table", attrs={"summary": "レース結果"}).find_all(
-                    "a", attrs={"href": re.compile("^/trainer")}
-                )
-                for a in trainer_a_list:
-                    #'trainer/result/recent/'より後ろの英数字(及びアンダーバー)を抽出
-                    trainer_id = re.findall(r"trainer/result/recent/(\w*)", a["href"])
-                    trainer_id_list.append(trainer_id[0])
-                df["trainer_id"] = trainer_id_list
-
-                # 馬主IDをスクレイピング
-                owner_id_list = []
-                owner_a_list = soup.find("table", attrs={"summary": "レース結果"}).find_all(
-                    "a", attrs={"href": re.compile("^/owner")}
-                )
-                for a in owner_a_list:
-                    #'owner/result/recent/'より後ろの英数字(及びアンダーバー)を抽出
-                    owner_id = re.findall(r"owner/result/recent/(\w*)", a["href"])
-                    owner_id_list.append(owner_id[0])
-                df["owner_id"] = owner_id_list
-
-                # インデックスをrace_idにする
-                race_id = re.findall('race\W(\d+).bin', html_path)[0]
-                df.index = [race_id] * len(df)
-
-                race_results[race_id] = df
-            except Exception as e:
-                print('error at {}'.format(html_path))
-                print(e)
-    # pd.DataFrame型にして一つのデータにまとめる
-    race_results_df = pd.concat([race_results[key] for key in race_results])
+    result_table = _XPATH_RESULT_TABLE(doc)[0]
+    set_br_text(result_table)
+    df = read_table(result_table)
+    return _set_race_results_ids(df, [str(href) for href in _XPATH_HREF(result_table)], race_id)
 
-    # 列名に半角スペースがあれば除去する
-    race_results_df = race_results_df.rename(columns=lambda x: x.replace(' ', ''))
+def _race_info_from_text(texts: str, grade_text: str, race_id: str) -> pd.DataFrame:
+    """
+    レース情報のテキストとレース名から、1レース分のレース情報テーブルを作成する。
+    """
+    # 天候、レースの種類、コースの長さ、馬場の状態、日付、回り、レースクラスをスクレイピング
+    info = re.findall(r'\w+', texts)
+    df = pd.DataFrame()
+    # 障害レースフラグを初期化
+    hurdle_race_flg = False
+    for text in info:
+        if text in ["芝", "ダート"]:
+            df["race_type"] = [text]
+        if "障" in text:
+            df["race_type"] = ["障害"]
+            hurdle_race_flg = True
+        if "m" in text:
+            # 20211212：[0]→[-1]に修正
+            df["course_len"] = [int(re.findall(r"\d+", text)[-1])]
+        if text in Master.GROUND_STATE_LIST:
+            df["ground_state"] = [text]
+        if text in Master.WEATHER_LIST:
+            df["weather"] = [text]
+        if "年" in text:
+            df["date"] = [text]
+        if "右" in text:
+            df["around"] = [Master.AROUND_LIST[0]]
+        if "左" in text:
+            df["around"] = [Master.AROUND_LIST[1]]
+        if "直線" in text:
+            df["around"] = [Master.AROUND_LIST[2]]
+        if "新馬" in text:
+            df["race_class"] = [Master.RACE_CLASS_LIST[0]]
+        if "未勝利" in text:
+            df["race_class"] = [Master.RACE_CLASS_LIST[1]]
+        if ("1勝クラス" in text) or ("500万下" in text):
+            df["race_class"] = [Master.RACE_CLASS_LIST[2]]
+        if ("2勝クラス" in text) or ("1000万下" in text):
+            df["race_class"] = [Master.RACE_CLASS_LIST[3]]
+        if ("3勝クラス" in text) or ("1600万下" in text):
+            df["race_class"] = [Master.RACE_CLASS_LIST[4]]
+        if "オープン" in text:
+            df["race_class"] = [Master.RACE_CLASS_LIST[5]]
+
+    # グレードレース情報の取得
+    if "G3" in grade_text:
+        df["race_class"] = [Master.RACE_CLASS_LIST[6]] * len(df)
+    elif "G2" in grade_text:
+        df["race_class"] = [Master.RACE_CLASS_LIST[7]] * len(df)
+    elif "G1" in grade_text:
+        df["race_class"] = [Master.RACE_CLASS_LIST[8]] * len(df)
+
+    # 障害レースの場合
+    if hurdle_race_flg:
+        df["around"] = [Master.AROUND_LIST[3]]
+        df["race_class"] = [Master.RACE_CLASS_LIST[9]]
+
+    # インデックスをrace_idにする
+    df.index = [race_id] * len(df)
+    return df
+
+def _race_info(soup, race_id: str) -> pd.DataFrame:
+    """
+    raceページのsoupオブジェクトから、1レース分のレース情報テーブルを作成する。
+    """
+    data_intro = soup.find("div", attrs={"class": "data_intro"})
+    texts = data_intro.find_all("p")[0].text + data_intro.find_all("p")[1].text
+    grade_text = data_intro.find_all("h1")[0].text
+    return _race_info_from_text(texts, grade_text, race_id)
 
-    return race_results_df
+def _race_info_lxml(doc, race_id: str) -> pd.DataFrame:
+    """
+    _race_infoのlxml版。
+    """
+    data_intro = _XPATH_DATA_INTRO(doc)[0]
+    p_list = _XPATH_P(data_intro)
+    texts = p_list[0].text_content() + p_list[1].text_content()
+    grade_text = _XPATH_H1(data_intro)[0].text_content()
+    return _race_info_from_text(texts, grade_text, race_id)
 
-def get_rawdata_info(html_path_list: list):
+def _race_return(soup, race_id: str) -> pd.DataFrame:
+    """
+    raceページのsoupオブジェクトから、1レース分の払い戻しテーブルを作成する。
+    """
+    # 1つ目のテーブルに単勝〜馬連、2つ目にワイド〜三連単がある
+    # 複勝やワイドは<br />区切りで複数の値が入っているので、文字列'br'に置き換えてから読み込む
+    pay_tables = soup.find_all("table", attrs={"class": "pay_table_01"})
+    df = pd.concat([
+        pd.read_html(str(table).replace('<br/>', 'br'))[0] for table in pay_tables[:2]
+        ])
+    df.index = [race_id] * len(df)
+    return df
+
+def _race_return_lxml(doc, race_id: str) -> pd.DataFrame:
+    """
+    _race_returnのlxml版。
+    """
+    pay_tables = _XPATH_PAY_TABLES(doc)[:2]
+    for table in pay_tables:
+        set_br_text(table, 'br')
+    df = pd.concat([read_table(table) for table in pay_tables])
+    df.index = [race_id] * len(df)
+    return df
+
+def _read_soup(html: bytes):
+    """
+    htmlをsoupオブジェクトに変換する。
+    """
+    return BeautifulSoup(html, "lxml")
+
+# パーサーごとの、(ページの読み込み, {テーブル名: テーブルを作成する関数})
+_RACE_PARSERS = {
+    'bs4': (
+        _read_soup,
+        {'results': _race_results, 'race_info': _race_info, 'return': _race_return}
+        ),
+    'lxml': (
+        build_doc,
+        {'results': _race_results_lxml, 'race_info': _race_info_lxml, 'return': _race_return_lxml}
+        ),
+    }
+
+def _race_id(html_path: str) -> str:
+    return re.findall('race\W(\d+).bin', html_path)[0]
+
+def _read_html(html_path: str) -> bytes:
+    """
+    保存してあるbinファイルを読み込む。
+    """
+    with open(html_path, 'rb') as f:
+        return f.read()
+
+def _parse_race_table_file(html_path: str, name: str, parser: str):
+    """
+    raceページのhtmlから、nameのテーブルを作成する。
+    """
+    race_id = _race_id(html_path)
+    read_page, table_funcs = _RACE_PARSERS[parser]
+    return race_id, table_funcs[name](read_page(_read_html(html_path)), race_id)
+
+def _parse_race_file(html_path: str, parser: str):
+    """
+    1回のパースで3つのテーブルを作成する。
+    1つのテーブルで失敗しても他のテーブルは作成できるよう、失敗したテーブルは例外をそのまま返す。
+    """
+    race_id = _race_id(html_path)
+    read_page, table_funcs = _RACE_PARSERS[parser]
+    page = read_page(_read_html(html_path))
+    tables = []
+    for name in ['results', 'race_info', 'return']:
+        try:
+            tables.append(table_funcs[name](page, race_id))
+        except Exception as e:
+            tables.append(e)
+    return race_id, tuple(tables)
+
+def _first_id(hrefs: list, prefix: str):
+    """
+    hrefsのうち、'/{prefix}'で始まる最初のリンクからIDを取り出す。取得できない場合はNaN。
+    """
+    try:
+        a_list = [href for href in hrefs if href.startswith('/' + prefix)]
+        return re.findall(prefix + r"/(\w*)", a_list[0])[0]
+    except IndexError:
+        return NaN
+
+def _parse_horse_info_file(html_path: str, parser: str):
+    html = _read_html(html_path)
+
+    if parser == 'lxml':
+        doc = build_doc(html)
+        profile_table = _XPATH_PROFILE_TABLE(doc)[0]
+        hrefs = [str(href) for href in _XPATH_HREF(profile_table)]
+        # 馬の基本情報を取得
+        set_br_text(doc)
+        df_info = read_tables(doc, limit=2)[1].set_index(0).T
+    else:
+        # 馬の基本情報を取得
+        df_info = pd.read_html(html)[1].set_index(0).T
+        # htmlをsoupオブジェクトに変換
+        soup = _read_soup(html)
+        profile_table = soup.find("table", attrs={"summary": "のプロフィール"})
+        hrefs = [a["href"] for a in profile_table.find_all("a", attrs={"href": True})]
+
+    # 調教師IDをスクレイピング
+    df_info['trainer_id'] = _first_id(hrefs, 'trainer')
+    # 馬主IDをスクレイピング
+    df_info['owner_id'] = _first_id(hrefs, 'owner')
+    # 生産者IDをスクレイピング
+    df_info['breeder_id'] = _first_id(hrefs, 'breeder')
+
+    # インデックスをhorse_idにする
+    horse_id = re.findall('horse\W(\d+).bin', html_path)[0]
+    df_info.index = [horse_id] * len(df_info)
+    return horse_id, df_info
+
+def _parse_horse_results_file(html_path: str, parser: str):
+    html = _read_html(html_path)
+
+    if parser == 'lxml':
+        doc = build_doc(html)
+        set_br_text(doc)
+        dfs = read_tables(doc, limit=5)
+    else:
+        dfs = pd.read_html(html)
+
+    try:
+        df = dfs[3]
+        # 受賞歴がある馬の場合、3番目に受賞歴テーブルが来るため、4番目のデータを取得する
+        if df.columns[0]=='受賞歴':
+            df = dfs[4]
+    # 競走データが無い場合（新馬）を飛ばす
+    except IndexError:
+        raise ValueError('horse_results empty case2')
+
+    # 新馬の競走馬レビューが付いた場合、
+    # 列名に0が付与されるため、次のhtmlへ飛ばす
+    if df.columns[0] == 0:
+        raise ValueError('horse_results empty case1')
+
+    horse_id = re.findall('horse\W(\d+).bin', html_path)[0]
+
+    df.index = [horse_id] * len(df)
+    return horse_id, df
+
+def _parse_peds_file(html_path: str, parser: str):
+    html = _read_html(html_path)
+
+    # horse_idを取得
+    horse_id = re.findall('ped\W(\d+).bin', html_path)[0]
+
+    # 血統データからhorse_idを取得する
+    if parser == 'lxml':
+        hrefs = [str(href) for href in _XPATH_HREF(_XPATH_PEDS_TABLE(build_doc(html))[0])]
+    else:
+        # htmlをsoupオブジェクトに変換
+        soup = _read_soup(html)
+        peds_table = soup.find("table", attrs={"summary": "5代血統表"})
+        hrefs = [a["href"] for a in peds_table.find_all("a", attrs={"href": True})]
+
+    # 血統データのhorse_idを抜き出す
+    peds_id_list = [
+        re.findall('horse\W(\w{10})', href)[0] for href in hrefs if re.match("^/horse/\w{10}", href)
+        ]
+
+    return horse_id, peds_id_list
+
+def _parse_chunk(parse_file, html_path_chunk: list, kind: str, cache_dir: str):
+    """
+    html_path_chunkの各ファイルをparse_fileでパースする。プロセスプールの1タスク分。
+    cache_dirを指定した場合は、パース済みのファイルをキャッシュから読み込む。
+    返り値：([(key, パース結果), ...], {エラーになったファイルパス: エラーメッセージ}, キャッシュヒット数)
+    """
+    parsed = []
+    errors = {}
+    n_hits = 0
+    for html_path in html_path_chunk:
+        try:
+            if cache_dir is None:
+                parsed.append(parse_file(html_path))
+            else:
+                result, hit = parse_with_cache(parse_file, kind, html_path, cache_dir)
+                parsed.append(result)
+                n_hits += hit
+        except Exception as e:
+            errors[html_path] = '{}: {}'.format(type(e).__name__, e)
+    return parsed, errors, n_hits
+
+def _parse_files(parse_file, html_path_list: list, n_jobs: int, parser: str, kind: str, cache: bool):
+    """
+    html_path_listをチャンクに分けてparse_fileでパースする。
+    n_jobs > 1の場合はプロセスプールで並列に実行する（-1で全コア）。
+    並列実行しても、結果はhtml_path_listの順に並ぶ。
+    cache=Trueの場合は、LocalPaths.PARSE_CACHE_DIRのキャッシュを使い、
+    新しいファイルや中身が変わったファイルだけをパースする。
+    返り値：({key: パース結果}, {エラーになったファイルパス: エラーメッセージ})
+    """
+    if parser not in _PARSERS:
+        raise ValueError('parser must be one of {}'.format(_PARSERS))
+    parse_file = partial(parse_file, parser=parser)
+    cache_dir = LocalPaths.PARSE_CACHE_DIR if cache else None
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    chunks = [
+        html_path_list[i:i+_CHUNKSIZE] for i in range(0, len(html_path_list), _CHUNKSIZE)
+        ]
+    parsed = {}
+    errors = {}
+    n_hits = 0
+    with tqdm(total=len(html_path_list)) as pbar:
+        if n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+                # mapは投入した順に結果を返すので、並び順は逐次実行と変わらない
+                chunk_results = executor.map(
+                    partial(_parse_chunk, parse_file, kind=kind, cache_dir=cache_dir), chunks
+                    )
+                for chunk, (chunk_parsed, chunk_errors, chunk_hits) in zip(chunks, chunk_results):
+                    parsed.update(chunk_parsed)
+                    errors.update(chunk_errors)
+                    n_hits += chunk_hits
+                    pbar.update(len(chunk))
+        else:
+            for chunk in chunks:
+                chunk_parsed, chunk_errors, chunk_hits = _parse_chunk(parse_file, chunk, kind, cache_dir)
+                parsed.update(chunk_parsed)
+                errors.update(chunk_errors)
+                n_hits += chunk_hits
+                pbar.update(len(chunk))
+    if cache:
+        print('{} of {} files loaded from parse cache'.format(n_hits, len(html_path_list)))
+    return parsed, errors
+
+def _report_errors(errors: dict, return_errors: bool):
+    """
+    エラーは1件ずつ出力せず、件数だけを出力する。
+    詳細はreturn_errors=Trueで受け取る。
+    """
+    if errors and not return_errors:
+        print('{} files failed to parse (return_errors=True for details)'.format(len(errors)))
+
+def get_rawdata_results(html_path_list: list, n_jobs: int = 1, return_errors: bool = False,
+                        parser: str = 'bs4', cache: bool = False):
+    """
+    raceページのhtmlを受け取って、レース結果テーブルに変換する関数。
+    n_jobsに2以上を指定すると、プロセスプールで並列にパースする（-1で全コア）。
+    return_errors=Trueにすると、(テーブル, {ファイルパス: エラーメッセージ})を返す。
+    parser='lxml'にすると、pd.read_htmlとBeautifulSoupを使わない高速版でパースする（結果は同じ）。
+    cache=Trueにすると、パース結果をLocalPaths.PARSE_CACHE_DIRにキャッシュし、
+    前回から変わっていないファイルはパースせずにキャッシュから読み込む。
+    """
+    print('preparing raw results table')
+    race_results, errors = _parse_files(
+        partial(_parse_race_table_file, name='results'), html_path_list, n_jobs, parser,
+        'results', cache
+        )
+    _report_errors(errors, return_errors)
+    race_results_df = _concat_results(race_results)
+    return (race_results_df, errors) if return_errors else race_results_df
+
+def get_rawdata_info(html_path_list: list, n_jobs: int = 1, return_errors: bool = False,
+                     parser: str = 'bs4', cache: bool = False):
     """
     raceページのhtmlを受け取って、レース情報テーブルに変換する関数。
+    n_jobs, return_errors, parser, cacheはget_rawdata_resultsと同じ。
     """
     print('preparing raw race_info table')
-    race_infos = {}
-    for html_path in tqdm(html_path_list):
-        with open(html_path, 'rb') as f:
-            try:
-                # 保存してあるbinファイルを読み込む
-                html = f.read()
-
-                # htmlをsoupオブジェクトに変換
-                soup = BeautifulSoup(html, "lxml")
-
-                # 天候、レースの種類、コースの長さ、馬場の状態、日付、回り、レースクラスをスクレイピング
-                texts = (
-                    soup.find("div", attrs={"class": "data_intro"}).find_all("p")[0].text
-                    + soup.find("div", attrs={"class": "data_intro"}).find_all("p")[1].text
-                )
-                info = re.findall(r'\w+', texts)
-                df = pd.DataFrame()
-                # 障害レースフラグを初期化
-                hurdle_race_flg = False
-                for text in info:
-                    if text in ["芝", "ダート"]:
-                        df["race_type"] = [text]
-                    if "障" in text:
-                        df["race_type"] = ["障害"]
-                        hurdle_race_flg = True
-                    if "m" in text:
-                        # 20211212：[0]→[-1]に修正
-                        df["course_len"] = [int(re.findall(r"\d+", text)[-1])]
-                    if text in Master.GROUND_STATE_LIST:
-                        df["ground_state"] = [text]
-                    if text in Master.WEATHER_LIST:
-                        df["weather"] = [text]
-                    if "年" in text:
-                        df["date"] = [text]
-                    if "右" in text:
-                        df["around"] = [Master.AROUND_LIST[0]]
-                    if "左" in text:
-                        df["around"] = [Master.AROUND_LIST[1]]
-                    if "直線" in text:
-                        df["around"] = [Master.AROUND_LIST[2]]
-                    if "新馬" in text:
-                        df["race_class"] = [Master.RACE_CLASS_LIST[0]]
-                    if "未勝利" in text:
-                        df["race_class"] = [Master.RACE_CLASS_LIST[1]]
-                    if ("1勝クラス" in text) or ("500万下" in text):
-                        df["race_class"] = [Master.RACE_CLASS_LIST[2]]
-                    if ("2勝クラス" in text) or ("1000万下" in text):
-                        df["race_class"] = [Master.RACE_CLASS_LIST[3]]
-                    if ("3勝クラス" in text) or ("1600万下" in text):
-                        df["race_class"] = [Master.RACE_CLASS_LIST[4]]
-                    if "オープン" in text:
-                        df["race_class"] = [Master.RACE_CLASS_LIST[5]]
-
-                # グレードレース情報の取得
-                grade_text = soup.find("div", attrs={"class": "data_intro"}).find_all("h1")[0].text
-                if "G3" in grade_text:
-                    df["race_class"] = [Master.RACE_CLASS_LIST[6]] * len(df)
-                elif "G2" in grade_text:
-                    df["race_class"] = [Master.RACE_CLASS_LIST[7]] * len(df)
-                elif "G1" in grade_text:
-                    df["race_class"] = [Master.RACE_CLASS_LIST[8]] * len(df)
-
-                # 障害レースの場合
-                if hurdle_race_flg:
-                    df["around"] = [Master.AROUND_LIST[3]]
-                    df["race_class"] = [Master.RACE_CLASS_LIST[9]]
-
-                # インデックスをrace_idにする
-                race_id = re.findall('race\W(\d+).bin', html_path)[0]
-                df.index = [race_id] * len(df)
-
-                race_infos[race_id] = df
-            except Exception as e:
-                print('error at {}'.format(html_path))
-                print(e)
+    race_infos, errors = _parse_files(
+        partial(_parse_race_table_file, name='race_info'), html_path_list, n_jobs, parser,
+        'race_info', cache
+        )
+    _report_errors(errors, return_errors)
     # pd.DataFrame型にして一つのデータにまとめる
     race_infos_df = pd.concat([race_infos[key] for key in race_infos])
+    return (race_infos_df, errors) if return_errors else race_infos_df
 
-    return race_infos_df
-
-def get_rawdata_return(html_path_list: list):
+def get_rawdata_return(html_path_list: list, n_jobs: int = 1, return_errors: bool = False,
+                       parser: str = 'bs4', cache: bool = False):
     """
     raceページのhtmlを受け取って、払い戻しテーブルに変換する関数。
+    n_jobs, return_errors, parser, cacheはget_rawdata_resultsと同じ。
     """
     print('preparing raw return table')
-    race_return = {}
-    for html_path in tqdm(html_path_list):
-        with open(html_path, 'rb') as f:
-            try:
-                # 保存してあるbinファイルを読み込む
-                html = f.read()
-
-                html = html.replace(b'<br />', b'br')
-                dfs = pd.read_html(html)
-
-                # dfsの1番目に単勝〜馬連、2番目にワイド〜三連単がある
-                df = pd.concat([dfs[1], dfs[2]])
-
-                race_id = re.findall('race\W(\d+).bin', html_path)[0]
-                df.index = [race_id] * len(df)
-                race_return[race_id] = df
-            except Exception as e:
-                print('error at {}'.format(html_path))
-                print(e)
+    race_return, errors = _parse_files(
+        partial(_parse_race_table_file, name='return'), html_path_list, n_jobs, parser,
+        'return', cache
+        )
+    _report_errors(errors, return_errors)
     # pd.DataFrame型にして一つのデータにまとめる
     race_return_df = pd.concat([race_return[key] for key in race_return])
-    return race_return_df
+    return (race_return_df, errors) if return_errors else race_return_df
+
+def parse_race_pages(html_path_list: list, n_jobs: int = 1, return_errors: bool = False,
+                     parser: str = 'bs4', cache: bool = False):
+    """
+    raceページのhtmlを受け取って、レース結果テーブル、レース情報テーブル、払い戻しテーブルを
+    まとめて作成する関数。各ファイルの読み込みとパースは1回だけで済むので、
+    get_rawdata_results, get_rawdata_info, get_rawdata_returnを順に実行するより速い。
+    n_jobs, return_errors, parser, cacheはget_rawdata_resultsと同じ。
+    返り値：(レース結果テーブル, レース情報テーブル, 払い戻しテーブル)。列はそれぞれの関数と同じ。
+    """
+    print('preparing raw results, race_info and return tables')
+    parsed, errors = _parse_files(
+        _parse_race_file, html_path_list, n_jobs, parser, 'race_pages', cache
+        )
+    race_results = {}
+    race_infos = {}
+    race_return = {}
+    for race_id, race_tables in parsed.items():
+        for tables, table, name in zip(
+            [race_results, race_infos, race_return], race_tables, ['results', 'race_info', 'return']
+            ):
+            if isinstance(table, Exception):
+                # 1つのテーブルで失敗しても、他のテーブルは作成する
+                errors['{} ({})'.format(race_id, name)] = '{}: {}'.format(type(table).__name__, table)
+            else:
+                tables[race_id] = table
+    _report_errors(errors, return_errors)
+    race_tables = (
+        _concat_results(race_results),
+        pd.concat([race_infos[key] for key in race_infos]),
+        pd.concat([race_return[key] for key in race_return])
+        )
+    return (race_tables, errors) if return_errors else race_tables
+
+def _concat_results(race_results: dict) -> pd.DataFrame:
+    # pd.DataFrame型にして一つのデータにまとめる
+    race_results_df = pd.concat([race_results[key] for key in race_results])
+
+    # 列名に半角スペースがあれば除去する
+    race_results_df = race_results_df.rename(columns=lambda x: x.replace(' ', ''))
 
-def get_rawdata_horse_info(html_path_list: list):
+    return race_results_df
+
+def get_rawdata_horse_info(html_path_list: list, n_jobs: int = 1, return_errors: bool = False,
+                           parser: str = 'bs4', cache: bool = False):
     """
     horseページのhtmlを受け取って、馬の基本情報のDataFrameに変換する関数。
+    n_jobs, return_errors, parser, cacheはget_rawdata_resultsと同じ。
     """
     print('preparing raw horse_info table')
-    horse_info_df = pd.DataFrame()
-    horse_info = {}
-    for html_path in tqdm(html_path_list):
-        with open(html_path, 'rb') as f:
-            # 保存してあるbinファイルを読み込む
-            html = f.read()
-
-            # 馬の基本情報を取得
-            df_info = pd.read_html(html)[1].set_index(0).T
-
-            # htmlをsoupオブジェクトに変換
-            soup = BeautifulSoup(html, "lxml")
-
-            # 調教師IDをスクレイピング
-            try:
-                trainer_a_list = soup.find("table", attrs={"summary": "のプロフィール"}).find_all(
-                    "a", attrs={"href": re.compile("^/trainer")}
-                )
-                trainer_id = re.findall(r"trainer/(\w*)", trainer_a_list[0]["href"])[0]
-            except IndexError:
-                # 調教師IDを取得できない場合
-                #print('trainer_id empty {}'.format(html_path))
-                trainer_id = NaN
-            df_info['trainer_id'] = trainer_id
-
-            # 馬主IDをスクレイピング
-            try:
-                owner_a_list = soup.find("table", attrs={"summary": "のプロフィール"}).find_all(
-                    "a", attrs={"href": re.compile("^/owner")}
-                )
-                owner_id = re.findall(r"owner/(\w*)", owner_a_list[0]["href"])[0]
-            except IndexError:
-                # 馬主IDを取得できない場合
-                #print('owner_id empty {}'.format(html_path))
-                owner_id = NaN
-            df_info['owner_id'] = owner_id
-
-            # 生産者IDをスクレイピング
-            try:
-                breeder_a_list = soup.find("table", attrs={"summary": "のプロフィール"}).find_all(
-                    "a", attrs={"href": re.compile("^/breeder")}
-                )
-                breeder_id = re.findall(r"breeder/(\w*)", breeder_a_list[0]["href"])[0]
-            except IndexError:
-                # 生産者IDを取得できない場合
-                #print('breeder_id empty {}'.format(html_path))
-                breeder_id = NaN
-            df_info['breeder_id'] = breeder_id
-
-            # インデックスをrace_idにする
-            horse_id = re.findall('horse\W(\d+).bin', html_path)[0]
-            df_info.index = [horse_id] * len(df_info)
-            horse_info[horse_id] = df_info
-
+    horse_info, errors = _parse_files(
+        _parse_horse_info_file, html_path_list, n_jobs, parser, 'horse_info', cache
+        )
+    _report_errors(errors, return_errors)
     # pd.DataFrame型にして一つのデータにまとめる
     horse_info_df = pd.concat([horse_info[key] for key in horse_info])
+    return (horse_info_df, errors) if return_errors else horse_info_df
 
-    return horse_info_df
-
-def get_rawdata_horse_results(html_path_list: list):
+def get_rawdata_horse_results(html_path_list: list, n_jobs: int = 1, return_errors: bool = False,
+                              parser: str = 'bs4', cache: bool = False):
     """
     horseページのhtmlを受け取って、馬の過去成績のDataFrameに変換する関数。
+    競走データが無い馬（新馬など）はスキップされ、エラーとして記録される。
+    n_jobs, return_errors, parser, cacheはget_rawdata_resultsと同じ。
     """
     print('preparing raw horse_results table')
-    horse_results = {}
-    for html_path in tqdm(html_path_list):
-        with open(html_path, 'rb') as f:
-            try:
-                # 保存してあるbinファイルを読み込む
-                html = f.read()
-
-                df = pd.read_html(html)[3]
-                # 受賞歴がある馬の場合、3番目に受賞歴テーブルが来るため、4番目のデータを取得する
-                if df.columns[0]=='受賞歴':
-                    df = pd.read_html(html)[4]
-
-                # 新馬の競走馬レビューが付いた場合、
-                # 列名に0が付与されるため、次のhtmlへ飛ばす
-                if df.columns[0] == 0:
-                    print('horse_results empty case1 {}'.format(html_path))
-                    continue
-
-                horse_id = re.findall('horse\W(\d+).bin', html_path)[0]
-
-                df.index = [horse_id] * len(df)
-                horse_results[horse_id] = df
-
-            # 競走データが無い場合（新馬）を飛ばす
-            except IndexError:
-                print('horse_results empty case2 {}'.format(html_path))
-                continue
-
+    horse_results, errors = _parse_files(
+        _parse_horse_results_file, html_path_list, n_jobs, parser, 'horse_results', cache
+        )
+    _report_errors(errors, return_errors)
     # pd.DataFrame型にして一つのデータにまとめる
     horse_results_df = pd.concat([horse_results[key] for key in horse_results])
 
     # 列名に半角スペースがあれば除去する
     horse_results_df = horse_results_df.rename(columns=lambda x: x.replace(' ', ''))
 
-    return horse_results_df
+    return (horse_results_df, errors) if return_errors else horse_results_df
 
-def get_rawdata_peds(html_path_list: list):
+def get_rawdata_peds(html_path_list: list, n_jobs: int = 1, return_errors: bool = False,
+                     parser: str = 'bs4', cache: bool = False):
     """
     horse/pedページのhtmlを受け取って、血統のDataFrameに変換する関数。
+    n_jobs, return_errors, parser, cacheはget_rawdata_resultsと同じ。
     """
     print('preparing raw peds table')
-    peds = {}
-    for html_path in tqdm(html_path_list):
-        with open(html_path, 'rb') as f:
-            # 保存してあるbinファイルを読み込む
-            html = f.read()
-
-            # horse_idを取得
-            horse_id = re.findall('ped\W(\d+).bin', html_path)[0]
-
-            # htmlをsoupオブジェクトに変換
-            soup = BeautifulSoup(html, "lxml")
-
-            peds_id_list = []
-
-            # 血統データからhorse_idを取得する
-            horse_a_list = soup.find("table", attrs={"summary": "5代血統表"}).find_all\
-                ("a", attrs={"href": re.compile("^/horse/\w{10}")})
-
-            for a in horse_a_list:
-                # 血統データのhorse_idを抜き出す
-                work_peds_id = re.findall('horse\W(\w{10})', a["href"])[0]
-                peds_id_list.append(work_peds_id)
-
-            peds[horse_id] = peds_id_list
-
+    peds, errors = _parse_files(
+        _parse_peds_file, html_path_list, n_jobs, parser, 'peds', cache
+        )
+    _report_errors(errors, return_errors)
     # pd.DataFrame型にして一つのデータにまとめて、列と行の入れ替えして、列名をpeds_0, ..., peds_61にする
     peds_df = pd.DataFrame.from_dict(peds, orient='index').add_prefix('peds_')
-
-    return peds_df
+    return (peds_df, errors) if return_errors else peds_df
 
 def update_rawdata(filepath: str, new_df: pd.DataFrame) -> pd.DataFrame:
     """
     filepathにrawテーブルのpickleファイルパスを指定し、new_dfに追加したいDataFrameを指定。
     元々のテーブルにnew_dfが追加されてpickleファイルが更新される。
     pickleファイルが存在しない場合は、filepathに新たに作成される。
+    filepathに拡張子の無いパス（LocalPaths.RAW_RESULTS_DIRなど）を指定した場合は、
+    RawStoreとして年ごとに分割保存し、new_dfの行を含む年のファイルだけを書き換える。
     """
+    # RawStoreの更新処理
+    if is_store_path(filepath):
+        if new_df.empty:
+            print('preparing update raw data empty')
+        else:
+            RawStore(filepath).upsert(new_df)
     # pickleファイルが存在する場合の更新処理
-    if os.path.isfile(filepath):
+    elif os.path.isfile(filepath):
         backupfilepath = filepath + '.bak'
         # 結合データがない場合
         if new_df.empty:
@@ -0,0 +1,54 @@
+import hashlib
+import os
+import pickle
+
+# パース処理や返り値の形式を変更した場合は、古いキャッシュを使わないように値を上げる
+PARSER_VERSION = 1
+
+
+def _cache_path(cache_dir: str, kind: str, html_path: str, html: bytes) -> str:
+    """
+    キャッシュファイルのパス。htmlの中身のハッシュとファイル名（=ID）をキーにする。
+    """
+    key = hashlib.sha1(html)
+    key.update(os.path.basename(html_path).encode())
+    key = key.hexdigest()
+    return os.path.join(cache_dir, 'v{}'.format(PARSER_VERSION), kind, key[:2], key + '.pickle')
+
+
+def _is_cacheable(parsed: tuple) -> bool:
+    """
+    パース結果にエラー（例外）が含まれている場合はキャッシュしない。
+    """
+    value = parsed[1]
+    if isinstance(value, tuple):
+        return not any(isinstance(v, Exception) for v in value)
+    return True
+
+
+def parse_with_cache(parse_file, kind: str, html_path: str, cache_dir: str):
+    """
+    html_pathをparse_fileでパースする。同じ中身のファイルをパースしたことがあれば、
+    パースせずにキャッシュから返す。
+    返り値：(parse_fileの返り値, キャッシュから読み込んだかどうか)
+    """
+    with open(html_path, 'rb') as f:
+        html = f.read()
+    cache_path = _cache_path(cache_dir, kind, html_path, html)
+    if os.path.isfile(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f), True
+        except Exception:
+            # 書き込み途中などで壊れている場合は、パースし直して上書きする
+            pass
+
+    parsed = parse_file(html_path)
+    if _is_cacheable(parsed):
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # 並列実行時に読み込み途中のファイルが見えないよう、一時ファイルに書いてから置き換える
+        tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(parsed, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    return parsed, False
@@ -0,0 +1,174 @@
+import re
+from lxml import etree
+from lxml.html import HTMLParser, fromstring
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+# pd.read_html(flavor='lxml')と同じ手順でテーブルを読み込むための、lxml版のヘルパー。
+# pd.read_htmlは呼び出しのたびにhtml全体をパースし直すので、1つのツリーから
+# 複数のテーブルを読み込めるように、テーブル要素を受け取る形にしている。
+
+# pd.read_htmlが読み込み対象とするテーブル（文字を含むテーブル）
+_XPATH_TABLES = etree.XPath(
+    "//table//*[re:test(text(), '.+')]/ancestor::table",
+    namespaces={"re": "http://exslt.org/regular-expressions"}
+    )
+_XPATH_THEAD = etree.XPath(".//thead")
+_XPATH_TR = etree.XPath("./tr")
+_XPATH_CELLS = etree.XPath("./td|./th")
+_XPATH_TBODY_TR = etree.XPath(".//tbody//tr")
+_XPATH_TFOOT_TR = etree.XPath(".//tfoot//tr")
+_XPATH_HIDDEN = etree.XPath(".//*[@style]")
+
+# セル内の改行や連続する空白は、半角スペース1つにまとめる
+_RE_WHITESPACE = re.compile(r"[\r\n]+|\s{2,}")
+
+
+def build_doc(html):
+    """
+    htmlをlxmlのツリーに変換する。文字コードはmetaタグから判定される。
+    """
+    return fromstring(html, parser=HTMLParser(recover=True))
+
+
+def set_br_text(element, text: str = "\n"):
+    """
+    element内の<br>を文字列textとして読み込まれるようにする。
+    pd.read_htmlは<br>を改行として扱う（最終的に半角スペースになる）。
+    """
+    for br in element.iter("br"):
+        br.tail = text + (br.tail or "")
+
+
+def _is_hidden(element) -> bool:
+    return "display:none" in element.get("style", "").replace(" ", "")
+
+
+def _remove_hidden(table):
+    for element in _XPATH_HIDDEN(table):
+        if _is_hidden(element):
+            element.getparent().remove(element)
+
+
+def _split_rows(table):
+    """
+    テーブルの<tr>をヘッダー、ボディ、フッターに分ける。
+    <thead>が無い場合は、先頭の<th>だけの行をヘッダーとする。
+    """
+    header_rows = []
+    for thead in _XPATH_THEAD(table):
+        header_rows.extend(_XPATH_TR(thead))
+        # <tr>の無い<thead>は、<thead>自体を1行として扱う
+        if _XPATH_CELLS(thead):
+            header_rows.append(thead)
+    body_rows = _XPATH_TBODY_TR(table) + _XPATH_TR(table)
+    footer_rows = _XPATH_TFOOT_TR(table)
+    if not header_rows:
+        while body_rows and all(cell.tag == "th" for cell in _XPATH_CELLS(body_rows[0])):
+            header_rows.append(body_rows.pop(0))
+    return header_rows, body_rows, footer_rows
+
+
+def _expand_colspan_rowspan(rows) -> list:
+    """
+    <tr>のリストを文字列のリストのリストに変換する。
+    rowspan、colspanのあるセルは、その分だけ文字列を複製する。
+    """
+    all_texts = []
+    # (列番号, 文字列, 残りの行数)
+    remainder = []
+    for tr in rows:
+        texts = []
+        next_remainder = []
+        index = 0
+        for td in _XPATH_CELLS(tr):
+            # 前の行のrowspanで埋まっている列を先に追加する
+            while remainder and remainder[0][0] <= index:
+                prev_i, prev_text, prev_rowspan = remainder.pop(0)
+                texts.append(prev_text)
+                if prev_rowspan > 1:
+                    next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+                index += 1
+
+            text = _RE_WHITESPACE.sub(" ", td.text_content().strip())
+            rowspan = int(td.get("rowspan") or 1)
+            colspan = int(td.get("colspan") or 1)
+            for _ in range(colspan):
+                texts.append(text)
+                if rowspan > 1:
+                    next_remainder.append((index, text, rowspan - 1))
+                index += 1
+
+        for prev_i, prev_text, prev_rowspan in remainder:
+            texts.append(prev_text)
+            if prev_rowspan > 1:
+                next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+        all_texts.append(texts)
+        remainder = next_remainder
+
+    # rowspanによってのみ存在する行を追加する
+    while remainder:
+        next_remainder = []
+        texts = []
+        for prev_i, prev_text, prev_rowspan in remainder:
+            texts.append(prev_text)
+            if prev_rowspan > 1:
+                next_remainder.append((prev_i, prev_text, prev_rowspan - 1))
+        all_texts.append(texts)
+        remainder = next_remainder
+    return all_texts
+
+
+def read_table(table):
+    """
+    テーブル要素を、pd.read_htmlと同じ列名・型のDataFrameに変換する。
+    中身が空のテーブルの場合はEmptyDataErrorになる（pd.read_htmlでは結果から除かれる）。
+    """
+    _remove_hidden(table)
+    header_rows, body_rows, footer_rows = _split_rows(table)
+    head = _expand_colspan_rowspan(header_rows)
+    body = _expand_colspan_rowspan(body_rows)
+    foot = _expand_colspan_rowspan(footer_rows)
+
+    header = None
+    if head:
+        body = head + body
+        if len(head) == 1:
+            header = 0
+        else:
+            # 空文字だけの行はヘッダーにしない
+            header = [i for i, row in enumerate(head) if any(text for text in row)]
+    if foot:
+        body += foot
+
+    # 列数の足りない行を空文字で埋める
+    if body:
+        max_len = max(len(row) for row in body)
+        for row in body:
+            row += [""] * (max_len - len(row))
+
+    with TextParser(
+        body, header=header, index_col=None, skiprows=0, parse_dates=False,
+        thousands=",", encoding=None, decimal=".", converters=None,
+        na_values=None, keep_default_na=True
+        ) as tp:
+        return tp.read()
+
+
+def read_tables(doc, limit: int = None) -> list:
+    """
+    pd.read_html(html)と同じ順番で、ツリー内のテーブルをDataFrameのリストに変換する。
+    limitを指定すると、先頭からlimit個のDataFrameを作成した時点で打ち切る。
+    """
+    tables = [table for table in _XPATH_TABLES(doc) if not _is_hidden(table)]
+    for table in tables:
+        _remove_hidden(table)
+    dfs = []
+    for table in tables:
+        if limit is not None and len(dfs) >= limit:
+            break
+        try:
+            dfs.append(read_table(table))
+        except EmptyDataError:
+            continue
+    return dfs
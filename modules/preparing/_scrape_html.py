@@ -1,95 +1,62 @@
 import datetime
 import re
 import pandas as pd
-import time
 import os
-from tqdm.auto import tqdm
-from urllib.request import urlopen
 
 from modules.constants import UrlPaths, LocalPaths
+from ._fetch_html import fetch_html
 
-def scrape_html_race(race_id_list: list, skip: bool = True):
+def _scrape_html(id_list: list, base_url: str, html_dir: str, id_name: str, skip: bool, **fetch_options):
     """
-    netkeiba.comのraceページのhtmlをスクレイピングしてdata/html/raceに保存する関数。
-    skip=Trueにすると、すでにhtmlが存在する場合はスキップされ、Falseにすると上書きされる。
-    返り値：新しくスクレイピングしたhtmlのファイルパス
+    id_listのページをfetch_htmlで取得してhtml_dirに保存する、scrape_html_*共通の処理。
     """
-    updated_html_path_list = []
-    for race_id in tqdm(race_id_list):
+    url_list = []
+    filename_list = []
+    for id_ in id_list:
         # 保存するファイル名
-        filename = os.path.join(LocalPaths.HTML_RACE_DIR, race_id+'.bin')
+        filename = os.path.join(html_dir, id_+'.bin')
         # skipがTrueで、かつbinファイルがすでに存在する場合は飛ばす
         if skip and os.path.isfile(filename):
-            print('race_id {} skipped'.format(race_id))
+            print('{} {} skipped'.format(id_name, id_))
         else:
-            # race_idからurlを作る
-            url = UrlPaths.RACE_URL + race_id
-            # 相手サーバーに負担をかけないように1秒待機する
-            time.sleep(1)
-            # スクレイピング実行
-            html = urlopen(url).read()
-            # 保存するファイルパスを指定
-            with open(filename, 'wb') as f:
-                # 保存
-                f.write(html)
-            updated_html_path_list.append(filename)
-    return updated_html_path_list
+            # idからurlを作る
+            url_list.append(base_url + id_)
+            filename_list.append(filename)
+    # スクレイピング実行
+    return fetch_html(url_list, filename_list, **fetch_options)
+
+def scrape_html_race(race_id_list: list, skip: bool = True, rate: float = 1.0, max_workers: int = 4):
+    """
+    netkeiba.comのraceページのhtmlをスクレイピングしてdata/html/raceに保存する関数。
+    skip=Trueにすると、すでにhtmlが存在する場合はスキップされ、Falseにすると上書きされる。
+    rateは1秒あたりの最大リクエスト数、max_workersは同時に通信するスレッド数（fetch_htmlを参照）。
+    返り値：新しくスクレイピングしたhtmlのファイルパス
+    """
+    return _scrape_html(race_id_list, UrlPaths.RACE_URL, LocalPaths.HTML_RACE_DIR, 'race_id', skip,
+                        rate=rate, max_workers=max_workers)
 
-def scrape_html_horse(horse_id_list: list, skip: bool = True):
+def scrape_html_horse(horse_id_list: list, skip: bool = True, rate: float = 1.0, max_workers: int = 4):
     """
     netkeiba.comのhorseページのhtmlをスクレイピングしてdata/html/horseに保存する関数。
     skip=Trueにすると、すでにhtmlが存在する場合はスキップされ、Falseにすると上書きされる。
+    rateは1秒あたりの最大リクエスト数、max_workersは同時に通信するスレッド数（fetch_htmlを参照）。
     返り値：新しくスクレイピングしたhtmlのファイルパス
     """
-    updated_html_path_list = []
-    for horse_id in tqdm(horse_id_list):
-        # 保存するファイル名
-        filename = os.path.join(LocalPaths.HTML_HORSE_DIR, horse_id+'.bin')
-        # skipがTrueで、かつbinファイルがすでに存在する場合は飛ばす
-        if skip and os.path.isfile(filename):
-            print('horse_id {} skipped'.format(horse_id))
-        else:
-            # horse_idからurlを作る
-            url = UrlPaths.HORSE_URL + horse_id
-            # 相手サーバーに負担をかけないように1秒待機する
-            time.sleep(1)
-            # スクレイピング実行
-            html = urlopen(url).read()
-            # 保存するファイルパスを指定
-            with open(filename, 'wb') as f:
-                # 保存
-                f.write(html)
-            updated_html_path_list.append(filename)
-    return updated_html_path_list
+    return _scrape_html(horse_id_list, UrlPaths.HORSE_URL, LocalPaths.HTML_HORSE_DIR, 'horse_id', skip,
+                        rate=rate, max_workers=max_workers)
 
-def scrape_html_ped(horse_id_list: list, skip: bool = True):
+def scrape_html_ped(horse_id_list: list, skip: bool = True, rate: float = 1.0, max_workers: int = 4):
     """
     netkeiba.comのhorse/pedページのhtmlをスクレイピングしてdata/html/pedに保存する関数。
     skip=Trueにすると、すでにhtmlが存在する場合はスキップされ、Falseにすると上書きされる。
+    rateは1秒あたりの最大リクエスト数、max_workersは同時に通信するスレッド数（fetch_htmlを参照）。
     返り値：新しくスクレイピングしたhtmlのファイルパス
     """
-    updated_html_path_list = []
-    for horse_id in tqdm(horse_id_list):
-        # 保存するファイル名
-        filename = os.path.join(LocalPaths.HTML_PED_DIR, horse_id+'.bin')
-        # skipがTrueで、かつbinファイルがすでに存在する場合は飛ばす
-        if skip and os.path.isfile(filename):
-            print('horse_id {} skipped'.format(horse_id))
-        else:
-            # horse_idからurlを作る
-            url = UrlPaths.PED_URL + horse_id
-            # 相手サーバーに負担をかけないように1秒待機する
-            time.sleep(1)
-            # スクレイピング実行
-            html = urlopen(url).read()
-            # 保存するファイルパスを指定
-            with open(filename, 'wb') as f:
-                # 保存
-                f.write(html)
-            updated_html_path_list.append(filename)
-    return updated_html_path_list
+    return _scrape_html(horse_id_list, UrlPaths.PED_URL, LocalPaths.HTML_PED_DIR, 'horse_id', skip,
+                        rate=rate, max_workers=max_workers)
 
-def scrape_html_horse_with_master(horse_id_list: list, skip: bool = True):
+def scrape_html_horse_with_master(horse_id_list: list, skip: bool = True, rate: float = 1.0,
+                                  max_workers: int = 4):
     """
     netkeiba.comのhorseページのhtmlをスクレイピングしてdata/html/horseに保存する関数。
     skip=Trueにすると、すでにhtmlが存在する場合はスキップされ、Falseにすると上書きされる。
@@ -98,7 +65,7 @@ def scrape_html_horse_with_master(horse_id_list: list, skip: bool = True):
     """
     ### スクレイピング実行 ###
     print('scraping')
-    updated_html_path_list = scrape_html_horse(horse_id_list, skip)
+    updated_html_path_list = scrape_html_horse(horse_id_list, skip, rate, max_workers)
     # パスから正規表現でhorse_id_listを取得
     horse_id_list = [
         re.findall('horse\W(\d+).bin', html_path)[0] for html_path in updated_html_path_list
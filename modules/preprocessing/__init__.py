@@ -1,7 +1,12 @@
 from ._horse_results_processor import HorseResultsProcessor
 from ._horse_info_processor import HorseInfoProcessor
+from ._horse_results_aggregator import HorseResultsAggregator
+from ._horse_results_feature_store import HorseResultsFeatureStore
+from ._horse_snapshot import HorseSnapshot
+from ._id_encoder import IdEncoder
 from ._data_merger import DataMerger
 from ._feature_engineering import FeatureEngineering
+from ._feature_pipeline import FeaturePipeline
 from ._peds_processor import PedsProcessor
 from ._race_info_processor import RaceInfoProcessor
 from ._results_processor import ResultsProcessor
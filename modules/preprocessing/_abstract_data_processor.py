@@ -1,22 +1,139 @@
+import hashlib
+import os
 import pandas as pd
+from pandas.api.types import is_integer_dtype, is_numeric_dtype
 from abc import ABCMeta, abstractmethod
+from modules.constants import LocalPaths
+from modules.storage import read_rawdata, raw_fingerprint
 
 class AbstractDataProcessor(metaclass=ABCMeta):
-    def __init__(self, filepath: str):
-        self.__raw_data = pd.read_pickle(filepath)
-        self.__preprocessed_data = self._preprocess()
+    # 前処理で使うrawテーブルの列。Noneの場合は全ての列を読み込む
+    _USECOLS = None
+    # date_rangeで行を絞り込む方法（read_rawdataのdate_key）。Noneの場合は絞り込めない
+    _DATE_KEY = None
+    # 前処理後のテーブルの列の型（Dtypesの定数）。Noneの場合は型を変換しない
+    _DTYPES = None
+    # 前処理のバージョン。前処理の内容を変更した場合は値を上げる（古いキャッシュが使われなくなる）
+    _VERSION = 2
+
+    def __init__(self, filepath: str, date_range: tuple = None, lazy: bool = False,
+                 cache: bool = False):
+        """
+        filepathはrawテーブルのpickleファイル、またはRawStoreのディレクトリ。
+        rawテーブルは_USECOLSの列だけを読み込む。
+        date_range=(開始日, 終了日)を指定すると、その期間の行だけを読み込む。
+        lazy=Trueにすると、前処理はpreprocessed_dataに初めてアクセスした時に実行される。
+        また、raw_data, preprocessed_dataはデータをコピーせず、元のデータと値を共有する
+        浅いコピーを返す。列の追加や置き換えは元のデータに影響しないが、
+        値をその場で書き換える操作（inplace=Trueや.locへの代入など）は行わないこと。
+        cache=Trueにすると、前処理後のテーブルをLocalPaths.PREPROCESSED_CACHE_DIRに保存する。
+        rawテーブルのファイル、前処理のバージョン、読み込み条件が同じであれば、次回からは
+        前処理をせずにキャッシュを読み込む（rawテーブルはraw_dataにアクセスした時に読み込む）。
+        """
+        if date_range is not None and self._DATE_KEY is None:
+            raise ValueError('{} does not support date_range'.format(type(self).__name__))
+        self.__filepath = filepath
+        self.__date_range = date_range
+        self.__lazy = lazy
+        self.__raw_data = None
+        self.__preprocessed_data = None
+        self.__cache_path = self.__get_cache_path() if cache else None
+        if self.__cache_path is not None and os.path.isfile(self.__cache_path):
+            self.__preprocessed_data = pd.read_pickle(self.__cache_path)
+        elif not lazy:
+            self.__preprocessed_data = self.__preprocess_and_save()
 
     @abstractmethod
     def _preprocess(self):
         pass
+
+    def _apply_dtypes(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        前処理後のテーブルの列を、_DTYPESの型に変換する。テーブルに無い列は無視する。
+        数値型に変換する列は、変換できない値を欠損値にする。
+        整数型の列に欠損値がある場合は、float32にする。
+        """
+        if self._DTYPES is None:
+            return df
+        columns = {}
+        for col, dtype in self._DTYPES.items():
+            if col not in df.columns:
+                continue
+            sr = df[col]
+            if is_numeric_dtype(dtype) and not is_numeric_dtype(sr):
+                sr = pd.to_numeric(sr, errors='coerce')
+            if is_integer_dtype(dtype) and sr.isna().any():
+                dtype = 'float32'
+            columns[col] = sr.astype(dtype)
+        return df.assign(**columns)
+
+    @property
+    def fingerprint(self) -> tuple:
+        """
+        前処理の結果を決める値（前処理のバージョン、rawテーブルのファイルの状態、読み込み条件）。
+        この値が同じであれば、前処理後のテーブルも同じになる。
+        """
+        versions = tuple(
+            cls.__dict__['_VERSION'] for cls in type(self).__mro__ if '_VERSION' in cls.__dict__
+            )
+        return (versions, raw_fingerprint(self.__filepath), self._USECOLS, self.__date_range)
+
+    @property
+    def filepath(self) -> str:
+        return self.__filepath
+
+    def __get_cache_path(self) -> str:
+        """
+        キャッシュファイルのパス。ファイル名は「クラス名_rawテーブルのパス_読み込み条件」の
+        ハッシュで、rawテーブルや前処理が変わるとファイル名が変わる。
+        """
+        key = repr(self.fingerprint)
+        path_hash = hashlib.sha1(os.path.abspath(self.__filepath).encode()).hexdigest()[:10]
+        key_hash = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(
+            LocalPaths.PREPROCESSED_CACHE_DIR,
+            '{}_{}_{}.pickle'.format(type(self).__name__, path_hash, key_hash)
+            )
+
+    def __preprocess_and_save(self):
+        """
+        前処理を実行し、cache=Trueの場合はキャッシュに保存する。
+        """
+        preprocessed_data = self._apply_dtypes(self._preprocess())
+        if self.__cache_path is not None:
+            cache_dir, filename = os.path.split(self.__cache_path)
+            os.makedirs(cache_dir, exist_ok=True)
+            # 同じrawテーブルの古いキャッシュは削除する
+            prefix = filename.rsplit('_', 1)[0] + '_'
+            for old_filename in os.listdir(cache_dir):
+                if old_filename.startswith(prefix):
+                    os.remove(os.path.join(cache_dir, old_filename))
+            tmp_path = self.__cache_path + '.tmp'
+            pd.to_pickle(preprocessed_data, tmp_path)
+            os.replace(tmp_path, self.__cache_path)
+        return preprocessed_data
+
+    def _copy(self, data):
+        """
+        lazy=Falseの場合は深いコピー、lazy=Trueの場合は浅いコピーを返す。
+        """
+        if isinstance(data, dict):
+            return {key: self._copy(value) for key, value in data.items()}
+        return data.copy(deep=not self.__lazy)
     
     @property
     def raw_data(self):
-        return self.__raw_data.copy()
+        if self.__raw_data is None:
+            self.__raw_data = read_rawdata(
+                self.__filepath, self._USECOLS, self.__date_range, self._DATE_KEY
+                )
+        return self._copy(self.__raw_data)
 
     @property
     def preprocessed_data(self):
-        return self.__preprocessed_data.copy()
+        if self.__preprocessed_data is None:
+            self.__preprocessed_data = self.__preprocess_and_save()
+        return self._copy(self.__preprocessed_data)
 
     #rawデータを一つのファイルにまとめる運用に変更したため、以下は不要
     """def _delete_duplicate(self, old, new):
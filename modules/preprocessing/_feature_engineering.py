@@ -1,8 +1,9 @@
-import os
+import numpy as np
 import pandas as pd
 
 from ._data_merger import DataMerger
-from modules.constants import LocalPaths, HorseResultsCols, Master
+from ._id_encoder import IdEncoder
+from modules.constants import HorseResultsCols, Master
 
 class FeatureEngineering:
     """
@@ -10,17 +11,70 @@ class FeatureEngineering:
     新しい特徴量を作りたいときは、メソッド単位で追加していく。
     各メソッドは依存関係を持たないよう注意。
     """
-    def __init__(self, data_merger: DataMerger):
-        self.__data = data_merger.merged_data.copy()
+    def __init__(self, data_merger: DataMerger, id_encoder: IdEncoder = None):
+        """
+        id_encoderはIDのラベルエンコーディングに使うIdEncoder。
+        指定しない場合は、LocalPaths.MASTER_DIRのマスタを使う共有のインスタンスを使う。
+        """
+        self.__init_data(data_merger.merged_data, id_encoder)
+
+    @classmethod
+    def from_data(cls, merged_data: pd.DataFrame, id_encoder: IdEncoder = None) -> 'FeatureEngineering':
+        """
+        DataMergerを使わずに、マージ済みのテーブル（FeaturePipelineのキャッシュなど）から作成する。
+        """
+        feature_engineering = cls.__new__(cls)
+        feature_engineering.__init_data(merged_data, id_encoder)
+        return feature_engineering
+
+    def __init_data(self, merged_data: pd.DataFrame, id_encoder: IdEncoder):
+        self.__data = merged_data.copy()
+        self.__id_encoder = IdEncoder.shared() if id_encoder is None else id_encoder
+        # ダミー変数化する(列名, カテゴリのリスト)。テーブルを作り直すのは1回で済ませるため、
+        # dumminize_*ではここに登録しておき、__apply_dummiesでまとめて変換する
+        self.__dummy_cols = []
         
     @property
     def featured_data(self):
+        self.__apply_dummies()
         return self.__data
     
+    def __add_dummies(self, target_col: str, categories: list):
+        """
+        target_colを、categoriesの値でダミー変数化する列として登録する。
+        """
+        self.__dummy_cols.append((target_col, list(categories)))
+
+    def __apply_dummies(self):
+        """
+        登録された列をまとめてダミー変数化する。pd.get_dummiesを1列ずつ実行した場合と同じく、
+        元の列を除き、登録した順に「列名_カテゴリ」のuint8の列を末尾に追加する。
+        categoriesに無い値や欠損値の行は、全ての列が0になる。
+        """
+        if not self.__dummy_cols:
+            return
+        n_cols = sum(len(categories) for _, categories in self.__dummy_cols)
+        dummies = np.zeros((len(self.__data), n_cols), dtype=np.uint8)
+        columns = []
+        offset = 0
+        for target_col, categories in self.__dummy_cols:
+            codes = pd.Categorical(self.__data[target_col], categories).codes
+            rows = np.flatnonzero(codes >= 0)
+            dummies[rows, offset + codes[rows]] = 1
+            columns += ['{}_{}'.format(target_col, category) for category in categories]
+            offset += len(categories)
+        self.__data = pd.concat([
+            self.__data.drop([target_col for target_col, _ in self.__dummy_cols], axis=1),
+            pd.DataFrame(dummies, index=self.__data.index, columns=columns)
+            ], axis=1)
+        self.__dummy_cols = []
+
     def add_interval(self):
         """
         前走からの経過日数
         """
+        # 列を追加するので、先に登録済みのダミー変数の列を追加しておく（列の順番を変えないため）
+        self.__apply_dummies()
         self.__data['interval'] = (self.__data['date'] - self.__data['latest']).dt.days
         self.__data.drop('latest', axis=1, inplace=True)
         return self
@@ -29,6 +83,7 @@ class FeatureEngineering:
         """
         レース出走日から日齢を算出
         """
+        self.__apply_dummies()
         # 日齢を算出
         self.__data['age_days'] = (self.__data['date'] - self.__data['birthday']).dt.days
         self.__data.drop('birthday', axis=1, inplace=True)
@@ -38,36 +93,28 @@ class FeatureEngineering:
         """
         weatherカラムをダミー変数化する
         """
-        self.__data['weather'] = pd.Categorical(self.__data['weather'], Master.WEATHER_LIST)
-        self.__data = pd.get_dummies(self.__data, columns=['weather'])
+        self.__add_dummies('weather', Master.WEATHER_LIST)
         return self
     
     def dumminize_race_type(self):
         """
         race_typeカラムをダミー変数化する
         """
-        self.__data['race_type'] = pd.Categorical(
-            self.__data['race_type'], list(Master.RACE_TYPE_DICT.values())
-            )
-        self.__data = pd.get_dummies(self.__data, columns=['race_type'])
+        self.__add_dummies('race_type', list(Master.RACE_TYPE_DICT.values()))
         return self
     
     def dumminize_ground_state(self):
         """
         ground_stateカラムをダミー変数化する
         """
-        self.__data['ground_state'] = pd.Categorical(
-            self.__data['ground_state'], Master.GROUND_STATE_LIST
-            )
-        self.__data = pd.get_dummies(self.__data, columns=['ground_state'])
+        self.__add_dummies('ground_state', Master.GROUND_STATE_LIST)
         return self
     
     def dumminize_sex(self):
         """
         sexカラムをダミー変数化する
         """
-        self.__data['性'] = pd.Categorical(self.__data['性'], Master.SEX_LIST)
-        self.__data = pd.get_dummies(self.__data, columns=['性'])
+        self.__add_dummies('性', Master.SEX_LIST)
         return self
     
     def __label_encode(self, target_col: str):
@@ -75,35 +122,9 @@ class FeatureEngineering:
         引数で指定されたID（horse_id/jockey_id/trainer_id/owner_id/breeder_id）を
         ラベルエンコーディングして、Categorical型に変換する。
         """
-        csv_path = os.path.join(LocalPaths.MASTER_DIR, target_col + '.csv')
-        # ファイルが存在しない場合、空のDataFrameを作成
-        if not os.path.isfile(csv_path):
-            target_master = pd.DataFrame(columns=[target_col, 'encoded_id'])
-        else:
-            target_master = pd.read_csv(csv_path, dtype=object)
-
-        # 後のmaxでエラーになるので、整数に変換
-        target_master['encoded_id'] = target_master['encoded_id'].astype(int)
-
-        # masterに存在しない、新しい情報を抽出
-        new_target = self.__data[[target_col]][
-            ~self.__data[target_col].isin(target_master[target_col])
-            ].drop_duplicates(subset=[target_col])
-        # 新しい情報を登録
-        if len(target_master) > 0:
-            new_target['encoded_id'] = [
-                i+max(target_master['encoded_id']) for i in range(1, len(new_target)+1)
-                ]
-            # 整数に変換
-            new_target['encoded_id'] = new_target['encoded_id'].astype(int)
-        else: # まだ1行も登録されていない場合の処理
-            new_target['encoded_id'] = [i for i in range(len(new_target))]
-        # 元のマスタと繋げる
-        new_target_master = pd.concat([target_master, new_target]).set_index(target_col)['encoded_id']
-        # マスタファイルを更新
-        new_target_master.to_csv(csv_path)
-        # ラベルエンコーディング実行
-        self.__data[target_col] = pd.Categorical(self.__data[target_col].map(new_target_master))
+        self.__data[target_col] = pd.Categorical(
+            self.__id_encoder.encode(target_col, self.__data[target_col])
+            )
         return self
     
     def encode_horse_id(self):
@@ -145,24 +166,19 @@ class FeatureEngineering:
         """
         開催カラムをダミー変数化する
         """
-        self.__data[HorseResultsCols.PLACE] = pd.Categorical(
-            self.__data[HorseResultsCols.PLACE], list(Master.PLACE_DICT.values())
-            )
-        self.__data = pd.get_dummies(self.__data, columns=[HorseResultsCols.PLACE])
+        self.__add_dummies(HorseResultsCols.PLACE, list(Master.PLACE_DICT.values()))
         return self
 
     def dumminize_around(self):
         """
         aroundカラムをダミー変数化する
         """
-        self.__data['around'] = pd.Categorical(self.__data['around'], Master.AROUND_LIST)
-        self.__data = pd.get_dummies(self.__data, columns=['around'])
+        self.__add_dummies('around', Master.AROUND_LIST)
         return self
 
     def dumminize_race_class(self):
         """
         race_classカラムをダミー変数化する
         """
-        self.__data['race_class'] = pd.Categorical(self.__data['race_class'], Master.RACE_CLASS_LIST)
-        self.__data = pd.get_dummies(self.__data, columns=['race_class'])
-        return self
\ No newline at end of file
+        self.__add_dummies('race_class', Master.RACE_CLASS_LIST)
+        return self
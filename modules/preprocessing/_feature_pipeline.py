@@ -0,0 +1,159 @@
+import hashlib
+import os
+import pandas as pd
+
+from ._abstract_data_processor import AbstractDataProcessor
+from ._data_merger import DataMerger
+from ._feature_engineering import FeatureEngineering
+from ._id_encoder import IdEncoder
+from modules.constants import LocalPaths
+
+
+class FeaturePipeline:
+    """
+    前処理済みのテーブルのマージから特徴量の作成までを、設定として宣言しておき実行するクラス。
+    1番目のステージはDataMergerによるマージで、2番目以降のステージはfeature_stepsの各ステップ。
+    各ステージの出力は、入力と設定から作ったキーでcache_dirに保存し、キーが同じであれば次回は読み込む。
+    キーは前のステージのキーを含むので、ステップを変更すると、そのステップ以降のステージだけが再計算される。
+    """
+    # ステージの処理内容を変更した場合は値を上げる（保存済みの出力が全て再計算される）
+    _VERSION = 1
+
+    def __init__(
+        self,
+        results_processor: AbstractDataProcessor,
+        race_info_processor: AbstractDataProcessor,
+        horse_results_processor: AbstractDataProcessor,
+        horse_info_processor: AbstractDataProcessor,
+        peds_processor: AbstractDataProcessor,
+        target_cols: list,
+        group_cols: list,
+        feature_steps: list,
+        n_races_list: list = [5, 9],
+        name: str = 'featured_data',
+        cache_dir: str = LocalPaths.PIPELINE_CACHE_DIR,
+        id_encoder: IdEncoder = None,
+        feature_store_path: str = None,
+        chunk_size: int = None,
+        ):
+        """
+        初期処理
+        各processorは、キャッシュが使える場合に前処理を実行しないよう、lazy=Trueで作成しておく。
+        target_cols, group_cols, n_races_listはDataMergerの設定。
+        feature_stepsはFeatureEngineeringのメソッド名のリストで、順番に実行する。
+        要素をメソッド名のリストにすると、それらのメソッドを1つのステージとしてまとめて実行・保存する。
+        nameは保存するファイル名の先頭に付ける名前。
+        feature_store_path, chunk_sizeはDataMergerに渡す（出力は変わらないのでキーには含めない）。
+        IDのラベルエンコーディングのマスタは追記しかされないので、マスタの状態はキーに含めない。
+        """
+        self.__processors = {
+            'results': results_processor,
+            'race_info': race_info_processor,
+            'horse_results': horse_results_processor,
+            'horse_info': horse_info_processor,
+            'peds': peds_processor,
+            }
+        self.__target_cols = list(target_cols)
+        self.__group_cols = list(group_cols)
+        self.__n_races_list = list(n_races_list)
+        self.__stages = [
+            (step,) if isinstance(step, str) else tuple(step) for step in feature_steps
+            ]
+        for stage in self.__stages:
+            for method_name in stage:
+                if not callable(getattr(FeatureEngineering, method_name, None)) \
+                        or method_name.startswith('_') or method_name == 'from_data':
+                    raise ValueError('unknown feature step: {}'.format(method_name))
+        self.__name = name
+        self.__cache_dir = cache_dir
+        self.__id_encoder = id_encoder
+        self.__feature_store_path = feature_store_path
+        self.__chunk_size = chunk_size
+
+    @property
+    def stage_keys(self) -> list:
+        """
+        各ステージのキー。1番目はマージ、2番目以降はfeature_stepsの各ステップのキー。
+        """
+        merge_config = (
+            self._VERSION,
+            [
+                (key, type(processor).__name__, os.path.abspath(processor.filepath),
+                 processor.fingerprint)
+                for key, processor in self.__processors.items()
+                ],
+            self.__target_cols, self.__group_cols, self.__n_races_list
+            )
+        keys = [hashlib.sha1(repr(merge_config).encode()).hexdigest()]
+        for stage in self.__stages:
+            keys.append(hashlib.sha1(repr((keys[-1], stage)).encode()).hexdigest())
+        return keys
+
+    def run(self) -> pd.DataFrame:
+        """
+        パイプラインを実行し、最後のステージの出力（特徴量のテーブル）を返す。
+        保存済みの出力がある最後のステージから再開し、それ以降のステージを実行・保存する。
+        """
+        keys = self.stage_keys
+        stage_names = ['merge'] + ['+'.join(stage) for stage in self.__stages]
+        # 保存済みの出力がある最後のステージを探す
+        start = 0
+        data = None
+        for i in reversed(range(len(keys))):
+            cache_path = self.__cache_path(i, keys[i])
+            if os.path.isfile(cache_path):
+                data = pd.read_pickle(cache_path)
+                start = i + 1
+                break
+        print('feature pipeline: reused {} stages, running {} stages'.format(
+            start, len(keys) - start
+            ))
+        for i in range(start, len(keys)):
+            print('running stage {}: {}'.format(i, stage_names[i]))
+            if i == 0:
+                data = self.__merge()
+            else:
+                feature_engineering = FeatureEngineering.from_data(data, self.__id_encoder)
+                for method_name in self.__stages[i - 1]:
+                    getattr(feature_engineering, method_name)()
+                data = feature_engineering.featured_data
+            self.__save(i, keys[i], data)
+        return data
+
+    def __merge(self) -> pd.DataFrame:
+        """
+        1番目のステージ。前処理済みのテーブルをDataMergerでマージする。
+        """
+        data_merger = DataMerger(
+            self.__processors['results'],
+            self.__processors['race_info'],
+            self.__processors['horse_results'],
+            self.__processors['horse_info'],
+            self.__processors['peds'],
+            target_cols=self.__target_cols,
+            group_cols=self.__group_cols,
+            feature_store_path=self.__feature_store_path,
+            chunk_size=self.__chunk_size,
+            n_races_list=self.__n_races_list,
+            )
+        data_merger.merge()
+        return data_merger.merged_data
+
+    def __cache_path(self, stage_no: int, key: str) -> str:
+        return os.path.join(
+            self.__cache_dir, '{}_{:02d}_{}.pickle'.format(self.__name, stage_no, key)
+            )
+
+    def __save(self, stage_no: int, key: str, data: pd.DataFrame):
+        """
+        ステージの出力を保存する。同じステージの古い出力は削除する。
+        """
+        os.makedirs(self.__cache_dir, exist_ok=True)
+        prefix = '{}_{:02d}_'.format(self.__name, stage_no)
+        for filename in os.listdir(self.__cache_dir):
+            if filename.startswith(prefix):
+                os.remove(os.path.join(self.__cache_dir, filename))
+        cache_path = self.__cache_path(stage_no, key)
+        tmp_path = cache_path + '.tmp'
+        pd.to_pickle(data, tmp_path)
+        os.replace(tmp_path, cache_path)
@@ -1,15 +1,19 @@
 import pandas as pd
 
 from ._abstract_data_processor import AbstractDataProcessor
+from modules.constants import Dtypes
 from modules.constants import HorseInfoCols as Cols
 
 
 class HorseInfoProcessor(AbstractDataProcessor):
-    def __init__(self, filepath):
+    _USECOLS = [Cols.BIRTHDAY, 'owner_id', 'breeder_id']
+    _DTYPES = Dtypes.HORSE_INFO
+
+    def __init__(self, filepath, lazy: bool = False, cache: bool = False):
         """
         初期処理
         """
-        super().__init__(filepath)
+        super().__init__(filepath, lazy=lazy, cache=cache)
     
     def _preprocess(self):
         """
@@ -20,8 +24,8 @@ class HorseInfoProcessor(AbstractDataProcessor):
         # 生年月日をdatetime型に設定
         df['birthday'] = pd.to_datetime(df[Cols.BIRTHDAY], format="%Y年%m月%d日")
 
-        # インデックス名を与える
-        df.index.name = 'horse_id'
+        # インデックス名を与える（元のデータとインデックスを共有している場合があるため、置き換える）
+        df.index = df.index.rename('horse_id')
 
         # カラム抽出
         df = self._select_columns(df)
@@ -32,7 +36,7 @@ class HorseInfoProcessor(AbstractDataProcessor):
         """
         カラム抽出
         """
-        df = raw.copy()[[
+        df = raw[[
             #Cols.BIRTHDAY, # 生年月日
             #Cols.TRAINER, # 調教師
             #Cols.OWNER, # 馬主
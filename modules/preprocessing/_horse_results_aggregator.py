@@ -0,0 +1,211 @@
+import numpy as np
+import pandas as pd
+from pandas.util import hash_pandas_object
+from tqdm.auto import tqdm
+
+
+class HorseResultsAggregator:
+    """
+    馬の過去成績を、(horse_id, 日付)ごとに「その日付より前のレース」だけで集計するクラス。
+    過去成績を馬ごとに日付順に一度だけ並べ替えておき、累積和の差分を取ることで、
+    直近nレース・全レースの平均を全ての(horse_id, 日付)について一度に計算する。
+    """
+    def __init__(self, horse_results: pd.DataFrame, target_cols: list, group_cols: list):
+        """
+        horse_resultsは前処理後の馬の過去成績テーブル（インデックスがhorse_id）。
+        """
+        # 集計対象列
+        self.__target_cols = target_cols
+        # horse_idと一緒に集計するカテゴリ変数
+        self.__group_cols = group_cols
+        # 日付が欠損している過去成績は、どの日付より前にもならないので除く
+        horse_results = horse_results[horse_results['date'].notna()]
+        # 馬ごとに日付順に並べる（同じ日付の場合は元の順番）
+        self.__horse_index = pd.Index(horse_results.index.unique())
+        horse_codes = self.__horse_index.get_indexer(horse_results.index)
+        dates = horse_results['date'].values.astype('datetime64[ns]')
+        order = np.lexsort((dates, horse_codes))
+        self.__horse_codes = horse_codes[order]
+        self.__dates = dates[order]
+        # 各馬の過去成績の開始位置と、馬ごとの何レース目か
+        self.__starts = np.searchsorted(self.__horse_codes, np.arange(len(self.__horse_index)))
+        self.__positions = np.arange(len(order)) - self.__starts[self.__horse_codes]
+        self.__n_positions = int(self.__positions.max()) + 1 if len(order) > 0 else 1
+        values = horse_results[target_cols].values.astype(float)[order]
+        # history_hashで使う、集計に関わる列（並べ替え後）と、その累積ハッシュ値
+        self.__hash_source = horse_results[['date'] + list(target_cols) + list(group_cols)].iloc[order]
+        self.__row_hashes = None
+        self.__horse_cumsum = self.__cumsum(values, self.__horse_codes)
+        # カテゴリ変数ごとに、(horse_id, カテゴリ, 何レース目か)の順に並べた累積和
+        self.__groups = {}
+        for group_col in group_cols:
+            group_index = pd.Index(horse_results[group_col].dropna().unique())
+            group_codes = group_index.get_indexer(horse_results[group_col])[order]
+            # カテゴリが欠損している過去成績は、どのカテゴリとも一致しない
+            has_group = group_codes >= 0
+            keys = (
+                self.__horse_codes[has_group] * len(group_index) + group_codes[has_group]
+                ) * self.__n_positions + self.__positions[has_group]
+            group_order = np.argsort(keys, kind='mergesort')
+            keys = keys[group_order]
+            self.__groups[group_col] = (
+                group_index,
+                keys,
+                self.__cumsum(
+                    values[has_group][group_order], keys // self.__n_positions
+                    )
+                )
+
+    @staticmethod
+    def __cumsum(values: np.ndarray, group_keys: np.ndarray) -> tuple:
+        """
+        group_keysごとの累積和と、欠損値でない値の累積個数を計算する。
+        桁落ちを防ぐため、累積和はグループごとにリセットする。
+        返り値：(その行までの累積和, その行の手前までの累積和, その行までの個数, その行の手前までの個数)
+        """
+        notna = ~np.isnan(values)
+        filled = np.where(notna, values, 0)
+        cumsum = pd.DataFrame(filled).groupby(group_keys).cumsum().values
+        counts = pd.DataFrame(notna.astype(np.int64)).groupby(group_keys).cumsum().values
+        return cumsum, cumsum - filled, counts, counts - notna
+
+    @staticmethod
+    def __window_mean(cumsum: tuple, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+        """
+        並べ替えた過去成績の[lo, hi)の範囲の平均。lo, hiは同じグループ内の位置。
+        範囲が空の場合や、値が全て欠損値の場合はNaNになる。
+        """
+        inclusive, exclusive, inclusive_counts, exclusive_counts = cumsum
+        sums = np.zeros((len(lo), inclusive.shape[1]))
+        counts = np.zeros((len(lo), inclusive.shape[1]), dtype=np.int64)
+        has_rows = hi > lo
+        last, first = hi[has_rows] - 1, lo[has_rows]
+        sums[has_rows] = inclusive[last] - exclusive[first]
+        counts[has_rows] = inclusive_counts[last] - exclusive_counts[first]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = sums / counts
+        means[counts == 0] = np.nan
+        return means
+
+    @staticmethod
+    def __searchsorted(keys: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """
+        np.searchsorted(keys, values, side='left')と同じ。
+        valuesを並べ替えてから探索すると、直前の探索結果を使えるので速い。
+        """
+        order = np.argsort(values, kind='stable')
+        positions = np.empty(len(values), dtype=np.int64)
+        positions[order] = np.searchsorted(keys, values[order], side='left')
+        return positions
+
+    def __count_past(self, results: pd.DataFrame) -> tuple:
+        """
+        resultsの各行について、その日付より前の過去成績のレース数を数える。
+        返り値：(馬の番号, 過去成績の有無, 並べ替えた過去成績での馬の開始位置, レース数)
+        """
+        horse_codes = self.__horse_index.get_indexer(results['horse_id'])
+        dates = results['date'].values.astype('datetime64[ns]')
+        # 過去成績の無い馬や、日付が欠損している行は集計しない
+        has_horse = (horse_codes >= 0) & ~np.isnat(dates)
+        starts = np.where(has_horse, self.__starts[horse_codes], 0)
+        # 日付を順位に置き換え、(horse_id, 日付)を1つの整数にして二分探索する
+        _, date_ranks = np.unique(np.concatenate([self.__dates, dates]), return_inverse=True)
+        n_dates = int(date_ranks.max()) + 1 if len(date_ranks) > 0 else 1
+        horse_date_keys = self.__horse_codes * n_dates + date_ranks[:len(self.__dates)]
+        n_past = self.__searchsorted(
+            horse_date_keys, horse_codes * n_dates + date_ranks[len(self.__dates):]
+            ) - starts
+        n_past[~has_horse] = 0
+        return horse_codes, has_horse, starts, n_past
+
+    def history_hash(self, results: pd.DataFrame) -> np.ndarray:
+        """
+        resultsの各行について、集計に使われる過去成績（その日付より前のレース）のハッシュ値。
+        過去成績の行ごとのハッシュ値の和なので、集計に使われる行が変わらなければ値も変わらない。
+        """
+        if self.__row_hashes is None:
+            row_hashes = hash_pandas_object(self.__hash_source, index=True).values
+            # 和が桁あふれしないよう、上位48ビットだけを使う
+            self.__row_hashes = pd.Series((row_hashes >> np.uint64(16)).astype(np.int64))\
+                .groupby(self.__horse_codes).cumsum().values
+        _, has_horse, starts, n_past = self.__count_past(results)
+        hashes = np.zeros(len(results), dtype=np.int64)
+        has_past = n_past > 0
+        hashes[has_past] = self.__row_hashes[starts[has_past] + n_past[has_past] - 1]
+        return hashes
+
+    def summarize(self, results: pd.DataFrame, n_races_list: list,
+                  chunk_size: int = None) -> pd.DataFrame:
+        """
+        resultsの各行について、horse_id列の馬の、date列の日付より前の過去成績を集計する。
+        列名は「集計対象列_{n}R」「集計対象列_{カテゴリ変数}_{n}R」（直近nレース）、
+        「集計対象列_allR」「集計対象列_{カテゴリ変数}_allR」（全レース）と、前走の日付「latest」。
+        カテゴリ変数の列は、resultsの同じ列の値と一致する過去成績だけで集計する。
+        chunk_sizeを指定すると、resultsをchunk_size行ずつ集計し、あらかじめ確保した配列に書き込む。
+        集計途中の一時的なメモリ使用量は、resultsの行数ではなくchunk_sizeに比例する。
+        """
+        if chunk_size is None or len(results) <= chunk_size:
+            return self.__summarize(results, n_races_list)
+        # 集計に使う列だけを渡す
+        results_cols = results[['horse_id', 'date'] + list(self.__group_cols)]
+        starts = range(0, len(results), chunk_size)
+        # 集計結果を書き込む配列。平均値の列は1つの2次元配列にまとめ、最後に一度だけDataFrameにする
+        means = None
+        latest = np.empty(len(results), dtype='datetime64[ns]')
+        for start in tqdm(starts):
+            summarized = self.__summarize(
+                results_cols.iloc[start:start+chunk_size], n_races_list
+                )
+            if means is None:
+                mean_cols = summarized.columns.drop('latest')
+                means = np.empty((len(results), len(mean_cols)))
+            end = start + len(summarized)
+            means[start:end] = summarized[mean_cols].values
+            latest[start:end] = summarized['latest'].values
+        summarized = pd.DataFrame(means, columns=mean_cols, index=results.index)
+        summarized['latest'] = latest
+        return summarized
+
+    def __summarize(self, results: pd.DataFrame, n_races_list: list) -> pd.DataFrame:
+        """
+        summarizeの本体。resultsをまとめて集計する。
+        """
+        horse_codes, has_horse, starts, n_past = self.__count_past(results)
+        # 馬ごと・日付順に並べてから集計する（過去成績の配列へのアクセスが連続になるため速い）
+        order = np.lexsort((n_past, horse_codes))
+        restore = np.empty_like(order)
+        restore[order] = np.arange(len(order))
+        horse_codes, has_horse, starts, n_past = \
+            horse_codes[order], has_horse[order], starts[order], n_past[order]
+        # resultsのカテゴリ変数を、過去成績のカテゴリと同じ番号に置き換え、
+        # (horse_id, カテゴリ)ごとの累積和の位置を求める
+        group_bounds = {}
+        for group_col in self.__group_cols:
+            group_index, keys, _ = self.__groups[group_col]
+            codes = group_index.get_indexer(results[group_col])[order]
+            bases = (horse_codes * len(group_index) + codes) * self.__n_positions
+            # 過去成績の無い馬や、過去成績に無いカテゴリは集計しない
+            not_found = ~has_horse | (codes < 0)
+            group_bounds[group_col] = (bases, not_found, self.__searchsorted(keys, bases + n_past))
+
+        windows = ['{}R'.format(n_races) for n_races in n_races_list] + ['allR']
+        lowers = [np.maximum(n_past - n_races, 0) for n_races in n_races_list] + [np.zeros_like(n_past)]
+        columns = {}
+        for window, lower in zip(windows, lowers):
+            means = self.__window_mean(self.__horse_cumsum, starts + lower, starts + n_past)[restore]
+            for i, col in enumerate(self.__target_cols):
+                columns['{}_{}'.format(col, window)] = means[:, i]
+            for group_col in self.__group_cols:
+                _, keys, cumsum = self.__groups[group_col]
+                bases, not_found, hi = group_bounds[group_col]
+                lo = self.__searchsorted(keys, bases + lower)
+                lo[not_found] = hi[not_found]
+                means = self.__window_mean(cumsum, lo, hi)[restore]
+                for i, col in enumerate(self.__target_cols):
+                    columns['{}_{}_{}'.format(col, group_col, window)] = means[:, i]
+        # 前走の日付
+        latest = np.full(len(results), np.datetime64('NaT'), dtype='datetime64[ns]')
+        has_past = n_past > 0
+        latest[has_past] = self.__dates[starts[has_past] + n_past[has_past] - 1]
+        columns['latest'] = latest[restore]
+        return pd.DataFrame(columns, index=results.index)
@@ -0,0 +1,111 @@
+import os
+import numpy as np
+import pandas as pd
+from pandas.util import hash_pandas_object
+
+from ._horse_results_aggregator import HorseResultsAggregator
+
+
+class HorseResultsFeatureStore:
+    """
+    馬の過去成績の集計結果（HorseResultsAggregator.summarizeの出力）を、
+    (race_id, horse_id)ごとにファイルに保存しておくクラス。
+    集計の入力（レースの日付・カテゴリ変数と、その馬の過去成績）が前回から変わっていない行は
+    保存済みの値を使い、新しいレースや、過去成績が更新された馬のそれ以降のレースの行だけを集計し直す。
+    """
+    # 集計方法を変更した場合は値を上げる（保存済みの値が全て集計し直される）
+    _VERSION = 1
+    # 集計の入力のハッシュ値を保存する列
+    _INPUT_HASH_COL = '_input_hash'
+
+    def __init__(self, filepath: str):
+        self.__filepath = filepath
+
+    def summarize(self, horse_results: pd.DataFrame, results: pd.DataFrame,
+                  target_cols: list, group_cols: list, n_races_list: list,
+                  chunk_size: int = None) -> pd.DataFrame:
+        """
+        HorseResultsAggregator(horse_results, target_cols, group_cols).summarize(results, n_races_list)
+        と同じ結果を返す。集計し直した行は、ファイルに保存する。
+        chunk_sizeはHorseResultsAggregator.summarizeに渡す。
+        """
+        config = (self._VERSION, list(target_cols), list(group_cols), list(n_races_list))
+        aggregator = HorseResultsAggregator(horse_results, target_cols, group_cols)
+        input_hash = self.__input_hash(aggregator, results, group_cols)
+        keys = pd.MultiIndex.from_arrays(
+            [results.index, results['horse_id']], names=['race_id', 'horse_id']
+            )
+        saved = self.__load(config)
+        # 入力が変わっていない行は保存済みの値を使う
+        positions = saved.index.get_indexer(keys)
+        found = positions >= 0
+        need = np.ones(len(keys), dtype=bool)
+        need[found] = saved[self._INPUT_HASH_COL].values[positions[found]] != input_hash[found]
+        print('horse_results features: reused {} rows, summarizing {} rows'.format(
+            len(need) - need.sum(), need.sum()
+            ))
+        if need.any():
+            new_summarized = aggregator.summarize(
+                results[need], n_races_list, chunk_size=chunk_size
+                )
+        else:
+            new_summarized = saved.drop(self._INPUT_HASH_COL, axis=1).iloc[:0]
+        summarized = {}
+        for col in new_summarized.columns:
+            values = np.empty(len(keys), dtype=new_summarized[col].dtype)
+            if not need.all():
+                values[~need] = saved[col].values[positions[~need]]
+            values[need] = new_summarized[col].values
+            summarized[col] = values
+        summarized = pd.DataFrame(summarized, index=results.index)
+        if need.any():
+            # 保存済みの行のうち、集計し直した行は置き換える
+            replaced = np.zeros(len(saved), dtype=bool)
+            replaced[positions[need & found]] = True
+            self.__save(config, saved[~replaced], keys[need], new_summarized, input_hash[need])
+        return summarized
+
+    @staticmethod
+    def __input_hash(aggregator: HorseResultsAggregator, results: pd.DataFrame,
+                     group_cols: list) -> np.ndarray:
+        """
+        resultsの各行の集計結果を決める入力のハッシュ値。
+        レースの(race_id, horse_id, 日付, カテゴリ変数)と、その日付より前の過去成績のハッシュ値を合わせる。
+        後の日付の過去成績が追加されても、それより前のレースの行の値は変わらない。
+        """
+        race_hash = hash_pandas_object(
+            results[['horse_id', 'date'] + list(group_cols)], index=True
+            ).values
+        return hash_pandas_object(pd.DataFrame({
+            'race': race_hash,
+            'history': aggregator.history_hash(results),
+            }), index=False).values
+
+    def __load(self, config: tuple) -> pd.DataFrame:
+        """
+        保存済みの集計結果。ファイルが無い場合や集計方法が異なる場合は空のDataFrame。
+        """
+        if os.path.isfile(self.__filepath):
+            saved = pd.read_pickle(self.__filepath)
+            if saved['config'] == config:
+                return saved['features']
+        return pd.DataFrame(
+            {self._INPUT_HASH_COL: pd.Series(dtype=np.uint64)},
+            index=pd.MultiIndex.from_arrays([[], []], names=['race_id', 'horse_id'])
+            )
+
+    def __save(self, config: tuple, saved: pd.DataFrame, keys: pd.MultiIndex,
+               summarized: pd.DataFrame, input_hash: np.ndarray):
+        """
+        集計し直した行を、保存済みの集計結果（置き換える行を除いたもの）に追加して保存する。
+        今回のresultsに含まれないレースの行は、そのまま残す。
+        """
+        updated = summarized.set_axis(keys, axis=0)
+        updated[self._INPUT_HASH_COL] = input_hash
+        features = pd.concat([saved, updated])
+        if not keys.is_unique:
+            features = features[~features.index.duplicated(keep='last')]
+        os.makedirs(os.path.dirname(os.path.abspath(self.__filepath)), exist_ok=True)
+        tmp_path = self.__filepath + '.tmp'
+        pd.to_pickle({'config': config, 'features': features}, tmp_path)
+        os.replace(tmp_path, self.__filepath)
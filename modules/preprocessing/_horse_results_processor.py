@@ -1,17 +1,116 @@
+import numpy as np
 import pandas as pd
-import re
 
 from ._abstract_data_processor import AbstractDataProcessor
-from modules.constants import Master
+from ._parse_utils import map_unique
+from modules.constants import Dtypes, Master
 from modules.constants import HorseResultsCols as Cols
 
 
+def _parse_corner(sr: pd.Series) -> tuple:
+    """
+    通過順（'9-9-8-1'など）の文字列から、最初と最後の数字を取り出す。
+    文字列以外の値（欠損値や、数字1つだけのページで数値として読み込まれた値）はそのまま返す。
+    返り値：(最初のコーナー位置, 最終コーナー位置)
+    """
+    if sr.dtype != object:
+        return sr.copy(), sr.copy()
+
+    def parse(uniques):
+        parsed = uniques.str.extract(r'^\D*(\d+)(?:.*\D(\d+))?\D*$').astype(float)
+        # 数字が1つだけの場合は、最初と最後が同じ
+        parsed[1] = parsed[1].fillna(parsed[0])
+        parsed['is_str'] = uniques.map(lambda x: isinstance(x, str))
+        return parsed
+
+    parsed = map_unique(sr, parse)
+    is_str = parsed['is_str'].fillna(False).astype(bool)
+    corners = []
+    for col in (0, 1):
+        corner = parsed[col].where(is_str, sr)
+        # 欠損値が無い場合は、数字を取り出していた頃と同じく整数型にする
+        corner = pd.to_numeric(corner)
+        if corner.dtype.kind == 'f' and corner.notna().all():
+            corner = corner.astype(int)
+        corners.append(corner)
+    return tuple(corners)
+
+
+def _parse_race_type_course_len(sr: pd.Series) -> tuple:
+    """
+    距離（'芝2500'など）の文字列から、最初の数字以外の部分（race_type）と
+    最初の数字の部分（距離）を1回の正規表現で取り出す。
+    数字と数字以外は交互に現れるので、先頭がどちらかで場合分けする。
+    返り値：(race_type, 10の位を切り捨てた距離)
+    """
+    def parse(uniques):
+        parsed = uniques.str.extract(r'^(?:(\D+)(\d*)|(\d+)(\D*))').replace('', np.nan)
+        race_type = parsed[0].fillna(parsed[3]).map(Master.RACE_TYPE_DICT)
+        course_len = parsed[1].fillna(parsed[2]).astype(float) // 100
+        return pd.DataFrame({'race_type': race_type, 'course_len': course_len})
+
+    parsed = map_unique(sr, parse)
+    return parsed['race_type'], parsed['course_len']
+
+
+def _parse_time_seconds(sr: pd.Series) -> pd.Series:
+    """
+    タイム（'2:01.3'など）の文字列を秒単位に変換する。
+    pd.to_datetimeで'%M:%S.%f', '%M.%S.%f', '%M:%S:%f'を順に試していた頃と同じ値になるよう、
+    分（0〜59）、秒（0〜61）、小数部（1〜9桁）を1回の正規表現で取り出し、
+    ナノ秒単位のTimedeltaにしてから秒に変換する。
+    """
+    if sr.dtype != object:
+        return pd.Series(np.nan, index=sr.index)
+
+    def parse(uniques):
+        parsed = uniques.str.extract(
+            r'^([0-5]?\d)(?::([0-5]?\d|6[01])\.|\.([0-5]?\d|6[01])\.|:([0-5]?\d|6[01]):)(\d{1,9})\Z'
+            )
+        minutes = parsed[0].astype(float)
+        seconds = parsed[1].fillna(parsed[2]).fillna(parsed[3]).astype(float)
+        # 小数部は右側を0で埋めてナノ秒にする（'3' -> 300000000）
+        fraction = parsed[4].astype(float) * 10 ** (9 - parsed[4].str.len())
+        nanoseconds = (minutes * 60 + seconds) * 1e9 + fraction
+        return pd.to_timedelta(nanoseconds, unit='ns').dt.total_seconds()
+
+    return map_unique(sr, parse)
+
+
 class HorseResultsProcessor(AbstractDataProcessor):
-    def __init__(self, filepath):
+    _USECOLS = [
+        Cols.DATE,
+        Cols.PLACE,
+        Cols.WEATHER,
+        Cols.R,
+        Cols.RACE_NAME,
+        Cols.N_HORSES,
+        Cols.WAKUBAN,
+        Cols.UMABAN,
+        Cols.TANSHO_ODDS,
+        Cols.POPULARITY,
+        Cols.RANK,
+        Cols.JOCKEY,
+        Cols.KINRYO,
+        Cols.RACE_TYPE_COURSE_LEN,
+        Cols.GROUND_STATE,
+        Cols.TIME,
+        Cols.RANK_DIFF,
+        Cols.CORNER,
+        Cols.PACE,
+        Cols.NOBORI,
+        Cols.WEIGHT_AND_DIFF,
+        Cols.PRIZE
+        ]
+    _DATE_KEY = Cols.DATE
+    _DTYPES = Dtypes.HORSE_RESULTS
+
+    def __init__(self, filepath, date_range: tuple = None, lazy: bool = False,
+                 cache: bool = False):
         """
         初期処理
         """
-        super().__init__(filepath)
+        super().__init__(filepath, date_range, lazy, cache)
     
     def _preprocess(self):
         """
@@ -30,53 +129,33 @@ class HorseResultsProcessor(AbstractDataProcessor):
         df['date'] = pd.to_datetime(df[Cols.DATE])
         
         # 賞金のNaNを0で埋める
-        df[Cols.PRIZE].fillna(0, inplace=True)
+        df[Cols.PRIZE] = df[Cols.PRIZE].fillna(0)
         
         # 1着の着差を0にする（xが0より小さい場合は、0、xが0以上の場合、xを返す）
-        df[Cols.RANK_DIFF] = df[Cols.RANK_DIFF].map(lambda x: 0 if x<0 else x)
+        df[Cols.RANK_DIFF] = df[Cols.RANK_DIFF].clip(lower=0)
         
         # レース展開データ
-        # n=1: 最初のコーナー位置, n=4: 最終コーナー位置
-        def corner(x, n):
-            if type(x) != str:
-                return x
-            elif n==4:
-                return int(re.findall(r'\d+', x)[-1])
-            elif n==1:
-                return int(re.findall(r'\d+', x)[0])
-
-        df['first_corner'] = df[Cols.CORNER].map(lambda x: corner(x, 1))
-        df['final_corner'] = df[Cols.CORNER].map(lambda x: corner(x, 4))
+        # first_corner: 最初のコーナー位置, final_corner: 最終コーナー位置
+        df['first_corner'], df['final_corner'] = _parse_corner(df[Cols.CORNER])
         
         df['final_to_rank'] = df['final_corner'] - df[Cols.RANK]
         df['first_to_rank'] = df['first_corner'] - df[Cols.RANK]
         df['first_to_final'] = df['first_corner'] - df['final_corner']
         
         # 開催場所（数字以外の文字列を抽出）中央開催・地方開催・海外開催以外をその他（'99'）とする
-        df[Cols.PLACE] = df[Cols.PLACE].str.extract(r'(\D+)')[0].map(Master.PLACE_DICT).fillna('99')
+        df[Cols.PLACE] = map_unique(
+            df[Cols.PLACE], lambda x: x.str.extract(r'(\D+)')[0].map(Master.PLACE_DICT)
+            ).fillna('99')
         
-        # race_type（数字以外の文字列を抽出）
-        df['race_type'] = df[Cols.RACE_TYPE_COURSE_LEN].str.extract(r'(\D+)')[0].map(Master.RACE_TYPE_DICT)
-        # 距離は10の位を切り捨てる（数字の文字列を抽出）
-        df['course_len'] = df[Cols.RACE_TYPE_COURSE_LEN].str.extract(r'(\d+)').astype(float) // 100
+        # race_type（数字以外の文字列）と、距離（数字の文字列。10の位を切り捨てる）
+        df['race_type'], df['course_len'] = _parse_race_type_course_len(df[Cols.RACE_TYPE_COURSE_LEN])
 
         # タイムの値を秒単位に変換
-        # 準備
-        baseformat = '%M:%S.%f'
-        basetime = pd.to_datetime("00:00.0", format=baseformat)
-        to_datetime = lambda x: pd.to_datetime(df[Cols.TIME], format=x, errors='coerce')
-        # 秒単位へのフォーマット変換処理
-        datetime_s = to_datetime(baseformat)
-        # 「x:xx.x」フォーマット以外、許容するフォーマットを定義
-        formats_additional = ['%M.%S.%f', '%M:%S:%f']
-        for format_ in formats_additional:
-            # 秒単位へのフォーマット変換処理
-            datetime_s = datetime_s.fillna(to_datetime(format_))
-        # フォーマット例外は欠損値になる
-        df['time_seconds'] = (datetime_s - basetime).dt.total_seconds()
-
-        # インデックス名を与える
-        df.index.name = 'horse_id'
+        # 「x:xx.x」のほか、「x.xx.x」「x:xx:x」のフォーマットを許容し、それ以外は欠損値になる
+        df['time_seconds'] = _parse_time_seconds(df[Cols.TIME])
+
+        # インデックス名を与える（元のデータとインデックスを共有している場合があるため、置き換える）
+        df.index = df.index.rename('horse_id')
 
         # カラム抽出
         df = self._select_columns(df)
@@ -87,7 +166,7 @@ class HorseResultsProcessor(AbstractDataProcessor):
         """
         カラム抽出
         """
-        df = raw.copy()[[
+        df = raw[[
             #Cols.DATE, # 日付
             Cols.PLACE, # 開催
             Cols.WEATHER, # 天気
@@ -0,0 +1,110 @@
+import os
+import numpy as np
+import pandas as pd
+
+from ._horse_results_aggregator import HorseResultsAggregator
+
+
+class HorseSnapshot:
+    """
+    全ての馬について、現時点までの全ての過去成績を集計した結果（最新のスナップショット）。
+    HorseResultsAggregator.summarizeと同じ列を、horse_id（カテゴリ変数の列は
+    (horse_id, カテゴリ)）をキーにして保存しておき、出馬表の馬の行を直接引く。
+    日付がスナップショット作成時点の過去成績より後のレースであれば、
+    過去成績を集計し直した場合と同じ結果になる。
+    """
+    # 集計方法を変更した場合は値を上げる（古いスナップショットは使えなくなる）
+    _VERSION = 1
+
+    def __init__(self, filepath: str):
+        """
+        buildで保存したスナップショットを読み込む
+        """
+        snapshot = pd.read_pickle(filepath)
+        if snapshot['version'] != self._VERSION:
+            raise ValueError('snapshot version {} is not supported. rebuild it'.format(
+                snapshot['version']
+                ))
+        self.__config = snapshot['config']
+        self.__columns = snapshot['columns']
+        self.__horse_features = snapshot['horse_features']
+        self.__group_features = snapshot['group_features']
+
+    @classmethod
+    def build(cls, horse_results: pd.DataFrame, target_cols: list, group_cols: list,
+              filepath: str, n_races_list: list = [5, 9]):
+        """
+        horse_results（前処理後の馬の過去成績テーブル）の全てのレースを集計して、
+        スナップショットをfilepathに保存する。馬の過去成績を更新した後に実行する。
+        """
+        aggregator = HorseResultsAggregator(horse_results, target_cols, group_cols)
+        # どの過去成績よりも後の日付で集計する
+        as_of = pd.Timestamp.max.floor('D')
+        windows = ['{}R'.format(n_races) for n_races in n_races_list] + ['allR']
+        # horse_idだけで集計する列（カテゴリ変数はどの値とも一致しないよう欠損値にする）
+        horse_ids = horse_results.index.unique()
+        queries = pd.DataFrame({'horse_id': horse_ids, 'date': as_of})
+        for group_col in group_cols:
+            queries[group_col] = np.nan
+        summarized = aggregator.summarize(queries, n_races_list)
+        columns = list(summarized.columns)
+        group_col_names = {
+            group_col: [
+                '{}_{}_{}'.format(target_col, group_col, window)
+                for window in windows for target_col in target_cols
+                ]
+            for group_col in group_cols
+            }
+        horse_col_names = [
+            col for col in columns
+            if not any(col in col_names for col_names in group_col_names.values())
+            ]
+        horse_features = summarized[horse_col_names].set_axis(horse_ids, axis=0)
+        # (horse_id, カテゴリ)で集計する列。馬ごとに、過去成績に出てくるカテゴリの値だけを集計する
+        group_features = {}
+        for group_col in group_cols:
+            pairs = horse_results[[group_col]].dropna().reset_index().drop_duplicates()
+            pairs.columns = ['horse_id', group_col]
+            group_queries = pairs.assign(date=as_of)
+            for other_col in group_cols:
+                if other_col != group_col:
+                    group_queries[other_col] = np.nan
+            group_summarized = aggregator.summarize(group_queries, n_races_list)
+            group_features[group_col] = group_summarized[group_col_names[group_col]]\
+                .set_axis(pd.MultiIndex.from_frame(pairs), axis=0)
+        snapshot = {
+            'version': cls._VERSION,
+            'config': (list(target_cols), list(group_cols), list(n_races_list)),
+            'columns': columns,
+            'horse_features': horse_features,
+            'group_features': group_features,
+            }
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        tmp_path = filepath + '.tmp'
+        pd.to_pickle(snapshot, tmp_path)
+        os.replace(tmp_path, filepath)
+
+    def summarize(self, results: pd.DataFrame, target_cols: list, group_cols: list,
+                  n_races_list: list) -> tuple:
+        """
+        resultsの各行について、スナップショットから集計結果を引く。
+        返り値：(HorseResultsAggregator.summarizeと同じ列のDataFrame,
+                スナップショットで集計できた行かどうかのbool配列)
+        スナップショット内の最新の過去成績以前の日付の行（Falseの行）は、過去成績を集計し直す必要がある。
+        """
+        if (list(target_cols), list(group_cols), list(n_races_list)) != self.__config:
+            raise ValueError('snapshot was built with different target_cols, group_cols or n_races_list')
+        columns = {}
+        horse_features = self.__horse_features.reindex(results['horse_id'])
+        for col in horse_features.columns:
+            columns[col] = horse_features[col].values
+        for group_col, group_features in self.__group_features.items():
+            group_features = group_features.reindex(
+                pd.MultiIndex.from_arrays([results['horse_id'], results[group_col]])
+                )
+            for col in group_features.columns:
+                columns[col] = group_features[col].values
+        summarized = pd.DataFrame({col: columns[col] for col in self.__columns}, index=results.index)
+        # 前走（スナップショット内の最新の過去成績）より後のレースだけが、スナップショットで集計できる
+        covered = (summarized['latest'].isna() | (results['date'] > summarized['latest'])).values
+        return summarized, covered
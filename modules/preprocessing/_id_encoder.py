@@ -0,0 +1,122 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+
+from modules.constants import LocalPaths
+
+
+class IdEncoder:
+    """
+    ID（horse_id/jockey_id/trainer_id/owner_id/breeder_id）を整数にラベルエンコーディングするクラス。
+    IDと整数の対応は「master_dir/ID列名.csv」に保存され、新しいIDには
+    それまでの最大値+1から順に番号を振る（まだ1件も無い場合は0から）。
+    CSVはID列ごとに最初に使う時に1回だけ読み込み、新しいIDの行だけを追記する。
+    """
+    # master_dirごとの共有インスタンス
+    __shared = {}
+
+    def __init__(self, master_dir: str = LocalPaths.MASTER_DIR):
+        self.__master_dir = master_dir
+        # ID列名 -> (IDのIndex, 番号の配列)
+        self.__mappings = {}
+        # ID列名 -> 読み込み・追記した時点のCSVのファイルサイズ
+        self.__file_sizes = {}
+
+    @classmethod
+    def shared(cls, master_dir: str = LocalPaths.MASTER_DIR) -> 'IdEncoder':
+        """
+        master_dirごとに1つのインスタンスを返す。学習用と出馬表用のFeatureEngineeringで、
+        読み込み済みの対応を共有する。
+        """
+        if master_dir not in cls.__shared:
+            cls.__shared[master_dir] = cls(master_dir)
+        return cls.__shared[master_dir]
+
+    def encode(self, target_col: str, ids: pd.Series) -> np.ndarray:
+        """
+        idsの各値を整数に変換する。対応が無いIDは新しく登録し、CSVに追記する。
+        欠損値も1つのIDとして番号を振る。
+        """
+        codes, uniques = pd.factorize(ids)
+        uniques = pd.Index(np.asarray(uniques, dtype=object))
+        if (codes < 0).any():
+            # 欠損値は、最初に現れた位置の順番で登録する
+            first_na = int(np.argmax(codes < 0))
+            na_code = int(codes[:first_na].max()) + 1 if first_na > 0 else 0
+            uniques = uniques.insert(na_code, np.nan)
+            codes = np.where(codes >= na_code, codes + 1, codes)
+            codes[codes < 0] = na_code
+        return self.__encode_unique(target_col, uniques)[codes]
+
+    def __encode_unique(self, target_col: str, uniques: pd.Index) -> np.ndarray:
+        """
+        重複の無いIDを整数に変換する。対応が無いIDは、uniquesの順番で登録する。
+        """
+        index, encoded_ids = self.__load(target_col)
+        positions = index.get_indexer(uniques)
+        is_new = positions < 0
+        if is_new.any():
+            # 他のプロセスがCSVに追記していた場合は、読み込み直してから登録する
+            if self.__file_sizes[target_col] != self.__file_size(target_col):
+                del self.__mappings[target_col]
+                return self.__encode_unique(target_col, uniques)
+            new_ids = uniques[is_new]
+            start = int(encoded_ids.max()) + 1 if len(encoded_ids) > 0 else 0
+            new_encoded_ids = np.arange(start, start + len(new_ids))
+            self.__append(target_col, new_ids, new_encoded_ids)
+            index = index.append(new_ids)
+            encoded_ids = np.concatenate([encoded_ids, new_encoded_ids])
+            self.__mappings[target_col] = (index, encoded_ids)
+            positions[is_new] = np.arange(len(index) - len(new_ids), len(index))
+        return encoded_ids[positions]
+
+    def __csv_path(self, target_col: str) -> str:
+        return os.path.join(self.__master_dir, target_col + '.csv')
+
+    def __file_size(self, target_col: str) -> int:
+        csv_path = self.__csv_path(target_col)
+        return os.path.getsize(csv_path) if os.path.isfile(csv_path) else 0
+
+    def __load(self, target_col: str) -> tuple:
+        """
+        target_colの対応を返す。初めて使う場合はCSVから読み込む。
+        """
+        if target_col not in self.__mappings:
+            csv_path = self.__csv_path(target_col)
+            self.__file_sizes[target_col] = self.__file_size(target_col)
+            if self.__file_sizes[target_col] > 0:
+                master = pd.read_csv(csv_path, dtype=object)
+                # 書き込み途中で止まった行は使わない
+                master = master[master['encoded_id'].notna()]
+                index = pd.Index(master[target_col], dtype=object)
+                encoded_ids = master['encoded_id'].astype(np.int64).values
+            else:
+                index = pd.Index([], dtype=object)
+                encoded_ids = np.array([], dtype=np.int64)
+            self.__mappings[target_col] = (index, encoded_ids)
+        return self.__mappings[target_col]
+
+    def __append(self, target_col: str, new_ids: pd.Index, new_encoded_ids: np.ndarray):
+        """
+        新しいIDの行をCSVに追記する。追記する行はまとめて1回で書き込む。
+        """
+        os.makedirs(self.__master_dir, exist_ok=True)
+        has_header = self.__file_sizes[target_col] > 0
+        buffer = io.StringIO()
+        pd.DataFrame({target_col: new_ids, 'encoded_id': new_encoded_ids}).to_csv(
+            buffer, index=False, header=not has_header
+            )
+        text = buffer.getvalue()
+        csv_path = self.__csv_path(target_col)
+        if has_header:
+            # 前回の書き込みが行の途中で止まっていた場合は、改行してから追記する
+            with open(csv_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    text = '\n' + text
+        with open(csv_path, 'a', encoding='utf-8', newline='') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        self.__file_sizes[target_col] = self.__file_size(target_col)
@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+
+def map_unique(sr: pd.Series, parse):
+    """
+    srのユニークな値（欠損値を除く）だけをparseで変換し、srの各行に展開する。
+    文字列の列は値の種類が行数よりずっと少ないので、全ての行を変換するより速い。
+    parseはユニークな値のSeriesを受け取り、同じ長さのSeriesまたはDataFrameを返す関数。
+    欠損値の行は欠損値になる。欠損値の行が無ければ、parseの返り値の型のまま展開する。
+    """
+    codes, uniques = pd.factorize(sr)
+    parsed = parse(pd.Series(uniques, dtype=object))
+    if (codes < 0).any():
+        # 欠損値の行（codes == -1）は、末尾に追加した欠損値の行を参照させる
+        parsed = parsed.reindex(range(len(uniques) + 1))
+        codes = np.where(codes < 0, len(uniques), codes)
+    parsed = parsed.take(codes)
+    parsed.index = sr.index
+    return parsed
@@ -6,8 +6,8 @@ class PedsProcessor(AbstractDataProcessor):
     """
     初期処理
     """
-    def __init__(self, filepath):
-        super().__init__(filepath)
+    def __init__(self, filepath, lazy: bool = False, cache: bool = False):
+        super().__init__(filepath, lazy=lazy, cache=cache)
     
     """
     前処理
@@ -1,12 +1,17 @@
 import pandas as pd
 from ._abstract_data_processor import AbstractDataProcessor
+from modules.constants import Dtypes
 
 class RaceInfoProcessor(AbstractDataProcessor):
-    def __init__(self, filepath):
+    _DATE_KEY = 'race_id'
+    _DTYPES = Dtypes.RACE_INFO
+
+    def __init__(self, filepath, date_range: tuple = None, lazy: bool = False,
+                 cache: bool = False):
         """
         初期処理
         """
-        super().__init__(filepath)
+        super().__init__(filepath, date_range, lazy, cache)
         
     def _preprocess(self):
         """
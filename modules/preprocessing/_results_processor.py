@@ -1,37 +1,79 @@
+import numpy as np
 import pandas as pd
 
 from ._abstract_data_processor import AbstractDataProcessor
+from ._parse_utils import map_unique
+from modules.constants import Dtypes
 from modules.constants import ResultsCols as Cols
 
 
+def _parse_sex_age(sr: pd.Series) -> tuple:
+    """
+    性齢（'牡3'など）を、1文字目（性）と2文字目以降（年齢）に分ける。
+    返り値：(性, 年齢)
+    """
+    def parse(uniques):
+        return uniques.astype(str).str.extract(r'(?s)^(.?)(.*)$')
+
+    parsed = map_unique(sr, parse)
+    return parsed[0], parsed[1].astype(int)
+
+
+def _parse_weight_and_diff(sr: pd.Series) -> tuple:
+    """
+    馬体重（'480(-4)'など）を、'('より前の部分（体重）と、'('より後の部分から末尾の')'を除いたもの
+    （体重変化）に分け、それぞれ数値に変換する。"計不"など変換できない値は欠損値にする。
+    返り値：(体重, 体重変化)
+    """
+    def parse(uniques):
+        parsed = uniques.str.extract(r'(?s)^([^(]*)(?:\(([^(]*))?')
+        parsed[1] = parsed[1].str[:-1]
+        return parsed.apply(pd.to_numeric, errors='coerce')
+
+    parsed = map_unique(sr, parse)
+    return parsed[0], parsed[1]
+
+
 class ResultsProcessor(AbstractDataProcessor):
-    def __init__(self, filepath):
+    _USECOLS = [
+        Cols.RANK,
+        Cols.WAKUBAN,
+        Cols.UMABAN,
+        Cols.SEX_AGE,
+        Cols.KINRYO,
+        Cols.TANSHO_ODDS,
+        Cols.WEIGHT_AND_DIFF,
+        'horse_id',
+        'jockey_id',
+        'trainer_id',
+        'owner_id'
+        ]
+    _DATE_KEY = 'race_id'
+    _DTYPES = Dtypes.RESULTS
+
+    def __init__(self, filepath, date_range: tuple = None, lazy: bool = False,
+                 cache: bool = False):
         """
         初期処理
         """
-        super().__init__(filepath)
+        super().__init__(filepath, date_range, lazy, cache)
     
     def _preprocess(self):
         """
         前処理
         """
-        df = self.raw_data.copy()
+        df = self.raw_data
         
         # 着順の前処理
         df = self._preprocess_rank(df)
         
         # 性齢を性と年齢に分ける
         # サイト上のテーブルに存在する列名は、ResultsColsクラスで定数化している。
-        df["性"] = df[Cols.SEX_AGE].map(lambda x: str(x)[0])
-        df["年齢"] = df[Cols.SEX_AGE].map(lambda x: str(x)[1:]).astype(int)
+        df["性"], df["年齢"] = _parse_sex_age(df[Cols.SEX_AGE])
 
         # 馬体重を体重と体重変化に分ける
-        df["体重"] = df[Cols.WEIGHT_AND_DIFF].str.split("(", expand=True)[0]
-        df["体重変化"] = df[Cols.WEIGHT_AND_DIFF].str.split("(", expand=True)[1].str[:-1]
-        
-        # errors='coerce'で、"計不"など変換できない時に欠損値にする
-        df['体重'] = pd.to_numeric(df['体重'], errors='coerce')
-        df['体重変化'] = pd.to_numeric(df['体重変化'], errors='coerce')
+        # "計不"など変換できない時は欠損値にする
+        df["体重"], df["体重変化"] = _parse_weight_and_diff(df[Cols.WEIGHT_AND_DIFF])
 
         # 各列を数値型に変換
         df[Cols.TANSHO_ODDS] = df[Cols.TANSHO_ODDS].astype(float)
@@ -40,7 +82,7 @@ class ResultsProcessor(AbstractDataProcessor):
         df[Cols.UMABAN] = df[Cols.UMABAN].astype(int)
         
         # 6/6出走数追加
-        df['n_horses'] = df.index.map(df.index.value_counts())
+        df['n_horses'] = df.groupby(level=0)[Cols.UMABAN].transform('size')
         
         # カラム抽出
         df = self._select_columns(df)
@@ -55,12 +97,12 @@ class ResultsProcessor(AbstractDataProcessor):
         """
         着順の前処理
         """
-        df = raw.copy()
+        df = raw
         # 着順に数字以外の文字列が含まれているものを取り除く
-        df[Cols.RANK] = pd.to_numeric(df[Cols.RANK], errors='coerce')
+        df[Cols.RANK] = map_unique(df[Cols.RANK], lambda x: pd.to_numeric(x, errors='coerce'))
         df.dropna(subset=[Cols.RANK], inplace=True)
         df[Cols.RANK] = df[Cols.RANK].astype(int)
-        df['rank'] = df[Cols.RANK].map(lambda x:1 if x<4 else 0)
+        df['rank'] = (df[Cols.RANK] < 4).astype(int)
         return df
 
     def _sort(self, raw):
@@ -68,19 +110,17 @@ class ResultsProcessor(AbstractDataProcessor):
         各レースを馬番順にソートする。
         ※ 各レース内のソート。レースの順序自体はrace_idの名前順になる。
         """
-        df = raw.copy()
-        df = df.reset_index().sort_values(['index', Cols.UMABAN]).set_index('index')
-        df.index.name = None
-        # NOTE:
-        # df.groupby(level=0, group_keys=False).apply(lambda x: x.sort_values(Cols.UMABAN))
-        # と同じ。groupbyを使う方がやや遅い。
-        return df
+        # race_idを名前順の番号に変換し、(race_id, 馬番)の順に安定ソートする。
+        # インデックスを列に戻さずに並べ替えるので、reset_index/set_indexよりも速い。
+        race_codes, _ = pd.factorize(raw.index, sort=True)
+        order = np.lexsort((raw[Cols.UMABAN].values, race_codes))
+        return raw.take(order)
     
     def _select_columns(self, raw):
         """
         カラム抽出
         """
-        df = raw.copy()[[
+        df = raw[[
             #Cols.RANK, # 着順
             Cols.WAKUBAN, # 枠番
             Cols.UMABAN, # 馬番
@@ -1,109 +1,133 @@
+import itertools
+import numpy as np
 import pandas as pd
+
 from ._abstract_data_processor import AbstractDataProcessor
+from ._parse_utils import map_unique
+from modules.constants import Master
+
+# 組み合わせの馬番の列
+_WIN_COLS = ['win_0', 'win_1', 'win_2']
+
+
+def _split_br(sr: pd.Series) -> tuple:
+    """
+    複数の値が'br'区切りで入っている列を分割する。値の種類は行数より少ないので、ユニークな値だけを分割する。
+    返り値：(分割した値を並べたSeries, 各行の分割した値の開始位置, 各行の値の数)
+    """
+    codes, uniques = pd.factorize(sr.astype(str))
+    split_values = [text.split('br') for text in uniques]
+    counts = np.fromiter(map(len, split_values), dtype=np.int64, count=len(split_values))
+    values = pd.Series(list(itertools.chain.from_iterable(split_values)), dtype=object)
+    starts = np.cumsum(counts) - counts
+    return values, starts[codes], counts[codes]
+
 
 class ReturnProcessor(AbstractDataProcessor):
-    def __init__(self, filepath):
+    _DATE_KEY = 'race_id'
+    _VERSION = 2
+
+    def __init__(self, filepath, date_range: tuple = None, lazy: bool = False,
+                 cache: bool = False):
         """
         初期処理
         """
-        super().__init__(filepath)
-    
+        # preprocessed_data（券種ごとの払い戻しテーブルのdict）。payout_tableから作成する
+        self.__return_tables = None
+        super().__init__(filepath, date_range, lazy, cache)
+
     def _preprocess(self):
         """
         前処理
+        全ての券種の払い戻しを、1行が1つの的中の組み合わせの縦長のテーブルにまとめる。
+        インデックスは(race_id, ticket_type, combination)。combinationは、そのレース・券種の
+        何番目の組み合わせか（複勝・ワイドや同着の場合は複数の組み合わせがある）。
+        列は組み合わせの馬番（win_0〜win_2。馬の数が少ない券種の残りの列は0）と、払い戻し金額（return）。
+        """
+        # rawテーブルのコピーは1回で済ませる
+        raw = self.raw_data
+        raw = raw[raw[0].isin(Master.TICKET_TYPE_DICT)]
+        # 複数の組み合わせは'br'区切りになっているので、組み合わせごとに分ける
+        win_values, win_starts, n_wins = _split_br(raw[1])
+        return_values, return_starts, n_returns = _split_br(raw[2])
+        # 馬番と払い戻しの数が合わない行は、少ない方に揃える
+        n_combinations = np.minimum(n_wins, n_returns)
+        rows = np.repeat(np.arange(len(raw)), n_combinations)
+        combinations = np.arange(len(rows)) - np.repeat(
+            np.cumsum(n_combinations) - n_combinations, n_combinations
+            )
+        # '3 - 7'や'7 → 5 → 10'から馬番を取り出す
+        wins = map_unique(
+            win_values,
+            lambda x: x.str.extract(r'^\D*(\d+)(?:\D+(\d+))?(?:\D+(\d+))?\D*$').astype(float)
+            ).take(win_starts[rows] + combinations)
+        returns = map_unique(
+            return_values,
+            lambda x: pd.to_numeric(x.str.replace(',', '', regex=False), errors='coerce')
+            ).take(return_starts[rows] + combinations)
+        payout_table = pd.DataFrame({
+            'win_0': wins[0].values,
+            'win_1': wins[1].values,
+            'win_2': wins[2].values,
+            'return': returns.values,
+            }, index=pd.MultiIndex.from_arrays([
+                raw.index.values[rows],
+                raw[0].map(Master.TICKET_TYPE_DICT).values[rows],
+                combinations
+                ], names=['race_id', 'ticket_type', 'combination']))
+        # 馬番や払い戻し金額を読み取れない組み合わせは除く
+        payout_table = payout_table[payout_table[['win_0', 'return']].notna().all(axis=1)]
+        return payout_table.fillna(0).astype({
+            'win_0': 'int8', 'win_1': 'int8', 'win_2': 'int8', 'return': 'int32'
+            })
+
+    @property
+    def payout_table(self) -> pd.DataFrame:
         """
-        return_dict = {}
-        return_dict['tansho'] = self.__tansho()
-        return_dict['fukusho'] = self.__fukusho()
-        return_dict['umaren'] = self.__umaren()
-        return_dict['umatan'] = self.__umatan()
-        return_dict['wide'] = self.__wide()
-        return_dict['sanrentan'] = self.__sanrentan()
-        return_dict['sanrenpuku'] = self.__sanrenpuku()        
-        return return_dict
-    
-    def __tansho(self):
-        """
-        単勝
-        """
-        tansho = self.raw_data[self.raw_data[0]=='単勝'][[1,2]]
-        tansho.columns = ['win', 'return']
-        
-        for column in tansho.columns:
-            tansho[column] = pd.to_numeric(tansho[column], errors='coerce')
-            
-        return tansho
-    
-    def __fukusho(self):
-        """
-        複勝
-        """
-        fukusho = self.raw_data[self.raw_data[0]=='複勝'][[1,2]]
-        wins = fukusho[1].str.split('br', expand=True)[[0,1,2]]
-        
-        wins.columns = ['win_0', 'win_1', 'win_2']
-        returns = fukusho[2].str.split('br', expand=True)[[0,1,2]]
-        returns.columns = ['return_0', 'return_1', 'return_2']
-        
-        df = pd.concat([wins, returns], axis=1)
-        for column in df.columns:
-            df[column] = df[column].str.replace(',', '')
-        return df.fillna(0).astype(int)
-    
-    
-    def __umaren(self):
-        """
-        馬連
-        """
-        umaren = self.raw_data[self.raw_data[0]=='馬連'][[1,2]]
-        wins = umaren[1].str.split('-', expand=True)[[0,1]].add_prefix('win_')
-        return_ = umaren[2].rename('return')  
-        df = pd.concat([wins, return_], axis=1)        
-        return df.apply(lambda x: pd.to_numeric(x, errors='coerce'))
-    
-    
-    def __umatan(self):
-        """
-        馬単
-        """
-        umatan = self.raw_data[self.raw_data[0]=='馬単'][[1,2]]
-        wins = umatan[1].str.split('→', expand=True)[[0,1]].add_prefix('win_')
-        return_ = umatan[2].rename('return')  
-        df = pd.concat([wins, return_], axis=1)        
-        return df.apply(lambda x: pd.to_numeric(x, errors='coerce'))
-    
-    
-    def __wide(self):
-        """
-        ワイド
-        """
-        wide = self.raw_data[self.raw_data[0]=='ワイド'][[1,2]]
-        wins = wide[1].str.split('br', expand=True)[[0,1,2]]
-        wins = wins.stack().str.split('-', expand=True).add_prefix('win_')
-        return_ = wide[2].str.split('br', expand=True)[[0,1,2]]
-        return_ = return_.stack().rename('return')
-        df = pd.concat([wins, return_], axis=1)
-        return df.apply(lambda x: pd.to_numeric(x.str.replace(',',''), errors='coerce'))
-    
-    
-    def __sanrentan(self):
-        """
-        三連単
-        """
-        rentan = self.raw_data[self.raw_data[0]=='三連単'][[1,2]]
-        wins = rentan[1].str.split('→', expand=True)[[0,1,2]].add_prefix('win_')
-        return_ = rentan[2].rename('return')
-        df = pd.concat([wins, return_], axis=1) 
-        return df.apply(lambda x: pd.to_numeric(x, errors='coerce'))
-    
-    
-    def __sanrenpuku(self):
-        """
-        三連複
+        全ての券種の払い戻しをまとめた縦長のテーブル（前処理後のテーブル）
         """
-        renpuku = self.raw_data[self.raw_data[0]=='三連複'][[1,2]]
-        wins = renpuku[1].str.split('-', expand=True)[[0,1,2]].add_prefix('win_')
-        return_ = renpuku[2].rename('return')
-        df = pd.concat([wins, return_], axis=1) 
-        return df.apply(lambda x: pd.to_numeric(x, errors='coerce'))
-    
\ No newline at end of file
+        return super().preprocessed_data
+
+    @property
+    def preprocessed_data(self) -> dict:
+        """
+        券種ごとの払い戻しテーブルのdict。payout_tableを券種ごとに分けて作成する。
+        単勝・馬連・馬単・三連複・三連単はレースごとに1行（1番目の組み合わせ）、
+        複勝は1〜3番目の組み合わせを横に並べた1行、ワイドは1〜3番目の組み合わせの3行。
+        """
+        if self.__return_tables is None:
+            payout_table = super().preprocessed_data
+            # 券種は文字列で比較せず、インデックスのレベルの番号で比較する
+            ticket_types = payout_table.index.levels[1]
+            ticket_type_codes = payout_table.index.codes[1]
+            first_3 = payout_table.index.get_level_values('combination') < 3
+            self.__return_tables = {}
+            for ticket_type, (n_horses, _) in Master.TICKET_COMBINATION_DICT.items():
+                is_ticket_type = ticket_type_codes == (
+                    ticket_types.get_loc(ticket_type) if ticket_type in ticket_types else -1
+                    )
+                self.__return_tables[ticket_type] = self.__to_return_table(
+                    payout_table[is_ticket_type & first_3],
+                    ticket_type, _WIN_COLS[:n_horses] + ['return']
+                    )
+        return self._copy(self.__return_tables)
+
+    @staticmethod
+    def __to_return_table(table: pd.DataFrame, ticket_type: str, columns: list) -> pd.DataFrame:
+        """
+        1つの券種の行だけにしたpayout_tableを、券種ごとの払い戻しテーブルの形式にする。
+        """
+        # 1行ずつ参照されるので、列の型を揃えておく（型が混ざっていると行の取り出しが遅い）
+        table = table[columns].droplevel('ticket_type').astype('int64')
+        if ticket_type == 'wide':
+            return table.rename_axis([None, None])
+        if ticket_type == 'fukusho':
+            # 1〜3番目の組み合わせを横に並べる（組み合わせが無い場合は0）
+            table = table.unstack('combination', fill_value=0)\
+                .reindex(columns=pd.MultiIndex.from_product([columns, range(3)]), fill_value=0)
+            table.columns = ['{}_{}'.format(col.rsplit('_', 1)[0], i) for col, i in table.columns]
+            return table.rename_axis(None)
+        table = table[table.index.get_level_values('combination') == 0].droplevel('combination')
+        if ticket_type == 'tansho':
+            table = table.rename(columns={'win_0': 'win'})
+        return table.rename_axis(None)
@@ -1,6 +1,9 @@
+import numpy as np
 import pandas as pd
 
 from ._data_merger import DataMerger
+from ._horse_results_aggregator import HorseResultsAggregator
+from ._horse_snapshot import HorseSnapshot
 from modules.preprocessing import ShutubaTableProcessor
 from modules.preprocessing import HorseResultsProcessor
 from modules.preprocessing import HorseInfoProcessor
@@ -13,15 +16,20 @@ class ShutubaDataMerger(DataMerger):
                  horse_info_processor: HorseInfoProcessor,
                  peds_processor: PedsProcessor, 
                  target_cols: list, 
-                 group_cols: list
+                 group_cols: list,
+                 horse_snapshot: HorseSnapshot = None,
+                 n_races_list: list = [5, 9]
                  ):
         """
         初期処理
+        horse_snapshotを指定すると、馬の過去成績を集計する代わりにスナップショットから引く。
+        スナップショット作成時点の最新の過去成績より前の日付のレースの場合だけ、過去成績を集計する。
         """
         # レース結果テーブル（前処理後）
         self._results = shutuba_table_processor.preprocessed_data
-        # 馬の過去成績テーブル（前処理後）
-        self._horse_results = horse_results_processor.preprocessed_data
+        # 馬の過去成績テーブル（前処理後）。集計が必要になった時に読み込む
+        self._horse_results_processor = horse_results_processor
+        self._horse_results = None
         # 馬の基本情報テーブル（前処理後）
         self._horse_info = horse_info_processor.preprocessed_data
         # 血統テーブル（前処理後）
@@ -30,17 +38,51 @@ class ShutubaDataMerger(DataMerger):
         self._target_cols = target_cols
         # horse_idと一緒にターゲットエンコーディングしたいカテゴリ変数
         self._group_cols = group_cols
+        # 馬の過去成績を集計する直近のレース数
+        self._n_races_list = n_races_list
+        # 出馬表は毎回新しいレースなので、馬の過去成績の集計結果は保存しない
+        self._feature_store_path = None
+        # 出馬表は行数が少ないので、まとめて集計する
+        self._chunk_size = None
+        # 馬の過去成績の集計結果のスナップショット
+        self._horse_snapshot = horse_snapshot
         # 全てのマージが完了したデータ
         self._merged_data = pd.DataFrame()
-        # 日付(date列)ごとに分かれたレース結果
-        self._separated_results_dict = {}
-        # レース結果データのdateごとに分かれた馬の過去成績
-        self._separated_horse_results_dict = {}
         
     def merge(self):
         """
         マージ処理
         """
-        self._merge_horse_results()
+        self._merge_horse_results(self._n_races_list)
         self._merge_horse_info()
-        self._merge_peds()
\ No newline at end of file
+        self._merge_peds()
+
+    def _summarize_horse_results(self, results, n_races_list):
+        """
+        resultsの各行について、馬の過去成績を集計する
+        """
+        if self._horse_snapshot is None:
+            self._load_horse_results()
+            return super()._summarize_horse_results(results, n_races_list)
+        summarized, covered = self._horse_snapshot.summarize(
+            results, self._target_cols, self._group_cols, n_races_list
+            )
+        if not covered.all():
+            # スナップショットに、レースの日付以降の過去成績が含まれている馬は集計し直す
+            self._load_horse_results()
+            aggregator = HorseResultsAggregator(
+                self._horse_results, self._target_cols, self._group_cols
+                )
+            recomputed = aggregator.summarize(results[~covered], n_races_list)
+            rows = np.flatnonzero(~covered)
+            for i, col in enumerate(summarized.columns):
+                summarized.iloc[rows, i] = recomputed[col].values
+        return summarized
+
+    def _load_horse_results(self):
+        """
+        馬の過去成績テーブル（前処理後）を読み込む。
+        スナップショットで全ての馬を引ける場合は読み込まない。
+        """
+        if self._horse_results is None:
+            self._horse_results = self._horse_results_processor.preprocessed_data
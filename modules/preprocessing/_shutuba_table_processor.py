@@ -1,10 +1,16 @@
 import pandas as pd
 from ._results_processor import ResultsProcessor
+from modules.constants import Dtypes
 from modules.constants import ResultsCols as Cols
 
 class ShutubaTableProcessor(ResultsProcessor):
-    def __init__(self, filepath: str):
-        super().__init__(filepath)
+    # 出馬表はレース情報の列も使うため、全ての列を読み込む
+    _USECOLS = None
+    _DATE_KEY = None
+    _DTYPES = Dtypes.SHUTUBA_TABLE
+
+    def __init__(self, filepath: str, lazy: bool = False, cache: bool = False):
+        super().__init__(filepath, lazy=lazy, cache=cache)
 
     def _preprocess(self):
         df = super()._preprocess()
@@ -13,7 +19,9 @@ class ShutubaTableProcessor(ResultsProcessor):
         df["course_len"] = df["course_len"].astype(float) // 100
         
         # 開催場所
-        df['開催'] = df.index.map(lambda x:str(x)[4:6])
+        # race_idの種類はレース数だけなので、ユニークな値だけを変換する
+        codes, race_ids = pd.factorize(df.index)
+        df['開催'] = race_ids.astype(str).str[4:6].values[codes]
         
         # 日付型に変更
         df["date"] = pd.to_datetime(df["date"])
@@ -23,7 +31,7 @@ class ShutubaTableProcessor(ResultsProcessor):
         return raw
     
     def _select_columns(self, raw):
-        df = raw.copy()[[\
+        df = raw[[\
             Cols.WAKUBAN, # 枠番
             Cols.UMABAN, # 馬番
             Cols.KINRYO, # 斤量
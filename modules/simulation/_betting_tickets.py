@@ -1,20 +1,135 @@
+import numpy as np
+from modules.constants import Master
 from modules.preprocessing import ReturnProcessor
-from itertools import permutations
 from scipy.special import comb
 
+
+def to_umaban_mask(umaban: list) -> int:
+    """
+    馬番のリストを、馬番のビットを立てた整数（集合）にする
+    """
+    mask = 0
+    for u in umaban:
+        mask |= 1 << int(u)
+    return mask
+
+
+def n_box_bets(ticket_type: str, n_horses: np.ndarray) -> np.ndarray:
+    """
+    n_horses頭に、ticket_typeの馬券を賭けた時（単勝・複勝は各馬に1枚ずつ、それ以外はBOX）の、
+    bet_*と同じ馬券の枚数
+    """
+    k = np.asarray(n_horses, dtype=float)
+    if ticket_type in ('tansho', 'fukusho'):
+        return k
+    if ticket_type == 'umaren':
+        # bet_umaren_boxは、2頭（1枚）の場合は賭けない
+        return np.where(k == 2, 0, k * (k - 1) / 2)
+    if ticket_type == 'umatan':
+        return k * (k - 1)
+    if ticket_type == 'wide':
+        return k * (k - 1) / 2
+    if ticket_type == 'sanrenpuku':
+        return k * (k - 1) * (k - 2) / 6
+    if ticket_type == 'sanrentan':
+        return k * (k - 1) * (k - 2)
+    raise KeyError(ticket_type)
+
+
+def _popcount(masks: np.ndarray) -> np.ndarray:
+    """
+    各整数の立っているビットの数（集合の要素数）
+    """
+    bytes_ = np.ascontiguousarray(masks, dtype='<u8').view(np.uint8).reshape(-1, 8)
+    return np.unpackbits(bytes_, axis=1).sum(axis=1)
+
+
 class BettingTickets:
     """
     馬券の買い方と、賭けた時のリターンを計算する。
+    払い戻しテーブルは、券種ごとに「レースの番号 x 組み合わせ」の配列にしておく。
+    的中した組み合わせは馬番のビットを立てた整数（集合）で持ち、BOX馬券の的中判定は
+    賭けた馬番の集合との包含判定で行う。
     """
     def __init__(self, returnProcessor: ReturnProcessor) -> None:
-        self.__returnTables = returnProcessor.preprocessed_data
-        self.__returnTablesTansho = self.__returnTables['tansho']
-        self.__returnTablesFukusho = self.__returnTables['fukusho']
-        self.__returnTablesUmaren = self.__returnTables['umaren']
-        self.__returnTablesUmatan = self.__returnTables['umatan']
-        self.__returnTablesWide = self.__returnTables['wide']
-        self.__returnTablesSanrenpuku = self.__returnTables['sanrenpuku']
-        self.__returnTablesSanrentan = self.__returnTables['sanrentan']
+        payout_table = returnProcessor.payout_table
+        # race_id -> レースの番号
+        race_ids = payout_table.index.get_level_values('race_id').unique()
+        self.__race_ids = race_ids
+        self.__race_no = {race_id: i for i, race_id in enumerate(race_ids)}
+        ticket_types = payout_table.index.get_level_values('ticket_type')
+        combinations = payout_table.index.get_level_values('combination')
+        # 券種 -> (そのレースの払い戻しがあるかどうか, 組み合わせの馬番, 組み合わせの集合, 払い戻し)
+        # 1レースずつ賭ける場合はリスト、まとめて賭ける場合（bet_boxes）は配列を使う
+        self.__tables = {}
+        self.__arrays = {}
+        for ticket_type, (n_horses, n_combinations) in Master.TICKET_COMBINATION_DICT.items():
+            table = payout_table[(ticket_types == ticket_type) & (combinations < n_combinations)]
+            race_nos = race_ids.get_indexer(table.index.get_level_values('race_id'))
+            combination_nos = table.index.get_level_values('combination').values
+            exists = np.zeros(len(race_ids), dtype=bool)
+            exists[race_nos] = True
+            # 組み合わせが無い所は、馬番0（どの馬番とも一致しない）・払い戻し0にしておく
+            wins = np.zeros((len(race_ids), n_combinations, 3), dtype=np.int64)
+            wins[race_nos, combination_nos] = table[['win_0', 'win_1', 'win_2']].values
+            # 馬番0のビットは賭けた馬番の集合に含まれないので、馬番0を含む組み合わせは的中しない
+            masks = np.zeros((len(race_ids), n_combinations), dtype=np.int64)
+            for i in range(n_horses):
+                masks |= 1 << wins[:, :, i]
+            returns = np.zeros((len(race_ids), n_combinations), dtype=np.int64)
+            returns[race_nos, combination_nos] = table['return'].values
+            self.__tables[ticket_type] = (
+                exists, wins.tolist(), masks.tolist(), returns.tolist()
+                )
+            self.__arrays[ticket_type] = (exists, masks, returns)
+
+    def __get_table_1R(self, ticket_type: str, race_id: str) -> tuple:
+        """
+        賭けるレースidに絞った払い戻し表。(組み合わせの馬番, 組み合わせの集合, 払い戻し)のリスト。
+        払い戻し表に無いレースの場合はKeyError。
+        """
+        race_no = self.__race_no[race_id]
+        exists, wins, masks, returns = self.__tables[ticket_type]
+        if not exists[race_no]:
+            raise KeyError(race_id)
+        return wins[race_no], masks[race_no], returns[race_no]
+
+    def bet_boxes(self, ticket_type: str, race_ids: np.ndarray, umaban_masks: np.ndarray,
+                  amount: float) -> tuple:
+        """
+        複数のレースに、ticket_typeの馬券をまとめて賭ける。
+        umaban_masksは、各レースで賭ける馬番の集合（to_umaban_maskの整数）。
+        単勝・複勝は各馬に1枚ずつ、それ以外はBOX馬券で賭けた時の、bet_*と同じ
+        (賭ける枚数, 賭けた合計額, 払い戻し合計額)を、それぞれレースごとの配列で返す。
+        """
+        race_ids = np.asarray(race_ids)
+        umaban_masks = np.asarray(umaban_masks, dtype=np.int64)
+        k = _popcount(umaban_masks)
+        n_bets = n_box_bets(ticket_type, k)
+        # 払い戻し表を参照するかどうか（bet_*で、払い戻し表を参照する条件）
+        if ticket_type in ('wide', 'sanrenpuku'):
+            looks_up = np.ones(len(k), dtype=bool)
+        elif ticket_type == 'umaren':
+            looks_up = k != 2
+        else:
+            looks_up = n_bets > 0
+        # 払い戻し表に無いレースを参照する場合は、1レースずつ賭ける場合と同じくKeyError
+        exists, masks, returns = self.__arrays[ticket_type]
+        race_nos = self.__race_ids.get_indexer(race_ids)
+        missing = looks_up & ((race_nos < 0) | ~exists[race_nos])
+        if missing.any():
+            raise KeyError(race_ids[missing][0])
+        race_nos = np.where(looks_up, race_nos, 0)
+        win_masks = masks[race_nos]
+        if ticket_type in ('tansho', 'fukusho'):
+            # 的中した馬が、賭けた馬番に含まれるか
+            hits = win_masks & umaban_masks[:, np.newaxis] != 0
+        else:
+            # 的中した組み合わせの馬が、全て賭けた馬番に含まれるか
+            hits = win_masks & ~umaban_masks[:, np.newaxis] == 0
+        return_amount = (hits * returns[race_nos]).sum(axis=1) * amount / 100
+        return_amount[~looks_up] = 0
+        return n_bets, n_bets * amount, return_amount
 
     def bet_tansho(self, race_id: str, umaban: list, amount: float):
         """
@@ -30,11 +145,11 @@ class BettingTickets:
             # 賭けた合計額
             bet_amount = n_bets * amount
             # 賭けるレースidに絞った単勝の払い戻し表
-            table_1R = self.__returnTablesTansho.loc[race_id]
+            _, masks, returns = self.__get_table_1R('tansho', race_id)
             # 的中判定
-            hit = table_1R['win'] in umaban
+            hit = masks[0] & to_umaban_mask(umaban) != 0
             # 払い戻し合計額
-            return_amount = hit * table_1R['return'] * amount / 100
+            return_amount = hit * returns[0] * amount / 100
             return n_bets, bet_amount, return_amount
 
     def bet_fukusho(self, race_id: str, umaban: list, amount: float):
@@ -49,13 +164,13 @@ class BettingTickets:
             # 賭けた合計額
             bet_amount = n_bets * amount
             # 賭けるレースidに絞った複勝の払い戻し表
-            table_1R = self.__returnTablesFukusho.loc[race_id]
+            _, masks, returns = self.__get_table_1R('fukusho', race_id)
             # 1~3着それぞれに的中判定
-            hits = table_1R[['win_0', 'win_1', 'win_2']].isin(umaban)
+            bet_mask = to_umaban_mask(umaban)
             # 払い戻し合計額
             return_amount = sum(
-                hits.values * table_1R[['return_0', 'return_1', 'return_2']].values \
-                    * amount / 100
+                (mask & bet_mask != 0) * return_ * amount / 100
+                for mask, return_ in zip(masks, returns)
             )
             return n_bets, bet_amount, return_amount
 
@@ -73,11 +188,11 @@ class BettingTickets:
             # 賭けた合計額
             bet_amount = n_bets * amount
             # 賭けるレースidに絞った馬連払い戻し表
-            table_1R = self.__returnTablesUmaren.loc[race_id]
-            # 的中判定
-            hit = set(table_1R[['win_0', 'win_1']]).issubset(set(umaban))
+            _, masks, returns = self.__get_table_1R('umaren', race_id)
+            # 的中判定（的中した組み合わせが、賭けた馬番に含まれるか）
+            hit = masks[0] & ~to_umaban_mask(umaban) == 0
             # 払い戻し合計額
-            return_amount = hit * table_1R['return'] * amount / 100
+            return_amount = hit * returns[0] * amount / 100
         return n_bets, bet_amount, return_amount
 
     def _bet_umatan(self, race_id: str, umaban: list, amount: float):
@@ -90,29 +205,29 @@ class BettingTickets:
             return 0, 0, 0
 
         # 賭けるレースidに絞った馬単払い戻し表
-        table_1R = self.__returnTablesUmatan.loc[race_id]
+        wins, _, returns = self.__get_table_1R('umatan', race_id)
         # 的中判定
-        hit = (table_1R['win_0'] == umaban[0]) * (table_1R['win_1'] == umaban[1])
+        hit = (wins[0][0] == umaban[0]) * (wins[0][1] == umaban[1])
         # 払い戻し合計額
-        return_amount = hit * table_1R['return'] * amount / 100
+        return_amount = hit * returns[0] * amount / 100
         return 1, amount, return_amount
 
     def bet_umatan_box(self, race_id: str, umaban: list, amount: float):
         """
         馬単をBOX馬券で賭ける場合の関数。
         """
-        n_bets = 0
-        bet_amount = 0
-        return_amount = 0
-        for pair in permutations(umaban, 2):
-            n_bets_single, bet_amount_single, return_amount_single \
-                = self._bet_umatan(race_id, list(pair), amount)
-            # 賭ける枚数
-            n_bets += n_bets_single
-            # 賭けた合計額
-            bet_amount += bet_amount_single
-            # 払い戻し合計額
-            return_amount += return_amount_single
+        # 賭ける枚数（賭けた馬番の、2頭の順列の数）
+        n_bets = len(umaban) * (len(umaban) - 1)
+        if n_bets == 0:
+            return 0, 0, 0
+        # 賭けた合計額
+        bet_amount = n_bets * amount
+        # 賭けるレースidに絞った馬単払い戻し表
+        _, masks, returns = self.__get_table_1R('umatan', race_id)
+        # 的中判定（的中した組み合わせの馬が全て賭けた馬番に含まれれば、いずれかの順列が的中する）
+        hit = masks[0] & ~to_umaban_mask(umaban) == 0
+        # 払い戻し合計額
+        return_amount = hit * returns[0] * amount / 100
         return n_bets, bet_amount, return_amount
 
     def bet_wide_box(self, race_id: str, umaban: list, amount: float):
@@ -124,12 +239,13 @@ class BettingTickets:
         # 賭けた合計額
         bet_amount = n_bets * amount
         # 賭けるレースidに絞ったワイド払い戻し表
-        table_1R = self.__returnTablesWide.loc[race_id]
-        # 的中判定
-        hits = table_1R['win_0'].isin(umaban) * table_1R['win_1'].isin(umaban)
+        _, masks, returns = self.__get_table_1R('wide', race_id)
+        # 的中判定（組み合わせが無い所は、馬番0を含むので的中しない）
+        not_bet_mask = ~to_umaban_mask(umaban)
         # 払い戻し合計額
         return_amount = sum(
-            hits * table_1R['return'] * amount / 100
+            (mask & not_bet_mask == 0) * return_ * amount / 100
+            for mask, return_ in zip(masks, returns)
         )
         return n_bets, bet_amount, return_amount
 
@@ -142,11 +258,11 @@ class BettingTickets:
         # 賭けた合計額
         bet_amount = n_bets * amount
         # 賭けるレースidに絞った三連複払い戻し表
-        table_1R = self.__returnTablesSanrenpuku.loc[race_id]
+        _, masks, returns = self.__get_table_1R('sanrenpuku', race_id)
         # 的中判定
-        hit = set(table_1R[['win_0', 'win_1', 'win_2']]).issubset(set(umaban))
+        hit = masks[0] & ~to_umaban_mask(umaban) == 0
         # 払い戻し合計額
-        return_amount = hit * table_1R['return'] * amount / 100
+        return_amount = hit * returns[0] * amount / 100
         return n_bets, bet_amount, return_amount
 
     def _bet_sanrentan(self, race_id: str, umaban: list, amount: float):
@@ -155,30 +271,30 @@ class BettingTickets:
         """
         #len(umaban) != 3の時の例外処理
         # 賭けるレースidに絞った三連単払い戻し表
-        table_1R = self.__returnTablesSanrentan.loc[race_id]
+        wins, _, returns = self.__get_table_1R('sanrentan', race_id)
         # 的中判定
-        hit = (table_1R['win_0'] == umaban[0]) * (table_1R['win_1'] == umaban[1]) \
-            * (table_1R['win_2'] == umaban[2])
+        hit = (wins[0][0] == umaban[0]) * (wins[0][1] == umaban[1]) \
+            * (wins[0][2] == umaban[2])
         # 払い戻し合計額
-        return_amount = hit * table_1R['return'] * amount / 100
+        return_amount = hit * returns[0] * amount / 100
         return 1, amount, return_amount
 
     def bet_sanrentan_box(self, race_id: str, umaban: list, amount: float):
         """
         三連単をBOX馬券で賭ける場合の関数。
         """
-        n_bets = 0
-        bet_amount = 0
-        return_amount = 0
-        for pair in permutations(umaban, 3):
-            n_bets_single, bet_amount_single, return_amount_single \
-                = self._bet_sanrentan(race_id, list(pair), amount)
-            # 賭ける枚数
-            n_bets += n_bets_single
-            # 賭けた合計額
-            bet_amount += bet_amount_single
-            # 払い戻し合計額
-            return_amount += return_amount_single
+        # 賭ける枚数（賭けた馬番の、3頭の順列の数）
+        n_bets = len(umaban) * (len(umaban) - 1) * (len(umaban) - 2)
+        if n_bets == 0:
+            return 0, 0, 0
+        # 賭けた合計額
+        bet_amount = n_bets * amount
+        # 賭けるレースidに絞った三連単払い戻し表
+        _, masks, returns = self.__get_table_1R('sanrentan', race_id)
+        # 的中判定（的中した組み合わせの馬が全て賭けた馬番に含まれれば、いずれかの順列が的中する）
+        hit = masks[0] & ~to_umaban_mask(umaban) == 0
+        # 払い戻し合計額
+        return_amount = hit * returns[0] * amount / 100
         return n_bets, bet_amount, return_amount
 
     def others(self, race_id: str, umaban: list, amount: float):
@@ -1,8 +1,10 @@
 import numpy as np
 import pandas as pd
 
+from modules.constants import Master, ResultsCols
+from modules.policies import BetActions
 from modules.preprocessing import ReturnProcessor
-from ._betting_tickets import BettingTickets
+from ._betting_tickets import BettingTickets, n_box_bets, to_umaban_mask
 
 
 class Simulator:
@@ -11,65 +13,66 @@ class Simulator:
     """
     def __init__(self, return_processor: ReturnProcessor) -> None:
         self.betting_tickets = BettingTickets(return_processor)
+        self.__payout_table = return_processor.payout_table
 
-    def calc_returns_per_race(self, actions: dict) -> pd.DataFrame:
+    @staticmethod
+    def to_bet_table(actions: dict) -> pd.DataFrame:
         """
-        KeibaAI.decideActionの出力を入れると、レースごとに
+        KeibaAI.decide_actionの出力（{race_id: {馬券の種類: 馬番のリスト}}のdict）を、
+        1行が1つの(レース, 馬券の種類)の賭けのテーブルにする。
+        列はrace_id, ticket_type, combination（賭ける馬番の集合。馬番のビットを立てた整数）。
+        同じ馬番を複数回入れても1頭として扱う。
+        """
+        race_ids = []
+        ticket_types = []
+        combinations = []
+        for race_id, action in actions.items():
+            for ticket_type, umaban in action.items():
+                race_ids.append(race_id)
+                ticket_types.append(ticket_type)
+                combinations.append(to_umaban_mask(umaban))
+        return pd.DataFrame({
+            'race_id': pd.Series(race_ids, dtype=object),
+            'ticket_type': pd.Series(ticket_types, dtype=object),
+            'combination': pd.Series(combinations, dtype=np.int64),
+            })
+
+    def calc_returns_per_race(self, actions) -> pd.DataFrame:
+        """
+        KeibaAI.decideActionの出力（dictかBetActions）か、to_bet_tableの形式の賭けのテーブルを入れると、レースごとに
 
         - n_bets: そのレースで賭けた馬券の枚数
         - bet_amount: そのレースで賭けた金額
         - return_amount: そのレースでの払戻金
         - hit_or_not: 的中したかどうか
 
-        が返ってくる。
+        が返ってくる。馬券の種類ごとに、全てのレースの賭けをまとめて計算する。
         """
-        returns_per_race_dict = {}
-        for race_id in actions:
-            n_bets_race = 0
-            bet_amount_race = 0
-            return_amount_race = 0
-            for action in actions[race_id]:
-                #actionの定義を別途した方が良いかも
-                if action == 'tansho':
-                    n_bets, bet_amount, return_amount = self.betting_tickets.bet_tansho(
-                        race_id, actions[race_id][action], 1
-                        )
-                elif action == 'fukusho':
-                    n_bets, bet_amount, return_amount = self.betting_tickets.bet_fukusho(
-                        race_id, actions[race_id][action], 1
-                        )
-                elif action == 'umaren':
-                    n_bets, bet_amount, return_amount = self.betting_tickets.bet_umaren_box(
-                        race_id, actions[race_id][action], 1
-                        )
-                elif action == 'umatan':
-                    n_bets, bet_amount, return_amount = self.betting_tickets.bet_umatan_box(
-                        race_id, actions[race_id][action], 1
-                        )
-                elif action == 'wide':
-                    n_bets, bet_amount, return_amount = self.betting_tickets.bet_wide_box(
-                        race_id, actions[race_id][action], 1
-                        )
-                elif action == 'sanrenpuku':
-                    n_bets, bet_amount, return_amount = self.betting_tickets.bet_sanrenpuku_box(
-                        race_id, actions[race_id][action], 1
-                        )
-                elif action == 'sanrentan':
-                    n_bets, bet_amount, return_amount = self.betting_tickets.bet_sanrentan_box(
-                        race_id, actions[race_id][action], 1
-                        )
-                n_bets_race += n_bets
-                bet_amount_race += bet_amount
-                return_amount_race += return_amount
-                returns_per_race_dict[race_id] = {
-                    'n_bets': n_bets_race,
-                    'bet_amount': bet_amount_race,
-                    'return_amount': return_amount_race,
-                    'hit_or_not': int(return_amount_race > 0)
-                }
-        return pd.DataFrame.from_dict(returns_per_race_dict, orient='index')
-
-    def calc_returns(self, actions: dict) -> dict:
+        if isinstance(actions, BetActions):
+            bet_table = actions.to_bet_table()
+        elif isinstance(actions, pd.DataFrame):
+            bet_table = actions
+        else:
+            bet_table = self.to_bet_table(actions)
+        race_ids = bet_table['race_id'].values
+        combinations = bet_table['combination'].values
+        n_bets = np.zeros(len(bet_table))
+        bet_amount = np.zeros(len(bet_table))
+        return_amount = np.zeros(len(bet_table))
+        for ticket_type, positions in bet_table.groupby('ticket_type', sort=False).indices.items():
+            n_bets[positions], bet_amount[positions], return_amount[positions] \
+                = self.betting_tickets.bet_boxes(
+                    ticket_type, race_ids[positions], combinations[positions], 1
+                    )
+        returns_per_race = pd.DataFrame({
+            'n_bets': n_bets,
+            'bet_amount': bet_amount,
+            'return_amount': return_amount,
+            }, index=race_ids).groupby(level=0, sort=False).sum()
+        returns_per_race['hit_or_not'] = (returns_per_race['return_amount'] > 0).astype(int)
+        return returns_per_race.rename_axis(None)
+
+    def calc_returns(self, actions) -> dict:
         """
         self.calc_returns_per_race(actions)の結果を集計する
         """
@@ -93,3 +96,105 @@ class Simulator:
                 returns_dict['std'] = returns_per_race['return_amount'].std() * np.sqrt(returns_dict['n_races']) \
                     / returns_dict['total_bet_amount']
         return returns_dict
+
+    def sweep(self, score_table: pd.DataFrame, ticket_type: str, thresholds) -> pd.DataFrame:
+        """
+        scoreがthreshold以上の馬にticket_typeで賭けた時（BetPolicyTansho〜BetPolicySanrentanBox）の
+        calc_returnsの結果を、thresholdsの全ての値について計算する。
+        返り値はthresholdをインデックスとし、calc_returnsの項目とtotal_return_amountを列に持つDataFrame。
+        賭けるレースが無いthresholdの行は含まない（calc_returnsの結果をpd.DataFrame.from_dictした場合と同じ）。
+
+        各レースで賭ける馬は、スコアの上位k頭になる。レース・kごとに、k頭目を加えた時の
+        各項目の増分を求めておき、全体をスコアの降順に並べた累積和をthresholdで引く。
+        """
+        min_horses, n_combinations = Master.TICKET_COMBINATION_DICT[ticket_type]
+        thresholds = np.asarray(thresholds, dtype=float)
+        # レースごとにスコアの降順に並べ、各馬がスコアの上位何頭目か（k）を求める
+        scores = score_table[score_table['score'].notna()]
+        race_codes, race_ids = pd.factorize(scores.index)
+        order = np.lexsort((-scores['score'].values, race_codes))
+        race_codes = race_codes[order]
+        score_values = scores['score'].values[order]
+        race_starts = np.r_[0, np.flatnonzero(np.diff(race_codes)) + 1]
+        race_sizes = np.diff(np.r_[race_starts, len(race_codes)])
+        k = np.arange(len(race_codes)) - np.repeat(race_starts, race_sizes) + 1
+        # (レース, 馬番) -> 行の位置の表
+        umaban = scores[ResultsCols.UMABAN].values[order].astype(np.int64)
+        positions = np.full((len(race_ids), umaban.max(initial=0) + 1), -1, dtype=np.int64)
+        positions[race_codes, umaban] = np.arange(len(race_codes))
+
+        # 賭けるレースは、払い戻しテーブルに無いとcalc_returnsと同様にKeyErrorになる
+        bet_race_ids = race_ids[race_sizes >= min_horses]
+        payout_table = self.__payout_table.xs(ticket_type, level='ticket_type')
+        payout_table = payout_table[
+            payout_table.index.get_level_values('combination') < n_combinations
+            ]
+        payout_race_ids = payout_table.index.get_level_values('race_id')
+        missing = bet_race_ids[~bet_race_ids.isin(payout_race_ids)]
+        if len(missing) > 0:
+            raise KeyError(list(missing))
+        payout_race_codes = race_ids.get_indexer(payout_race_ids)
+        payout_table = payout_table[payout_race_codes >= 0]
+        payout_race_codes = payout_race_codes[payout_race_codes >= 0]
+
+        # 的中する組み合わせごとに、その組み合わせの全ての馬を含む最小のkの行を求める
+        # （スコアの無い馬を含む組み合わせは的中しない）
+        wins = payout_table[['win_0', 'win_1', 'win_2'][:min_horses]].values
+        entries = positions[
+            payout_race_codes[:, np.newaxis], np.clip(wins, 0, positions.shape[1] - 1)
+            ]
+        entries[wins >= positions.shape[1]] = -1
+        is_hit = (entries >= 0).all(axis=1)
+        entries = entries[is_hit]
+        hit_entry = entries[np.arange(len(entries)), k[entries].argmax(axis=1)]
+        # 払い戻しは、誤差が出ないよう整数の（100円あたりの）金額のまま足し合わせる
+        hit_return = payout_table['return'].values[is_hit].astype(float)
+        if ticket_type == 'umaren':
+            # bet_umaren_boxは2頭の場合は賭けないので、2頭で的中する組み合わせは3頭目から払い戻される
+            # （3頭目がいないレースでは払い戻されない）
+            at_2 = k[hit_entry] == 2
+            is_paid = ~at_2 | (race_sizes[race_codes[hit_entry]] >= 3)
+            hit_entry = hit_entry[is_paid] + at_2[is_paid]
+            hit_return = hit_return[is_paid]
+        return_delta = np.bincount(hit_entry, weights=hit_return, minlength=len(k))
+
+        # レースごとの累積の払い戻しから、払い戻しの2乗・的中の増分を求める
+        returns = np.cumsum(return_delta)
+        returns -= np.repeat(returns[race_starts] - return_delta[race_starts], race_sizes)
+        prev_returns = returns - return_delta
+        is_bet = k >= min_horses
+        is_first_bet = k == min_horses
+        prev_returns[is_first_bet] = 0
+        n_bets = n_box_bets(ticket_type, k)
+        n_bets_delta = np.where(is_first_bet, n_bets, n_bets - n_box_bets(ticket_type, k - 1))
+        deltas = np.column_stack([
+            n_bets_delta,
+            is_first_bet,
+            (returns > 0).astype(float) - (prev_returns > 0),
+            return_delta,
+            returns ** 2 - prev_returns ** 2,
+            ])[is_bet]
+
+        # スコアの降順に並べた累積和を、thresholdごとに引く
+        score_order = np.argsort(-score_values[is_bet], kind='mergesort')
+        cumsums = np.vstack([
+            np.zeros((1, deltas.shape[1])), np.cumsum(deltas[score_order], axis=0)
+            ])
+        n_entries = np.searchsorted(-score_values[is_bet][score_order], -thresholds, side='right')
+        n_bets, n_races, n_hits, return_amount, sum_squares = cumsums[n_entries].T
+        return_amount, sum_squares = return_amount / 100, sum_squares / 100 ** 2
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # calc_returnsと同じく、レースごとの払い戻しの不偏標準偏差を使う
+            variance = np.maximum(sum_squares - return_amount ** 2 / n_races, 0) / (n_races - 1)
+            returns_df = pd.DataFrame({
+                'n_bets': n_bets,
+                'n_races': n_races,
+                'n_hits': n_hits,
+                'total_bet_amount': n_bets,
+                'return_rate': np.where(n_bets == 0, 0, return_amount / n_bets),
+                'std': np.where(n_bets == 0, 0, np.sqrt(variance) * np.sqrt(n_races) / n_bets),
+                'total_return_amount': return_amount,
+                }, index=pd.Index(thresholds, name='threshold'))
+        # 賭けるレースが無いthresholdは、calc_returnsが空のdictを返すので行を作らない
+        return returns_df[n_races > 0]
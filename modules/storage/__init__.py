@@ -0,0 +1 @@
+from ._raw_store import RawStore, read_rawdata, is_store_path, raw_fingerprint
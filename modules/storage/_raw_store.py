@@ -0,0 +1,278 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# 型の混在するobject列について、各値の元の型を保存する列の接頭辞
+_TYPE_PREFIX = '__pytype__'
+_PARTITION_EXT = '.parquet'
+
+
+def _type_code(x) -> str:
+    if x is None:
+        return 'n'
+    if isinstance(x, str):
+        return 's'
+    if isinstance(x, (bool, np.bool_)):
+        return 'b'
+    if isinstance(x, (int, np.integer)):
+        return 'i'
+    if isinstance(x, (float, np.floating)):
+        return 'f'
+    raise TypeError('unsupported value in object column: {!r}'.format(x))
+
+
+def _to_text(x, code: str):
+    if code == 's':
+        return x
+    if code == 'n':
+        return None
+    if code == 'f':
+        return repr(float(x))
+    return str(x)
+
+
+_FROM_TEXT = {
+    'b': lambda v: v == 'True',
+    'i': int,
+    'f': float,
+    }
+
+
+def _encode(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    parquetは1列に1つの型しか持てないため、文字列以外の値（数値、NaN、None）を含むobject列は
+    値を文字列にして、元の型を別の列に保存する。
+    （例えば着順の列は、レースによって数値だったり「中止」などの文字列だったりする）
+    """
+    encoded = {}
+    for col in df.columns:
+        values = df[col]
+        if values.dtype != object or all(isinstance(x, str) for x in values.values):
+            continue
+        codes = [_type_code(x) for x in values.values]
+        encoded[col] = [_to_text(x, code) for x, code in zip(values.values, codes)]
+        encoded[_TYPE_PREFIX + str(col)] = codes
+    if not encoded:
+        return df
+    df = df.copy()
+    for col, values in encoded.items():
+        df[col] = values
+    return df
+
+
+def _decode(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    _encodeで文字列にした列を、元の型の値に戻す。
+    """
+    type_cols = [col for col in df.columns if str(col).startswith(_TYPE_PREFIX)]
+    if not type_cols:
+        return df
+    names = {str(col): col for col in df.columns}
+    for type_col in type_cols:
+        col = names[type_col[len(_TYPE_PREFIX):]]
+        values = df[col].values.astype(object)
+        codes = df[type_col].values
+        # 文字列とNoneはそのままで良いので、それ以外の値だけを変換する
+        for code in set(codes) - {'s', 'n'}:
+            mask = codes == code
+            values[mask] = [_FROM_TEXT[code](v) for v in values[mask]]
+        df[col] = values
+    return df.drop(columns=type_cols)
+
+
+class RawStore:
+    """
+    rawテーブルを、indexの先頭prefix_len文字ごとのparquetファイルに分割して保存する。
+    race_id, horse_idの先頭4文字は年なので、デフォルトでは年ごとのファイルになる。
+    更新時は追加データに含まれる年のファイルだけを書き換えるため、
+    テーブル全体を読み込み・書き込みするpickleよりも速く、メモリも少なくて済む。
+    既存のpickleは、RawStore(dirpath).upsert(pd.read_pickle(filepath))で移行できる。
+    """
+    def __init__(self, dirpath: str, prefix_len: int = 4):
+        self.__dirpath = dirpath
+        self.__prefix_len = prefix_len
+
+    @property
+    def dirpath(self) -> str:
+        return self.__dirpath
+
+    @property
+    def partitions(self) -> list:
+        """
+        保存されているパーティションのキー（昇順）
+        """
+        if not os.path.isdir(self.__dirpath):
+            return []
+        return sorted(
+            filename[:-len(_PARTITION_EXT)] for filename in os.listdir(self.__dirpath)
+            if filename.endswith(_PARTITION_EXT)
+            )
+
+    def _partition_path(self, key: str) -> str:
+        return os.path.join(self.__dirpath, key + _PARTITION_EXT)
+
+    def _partition_keys(self, index: pd.Index) -> np.ndarray:
+        return index.astype(str).str[:self.__prefix_len].values
+
+    @staticmethod
+    def __stored_columns(filepath: str, columns: list) -> list:
+        """
+        columnsを読み込むための、ファイル内の列名。型を保存した列も含め、保存されている順に並べる。
+        columnsがNoneの場合はNone（全ての列）。
+        """
+        if columns is None:
+            return None
+        names = {str(col) for col in columns}
+        return [
+            name for name in pq.read_schema(filepath).names
+            if name in names or (name.startswith(_TYPE_PREFIX) and name[len(_TYPE_PREFIX):] in names)
+            ]
+
+    def read_partition(self, key: str, columns: list = None, filters: list = None) -> pd.DataFrame:
+        """
+        1つのパーティションを読み込む。
+        columnsを指定した場合は、その列だけをディスクから読み込む（存在しない列は無視する）。
+        filtersはpyarrow.parquet.read_tableのfiltersと同じ形式で、条件を満たす行だけを読み込む。
+        """
+        filepath = self._partition_path(key)
+        columns = self.__stored_columns(filepath, columns)
+        table = pq.read_table(filepath, columns=columns, filters=filters, use_pandas_metadata=True)
+        # 列ごとにブロックを分けておくと、_decodeでの列の置き換えが速い
+        df = table.to_pandas(split_blocks=True)
+        return _decode(df)
+
+    def read(self, partitions: list = None, columns: list = None, filters: list = None) -> pd.DataFrame:
+        """
+        partitionsに指定したパーティション（デフォルトは全て）を読み込んで1つのDataFrameにする。
+        行はパーティションのキー順に並ぶ。columns, filtersはread_partitionと同じ。
+        読み込むパーティションが無い場合は、保存されている列を持つ0行のDataFrameを返す。
+        """
+        if partitions is None:
+            partitions = self.partitions
+        if len(partitions) == 0:
+            return self.__empty(columns)
+        return pd.concat([self.read_partition(key, columns, filters) for key in partitions])
+
+    def __empty(self, columns: list = None) -> pd.DataFrame:
+        """
+        0行のDataFrame。列とindexは保存されているパーティションのスキーマから作る
+        （データは読み込まない）。パーティションが1つも無い場合は、columnsの列だけを持つ。
+        """
+        stored_partitions = self.partitions
+        if len(stored_partitions) == 0:
+            return pd.DataFrame(columns=columns)
+        filepath = self._partition_path(stored_partitions[0])
+        schema = pq.read_schema(filepath)
+        names = self.__stored_columns(filepath, columns)
+        if names is not None:
+            # indexの列も残す
+            index_cols = [
+                col for col in (schema.pandas_metadata or {}).get('index_columns', [])
+                if isinstance(col, str)
+                ]
+            schema = pa.schema(
+                [schema.field(name) for name in names + index_cols], metadata=schema.metadata
+                )
+        return _decode(schema.empty_table().to_pandas())
+
+    def _write_partition(self, key: str, df: pd.DataFrame):
+        os.makedirs(self.__dirpath, exist_ok=True)
+        filepath = self._partition_path(key)
+        # 書き込み途中で失敗しても元のファイルが壊れないよう、一時ファイルに書いてから置き換える
+        tmp_filepath = filepath + '.tmp'
+        pq.write_table(pa.Table.from_pandas(_encode(df)), tmp_filepath)
+        os.replace(tmp_filepath, filepath)
+
+    def upsert(self, new_df: pd.DataFrame):
+        """
+        new_dfを追加する。既に存在するindexの行は、new_dfの行に置き換える。
+        new_dfの行が含まれるパーティションだけを書き換える。
+        """
+        keys = self._partition_keys(new_df.index)
+        for key in np.unique(keys):
+            new_partition = new_df[keys == key]
+            if os.path.isfile(self._partition_path(key)):
+                old_partition = self.read_partition(key)
+                # new_dfに存在しないindexのみ、旧データを使う
+                filtered_old = old_partition[~old_partition.index.isin(new_partition.index)]
+                new_partition = pd.concat([filtered_old, new_partition])
+            self._write_partition(key, new_partition)
+
+
+def raw_fingerprint(path: str) -> tuple:
+    """
+    rawテーブルのファイルが更新されたかどうかを判定するための値。
+    pickleの場合はファイルの(サイズ, 更新時刻)、RawStoreの場合は全パーティションの
+    (キー, サイズ, 更新時刻)を返す。
+    """
+    if is_store_path(path):
+        store = RawStore(path)
+        fingerprint = []
+        for key in store.partitions:
+            stat = os.stat(store._partition_path(key))
+            fingerprint.append((key, stat.st_size, stat.st_mtime_ns))
+        return tuple(fingerprint)
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def is_store_path(path: str) -> bool:
+    """
+    pathがRawStoreのディレクトリかどうか。拡張子の無いパスはRawStoreとして扱う。
+    """
+    return os.path.isdir(path) or os.path.splitext(path)[1] == ''
+
+
+def _in_year_range(race_ids, start: pd.Timestamp, end: pd.Timestamp) -> np.ndarray:
+    """
+    race_idの先頭4文字（年）が、start〜endの年に含まれるかどうか。
+    """
+    years = pd.Index(race_ids).astype(str).str[:4].astype(int)
+    in_range = np.ones(len(years), dtype=bool)
+    if start is not None:
+        in_range &= years >= start.year
+    if end is not None:
+        in_range &= years <= end.year
+    return in_range
+
+
+def read_rawdata(path: str, columns: list = None, date_range: tuple = None,
+                 date_key: str = None) -> pd.DataFrame:
+    """
+    rawテーブルを読み込む。pathはpickleファイル、またはRawStoreのディレクトリ。
+    columnsを指定すると、その列だけを読み込む（列の並びは元のテーブルの順）。
+    date_range=(開始日, 終了日)を指定すると、その期間の行だけを読み込む（Noneの側は制限なし）。
+    期間の判定方法はdate_keyで指定する。
+        'race_id'：indexのrace_idの先頭4文字（年）で判定する。年単位での絞り込みになる。
+        列名：その列の'%Y/%m/%d'形式の日付文字列で判定する。
+    RawStoreの場合は、対象外のパーティション・列・行をディスクから読み込まない。
+    pickleの場合は、全体を読み込んでから同じ条件で絞り込む。
+    """
+    start = end = None
+    if date_range is not None and date_key is not None:
+        start, end = [None if date is None else pd.Timestamp(date) for date in date_range]
+    filters = []
+    if date_key is not None and date_key != 'race_id':
+        if start is not None:
+            filters.append((date_key, '>=', start.strftime('%Y/%m/%d')))
+        if end is not None:
+            filters.append((date_key, '<=', end.strftime('%Y/%m/%d')))
+    by_race_id = date_key == 'race_id' and (start is not None or end is not None)
+
+    if is_store_path(path):
+        store = RawStore(path)
+        partitions = store.partitions
+        if by_race_id:
+            partitions = list(np.array(partitions, dtype=object)[_in_year_range(partitions, start, end)])
+        return store.read(partitions, columns, filters or None)
+
+    df = pd.read_pickle(path)
+    if by_race_id:
+        df = df[_in_year_range(df.index, start, end)]
+    for col, op, value in filters:
+        df = df[df[col] >= value] if op == '>=' else df[df[col] <= value]
+    if columns is not None:
+        df = df[[col for col in df.columns if col in columns]]
+    return df
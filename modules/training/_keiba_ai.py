@@ -51,10 +51,14 @@ class KeibaAI:
         return score_policy.calc(self.__model_wrapper.lgb_model, X)
 
     def decide_action(self, score_table: pd.DataFrame,
-        bet_policy: AbstractBetPolicy, **params) -> dict:
+        bet_policy: AbstractBetPolicy, as_bet_actions: bool = False, **params):
         """
         bet_policyを元に、賭ける馬券を決定する。paramsにthresholdを入れる。
+        as_bet_actions=Trueにすると、dictの代わりにBetActions（レースごとの馬番の配列）を返す。
         """
-        actions = bet_policy.judge(score_table, **params)
+        if as_bet_actions:
+            actions = bet_policy.judge_actions(score_table, **params)
+        else:
+            actions = bet_policy.judge(score_table, **params)
 
         return actions
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from modules.storage import RawStore, read_rawdata
+
+
+class TestReadEmptyPartitions(unittest.TestCase):
+    """
+    読み込むパーティションが無い場合に、pickleと同じく0行のDataFrameを返すことを確認する。
+    実行: python -m unittest tests.test_raw_store
+    """
+    def setUp(self):
+        self.__tmp_dir = tempfile.TemporaryDirectory()
+        self.__dir = self.__tmp_dir.name
+        # 2019年のパーティションだけを持つストア
+        df = pd.DataFrame(
+            {'着順': [1, '中止', 3], '馬名': ['a', 'b', 'c'], '斤量': [55.0, 56.0, np.nan]},
+            index=['201901010101', '201901010101', '201901010101'],
+            )
+        self.__pickle_path = os.path.join(self.__dir, 'results.pickle')
+        self.__store_path = os.path.join(self.__dir, 'results')
+        df.to_pickle(self.__pickle_path)
+        RawStore(self.__store_path).upsert(df)
+
+    def tearDown(self):
+        self.__tmp_dir.cleanup()
+
+    def test_no_matching_partition(self):
+        for columns in [None, ['馬名', '斤量']]:
+            with self.subTest(columns=columns):
+                expected = read_rawdata(
+                    self.__pickle_path, columns, ('2021-01-01', None), 'race_id'
+                    )
+                actual = read_rawdata(self.__store_path, columns, ('2021-01-01', None), 'race_id')
+                self.assertEqual(len(actual), 0)
+                self.assertEqual(list(actual.columns), list(expected.columns))
+                self.assertEqual(actual.dtypes.to_dict(), expected.dtypes.to_dict())
+
+    def test_empty_partitions(self):
+        actual = RawStore(self.__store_path).read(partitions=[])
+        self.assertEqual(list(actual.columns), ['着順', '馬名', '斤量'])
+        self.assertEqual(len(actual), 0)
+
+    def test_empty_store(self):
+        store = RawStore(os.path.join(self.__dir, 'empty'))
+        self.assertEqual(len(store.read()), 0)
+        self.assertEqual(list(store.read(columns=['馬名']).columns), ['馬名'])
+
+
+if __name__ == '__main__':
+    unittest.main()